@@ -6,6 +6,10 @@ Compiler script for ALIG Qt version 0.99b
 Author: Alexandre "MoMo"
 
 Only works for windows, as it uses PyInstaller to create a standalone executable.
+
+Options:
+    --aot   Ahead-of-time compile the Numba kernels (engine/aot_kernels.py)
+            and embed them: the executable never JIT-compiles at runtime.
 """
 
 
@@ -23,6 +27,9 @@ MAIN_SCRIPT = "main_qt.py"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ICON_PATH = os.path.join(BASE_DIR, "assets", "logo_alig.ico")
 
+# Numba kernels compiled ahead of time (numba.pycc) instead of JIT
+AOT_KERNELS = "--aot" in sys.argv
+
 def run_compilation():
     # 1. Cleaning old builds to avoid conflicts
     print("Cleaning old build and dist folders...")
@@ -40,7 +47,18 @@ def run_compilation():
         print("Verify that the 'assets' folder is in the same directory as this script.")
         return
 
-    # 3. Parameters construction
+    # 3. Optional AOT kernels (engine/_alig_kernels extension module)
+    aot_built = False
+    if AOT_KERNELS:
+        print("Building AOT Numba kernels...")
+        try:
+            subprocess.check_call([sys.executable, os.path.join("engine", "aot_kernels.py")],
+                                  cwd=BASE_DIR)
+            aot_built = True
+        except subprocess.CalledProcessError as e:
+            print(f"AOT build failed ({e}), the executable will use JIT kernels.")
+
+    # 4. Parameters construction
     # Note: os.pathsep is used for portability (; on Windows)
     params = [
         'pyinstaller',
@@ -51,12 +69,17 @@ def run_compilation():
         '--windowed',
 
         '--add-data', f'{os.path.join(BASE_DIR, "assets")}{os.pathsep}assets',
+        # Numba locates its on-disk JIT cache from the module source file
+        '--add-data', f'{os.path.join(BASE_DIR, "engine", "gcode_engine_numba.py")}{os.pathsep}engine',
         '--hidden-import', 'PIL.Image',
+        '--hidden-import', 'engine.gcode_engine_numba',
         '--icon', ICON_PATH,
         MAIN_SCRIPT
     ]
+    if aot_built:
+        params[-1:-1] = ['--hidden-import', 'engine._alig_kernels']
 
-    # 4. Execution
+    # 5. Execution
     try:
         print(f"Starting ALIG {VERSION} compilation...")
         # Force execution in the script directory
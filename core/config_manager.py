@@ -35,8 +35,16 @@ class ConfigManager:
             "m67_e_num": 0,
             "ctrl_max": 1000,
             "gcode_extension": ".nc",
+            "engine_backend": "numba",
+            "compact_gcode": False,
+            "incremental_gcode": False,
             "laser_latency": 0.0,
             "premove": 10.0,
+            "acceleration": 500.0,
+            "rapid_feedrate": 6000.0,
+            "max_block_rate": 0.0,
+            "gen_workers": 0,
+            "jit_cache_dir": "",
             "hor_linestep": 0.1,
             "ver_linestep": 0.1,
             "enable_thumbnails": True,
@@ -51,7 +59,7 @@ class ConfigManager:
     }
 
     # Clés qui doivent toujours être des entiers
-    _INT_KEYS = {"m67_e_num", "ctrl_max"}
+    _INT_KEYS = {"m67_e_num", "ctrl_max", "gen_workers"}
 
     def __init__(self, config_path):
         self.config_path = config_path
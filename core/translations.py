@@ -59,6 +59,12 @@ TRANSLATIONS = {
             "sec_hardware": "HARDWARE BEHAVIOR",
             "label_latency": "Laser Latency (ms):",
             "label_overscan": "Default Overscan (mm):",
+            "label_acceleration": "Max Acceleration (mm/s²):",
+            "label_rapid_feedrate": "Rapid Feedrate G0 (mm/min):",
+            "label_max_block_rate": "Max Block Rate (blocks/s, 0 = off):",
+            "label_engine_backend": "Engine Backend:",
+            "compact_gcode": "Compact G-Code (modal)",
+            "incremental_gcode": "Relative Coordinates (G91)",
             "hor_linestep": "Horizontal linestep (mm):",
             "ver_linestep": "Vertical linestep (mm):",
             "sec_scripts": "SYSTEM SCRIPTS",
@@ -165,15 +171,23 @@ TRANSLATIONS = {
             "invert_color": "Invert Relief (Black / White)",
             "feedrate": "Feedrate (F)",
             "overscan": "Overscan (mm)",
+            "trim_rows": "Skip Blank Areas",
+            "gap_hop": "Rapid Hop Over Gaps (mm, 0 = off)",
             "min_power": "Min Power (%)",
             "max_power": "Max Power (%)",
             "laser_latency": "Laser Latency (ms)",
             "gray_steps": "Grayscale Steps",
+            "quant_mode": "Level Placement",
+            "quant_uniform": "Uniform",
+            "quant_cluster": "Adaptive (image histogram)",
+            "power_deadband": "Power Deadband (%, 0 = off)",
+            "min_run": "Minimum Segment Length (mm, 0 = off)",
             "cmd_mode": "Laser Command Mode:",
             "m67_output": "M67 Output (E):",
             "choose_image": "PLEASE SELECT AN IMAGE\nTO BEGIN",
             "mem_warn_hard": "⚠ Matrix too large ({total:.1f}M px) — image was rescaled. Try reducing DPI (e.g. {dpi_sug} instead of {dpi_now}).",
             "mem_warn_soft": "⚠ Large matrix ({total:.1f}M px) — may be slow. Consider reducing DPI (e.g. {dpi_sug} instead of {dpi_now}).",
+            "mem_warn_ooc": "⚠ Very large matrix ({total:.1f}M px) — processed out-of-core (disk-backed). Predicted peak memory: {peak:.0f} MB.",
             "ctrl_max_value": "Controller Max Value:",
             "firing_mode": "Firing Mode:",
             "gcode_header": "Header G-Code",
@@ -225,6 +239,9 @@ TRANSLATIONS = {
             "matrix_size": "MATRIX SIZE",
             "scan_step": "SCAN STEP",
             "line_step": "LINE STEP",
+            "engine": "ENGINE",
+            "block_rate": "BLOCK RATE",
+            "rows_merged": "rows simplified",
             "power_distribution": "Power Distribution",
             "power_value": "Power (%)",
             "pixel_count": "Pixels (%)"
@@ -260,7 +277,8 @@ TRANSLATIONS = {
             "error_read_file": "Cannot read file:",
             "parse_error_title": "Parse Error",
             "line_step_lbl": "Line step (mm):",
-            "open_gcode_hint": "Open a G-Code file to start"
+            "open_gcode_hint": "Open a G-Code file to start",
+            "preview_truncated": "(… preview limited to the first {n} lines …)"
         }
     },
     "Français": {
@@ -319,6 +337,12 @@ TRANSLATIONS = {
             "sec_hardware": "COMPORTEMENT MATÉRIEL",
             "label_latency": "Latence laser (ms) :",
             "label_overscan": "Overscan par défaut (mm) :",
+            "label_acceleration": "Accélération max (mm/s²) :",
+            "label_rapid_feedrate": "Vitesse rapide G0 (mm/min) :",
+            "label_max_block_rate": "Débit de blocs max (blocs/s, 0 = off) :",
+            "label_engine_backend": "Moteur de génération :",
+            "compact_gcode": "G-Code compact (modal)",
+            "incremental_gcode": "Coordonnées relatives (G91)",
             "hor_linestep": "Pas horizontal (mm) :",
             "ver_linestep": "Pas vertical (mm) :",
             "sec_scripts": "SCRIPTS SYSTÈME",
@@ -425,15 +449,23 @@ TRANSLATIONS = {
             "invert_color": "Inversion de couleurs (noir / blanc)",
             "feedrate": "Vitesse d'avance (F)",
             "overscan": "Dépassement (mm)",
+            "trim_rows": "Ignorer les zones blanches",
+            "gap_hop": "Saut rapide des blancs (mm, 0 = off)",
             "min_power": "Puissance Min (%)",
             "max_power": "Puissance Max (%)",
             "laser_latency": "Latence Laser (ms)",
             "gray_steps": "Niveaux de gris",
+            "quant_mode": "Répartition des niveaux",
+            "quant_uniform": "Uniforme",
+            "quant_cluster": "Adaptative (histogramme de l'image)",
+            "power_deadband": "Zone morte de puissance (%, 0 = off)",
+            "min_run": "Longueur minimale de segment (mm, 0 = off)",
             "cmd_mode": "Mode de commande laser :",
             "m67_output": "Sortie M67 (E) :",
             "choose_image": "VEUILLEZ SELECTIONNER UNE IMAGE\nPOUR COMMENCER",
             "mem_warn_hard": "⚠ Matrice trop grande ({total:.1f}M px) — l'image a été redimensionnée. Essayez de baisser le DPI (ex. {dpi_sug} au lieu de {dpi_now}).",
             "mem_warn_soft": "⚠ Grande matrice ({total:.1f}M px) — traitement peut être lent. Pensez à baisser le DPI (ex. {dpi_sug} au lieu de {dpi_now}).",
+            "mem_warn_ooc": "⚠ Très grande matrice ({total:.1f}M px) — traitée hors mémoire (sur disque). Mémoire crête prévue : {peak:.0f} Mo.",
             "ctrl_max_value": "Pleine échelle :",
             "firing_mode": "Mode de commande :",
             "gcode_header": "En-tête de G-Code",
@@ -484,6 +516,9 @@ TRANSLATIONS = {
             "matrix_size": "MATRICE",
             "scan_step": "PAS DE SCAN",
             "line_step": "PAS DE LIGNE",
+            "engine": "MOTEUR",
+            "block_rate": "DÉBIT BLOCS",
+            "rows_merged": "lignes simplifiées",
             "power_distribution": "Distribution de puissance",
             "power_value": "Puissance (%)",
             "pixel_count": "Pixels (%)"
@@ -517,7 +552,8 @@ TRANSLATIONS = {
             "error_read_file": "Impossible de lire le fichier :",
             "parse_error_title": "Erreur d'analyse",
             "line_step_lbl": "Pas de ligne (mm) :",
-            "open_gcode_hint": "Ouvrez un fichier G-Code pour commencer"
+            "open_gcode_hint": "Ouvrez un fichier G-Code pour commencer",
+            "preview_truncated": "(… aperçu limité aux {n} premières lignes …)"
         }
     },
     "Deutsch": {
@@ -576,6 +612,12 @@ TRANSLATIONS = {
             "sec_hardware": "HARDWARE-VERHALTEN",
             "label_latency": "Laser-Latenz (ms):",
             "label_overscan": "Standard-Overscan (mm):",
+            "label_acceleration": "Max. Beschleunigung (mm/s²):",
+            "label_rapid_feedrate": "Eilganggeschwindigkeit G0 (mm/min):",
+            "label_max_block_rate": "Max. Satzrate (Sätze/s, 0 = aus):",
+            "label_engine_backend": "Generator-Backend:",
+            "compact_gcode": "Kompakter G-Code (modal)",
+            "incremental_gcode": "Relative Koordinaten (G91)",
             "sec_scripts": "SYSTEM-SKRIPTE",
             "label_header": "Globaler Header G-Code",
             "label_footer": "Globaler Footer G-Code",
@@ -680,15 +722,23 @@ TRANSLATIONS = {
             "invert_color": "Relief invertieren (Schwarz / Weiss)",
             "feedrate": "Vorschub (F)",
             "overscan": "Overscan (mm)",
+            "trim_rows": "Weiße Bereiche überspringen",
+            "gap_hop": "Eilgang über Lücken (mm, 0 = aus)",
             "min_power": "Min. Leistung (%)",
             "max_power": "Max. Leistung (%)",
             "laser_latency": "Laser-Latenz (ms)",
             "gray_steps": "Graustufen-Stufen",
+            "quant_mode": "Stufenverteilung",
+            "quant_uniform": "Gleichmäßig",
+            "quant_cluster": "Adaptiv (Bildhistogramm)",
+            "power_deadband": "Leistungs-Totband (%, 0 = aus)",
+            "min_run": "Minimale Segmentlänge (mm, 0 = aus)",
             "cmd_mode": "Laser-Befehlsmodus:",
             "m67_output": "M67 Ausgangsnummer (E):",
             "choose_image": "BITTE WÄHLEN SIE EIN BILD\nUM ZU BEGINNEN",
             "mem_warn_hard": "⚠ Matrix zu groß ({total:.1f}M px) — Bild wurde skaliert. DPI senken (z.B. {dpi_sug} statt {dpi_now}).",
             "mem_warn_soft": "⚠ Große Matrix ({total:.1f}M px) — Verarbeitung kann langsam sein. DPI senken (z.B. {dpi_sug} statt {dpi_now}).",
+            "mem_warn_ooc": "⚠ Sehr große Matrix ({total:.1f}M px) — wird auf der Festplatte verarbeitet (out-of-core). Erwarteter Spitzenspeicher: {peak:.0f} MB.",
             "ctrl_max_value": "Controller Max-Wert:",
             "firing_mode": "Zündmodus:",
             "gcode_header": "Header G-Code",
@@ -739,6 +789,9 @@ TRANSLATIONS = {
             "matrix_size": "MATRIXGRÖSSE",
             "scan_step": "SCAN-SCHRITT",
             "line_step": "ZEILENSCHRITT",
+            "engine": "BACKEND",
+            "block_rate": "SATZRATE",
+            "rows_merged": "Zeilen vereinfacht",
             "power_distribution": "Leistungsverteilung",
             "power_value": "Leistung (%)",
             "pixel_count": "Pixel (%)"
@@ -771,7 +824,8 @@ TRANSLATIONS = {
             "error_read_file": "Datei kann nicht gelesen werden:",
             "parse_error_title": "Analysefehler",
             "line_step_lbl": "Zeilenschritt (mm):",
-            "open_gcode_hint": "G-Code-Datei öffnen um zu beginnen"
+            "open_gcode_hint": "G-Code-Datei öffnen um zu beginnen",
+            "preview_truncated": "(… Vorschau auf die ersten {n} Zeilen begrenzt …)"
         }
     }
 }
\ No newline at end of file
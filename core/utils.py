@@ -5,6 +5,7 @@ A.L.I.G. Project - Utils
 
 import os
 import sys
+import numpy as np
 from PIL import Image
 import datetime
 from PyQt6.QtWidgets import (
@@ -28,9 +29,13 @@ def get_app_paths():
     
     return base_path, app_path
 
-def save_dashboard_data(config_manager, matrix, gcode_content, estimated_time=0):
+def save_dashboard_data(config_manager, matrix, gcode_content=None, estimated_time=0,
+                        levels=None, line_count=None):
     """
     Gère la miniature et les stats (incluant le temps de simulation)
+    `levels` : table niveau → puissance si `matrix` est une matrice d'indices.
+    `line_count` : nombre de lignes du G-Code écrit, si le texte n'est pas
+    en mémoire (écriture en flux) ; sinon compté dans `gcode_content`.
     """
     try:
         base_path, app_path = get_app_paths()
@@ -38,7 +43,13 @@ def save_dashboard_data(config_manager, matrix, gcode_content, estimated_time=0)
         os.makedirs(thumb_dir, exist_ok=True)
 
         # 1. Normalisation et Inversion
-        mat = matrix.astype('float32')
+        # Sous-échantillonnage préalable : la miniature fait 150 px, inutile
+        # de copier toute la matrice (peut être un np.memmap de 40 MP)
+        step = max(1, min(matrix.shape) // 600)
+        mat = np.asarray(matrix[::step, ::step])
+        if levels is not None:
+            mat = np.asarray(levels, dtype='float32')[mat]
+        mat = mat.astype('float32')
         min_val, max_val = mat.min(), mat.max()
         if max_val > min_val:
             mat = (mat - min_val) / (max_val - min_val) * 255
@@ -69,7 +80,10 @@ def save_dashboard_data(config_manager, matrix, gcode_content, estimated_time=0)
         current_time = float(config_manager.get_item("stats", "total_time_seconds", 0.0))
 
         # Calcul des nouvelles valeurs
-        new_lines = len(gcode_content.splitlines())
+        if line_count is not None:
+            new_lines = int(line_count)
+        else:
+            new_lines = len(gcode_content.splitlines())
         
         # Conversion forcée en types Python natifs
         total_lines_updated = int(current_lines + new_lines)
@@ -0,0 +1,77 @@
+"""
+A.L.I.G. Project - Engine backends
+Registre des moteurs de génération, sélectionnable par machine_settings
+"engine_backend".  Chaque entrée charge sa classe à la demande et retourne
+None si le backend est indisponible (dépendance absente).
+"""
+import os
+import sys
+
+DEFAULT_BACKEND = "numba"
+
+
+def _numpy_engine():
+    from engine.gcode_engine import GCodeEngine
+    return GCodeEngine
+
+
+def _numba_engine():
+    from engine import gcode_engine_numba
+    if not gcode_engine_numba.AVAILABLE:
+        return None
+    return gcode_engine_numba.GCodeEngine
+
+
+ENGINE_BACKENDS = {
+    "numpy": _numpy_engine,
+    "numba": _numba_engine,
+}
+
+
+def available_backends():
+    """Noms des backends utilisables dans cet environnement."""
+    return [name for name, loader in ENGINE_BACKENDS.items() if loader() is not None]
+
+
+def create_engine(name=None):
+    """
+    Instance du moteur `name` (DEFAULT_BACKEND si None).  Backend inconnu
+    ou indisponible : repli sur le moteur NumPy, signalé dans la console.
+    Le backend effectif est donné par engine.BACKEND.
+    """
+    name = str(name or DEFAULT_BACKEND).lower().strip()
+    loader = ENGINE_BACKENDS.get(name)
+    cls = loader() if loader is not None else None
+    if cls is None:
+        print(f"[ALIG] Backend moteur '{name}' indisponible, repli sur 'numpy'")
+        cls = _numpy_engine()
+    return cls()
+
+
+def configure_jit_cache(path):
+    """
+    Répertoire du cache disque des noyaux JIT (NUMBA_CACHE_DIR).  À appeler
+    avant le premier chargement du backend Numba : le cache d'une fonction
+    est localisé quand elle est décorée.
+    """
+    os.makedirs(path, exist_ok=True)
+    os.environ["NUMBA_CACHE_DIR"] = path
+    numba = sys.modules.get("numba")
+    if numba is not None:
+        numba.config.CACHE_DIR = path
+
+
+def warm_up_engine(name=None):
+    """
+    Charge le backend `name` et précompile ses noyaux (warm_up), pour un
+    appel en tâche de fond au démarrage.  Les erreurs sont seulement
+    signalées : le backend sera compilé au premier usage.
+    """
+    loader = ENGINE_BACKENDS.get(str(name or DEFAULT_BACKEND).lower().strip())
+    try:
+        cls = loader() if loader is not None else None
+        warm_up = getattr(cls, "warm_up", None)
+        if warm_up is not None:
+            warm_up()
+    except Exception as e:
+        print(f"[ALIG] Préchauffage du moteur impossible : {e}")
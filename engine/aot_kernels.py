@@ -0,0 +1,45 @@
+"""
+A.L.I.G. Project - AOT kernels
+Compilation ahead-of-time (numba.pycc) des noyaux du moteur Numba en un
+module d'extension engine/_alig_kernels.  L'exécutable figé construit
+avec `compiler.py --aot` l'utilise à la place de la compilation JIT :
+aucun temps de compilation au premier export, sans cache disque.
+Les noyaux AOT sont séquentiels (pycc ignore parallel=True).
+
+Usage : python engine/aot_kernels.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from numba.pycc import CC
+
+from engine.gcode_engine_numba import _block_pid, _emit_tokens, _filter_runs
+
+_PID_ARGS = ("int64[::1], int64[::1], int64[::1], float64[:, ::1], float64[::1], "
+             "boolean[::1], boolean[::1], intp[::1], int64, intp[::1], intp[::1], "
+             "intp[::1], boolean")
+
+
+def build(output_dir=None):
+    """Compile engine/_alig_kernels (extension native) dans `output_dir`."""
+    cc = CC("_alig_kernels")
+    cc.output_dir = output_dir or os.path.dirname(os.path.abspath(__file__))
+    cc.verbose = True
+    # Un export par type de code (matrice d'indices uint8 ou uint16)
+    for code_t in ("uint8", "uint16"):
+        cc.export(f"block_pid_{'u1' if code_t == 'uint8' else 'u2'}",
+                  f"intp[::1]({code_t}[:, ::1], {_PID_ARGS})")(_block_pid.py_func)
+        cc.export(f"filter_runs_{'u1' if code_t == 'uint8' else 'u2'}",
+                  f"{code_t}[:, ::1]({code_t}[:, ::1], float32[::1], float64, int64[::1])"
+                  )(_filter_runs.py_func)
+    cc.export("emit_tokens",
+              "int64(uint8[::1], int64[::1], int64[::1], intp[::1], uint8[::1])"
+              )(_emit_tokens.py_func)
+    cc.compile()
+    return cc.output_dir
+
+
+if __name__ == "__main__":
+    print(f"AOT kernels built in {build()}")
@@ -2,27 +2,158 @@
 A.L.I.G. Project - Core Engine
 Industrial Raster Engine Version
 """
-# TO DO : improve file siez estimation
 import numpy as np
 from PIL import Image
-import io
+import math
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import weakref
+import multiprocessing
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from engine.image_cache import source_cache, DEFAULT_PYRAMID_GAP
+
+
+# ─────────────────────────────────────────────────────────────────
+# Budget mémoire
+# Octets crête par pixel de matrice (image redimensionnée, matrice
+# d'indices, temporaires float du mode sans LUT) selon le mode tonalité.
+# ─────────────────────────────────────────────────────────────────
+_BYTES_PER_PX_LUT   = 4
+_BYTES_PER_PX_FLOAT = 32
+# Plafond historique, utilisé seulement si la RAM libre est inconnue
+_LEGACY_MAX_PIXELS  = 10_000_000
+# Hauteur des bandes du mode hors-mémoire (out-of-core)
+_OOC_STRIP_ROWS     = 256
+# Nombre de lignes de scan lues à la fois par le générateur, et pixels
+# au plus par bloc (tables de segments ~100 octets/pixel : borne la
+# mémoire de l'émission en flux pour les lignes très longues)
+_GEN_BLOCK_LINES    = 256
+_GEN_BLOCK_PX       = 256 * 1024
+# Redimensionnement par bandes en parallèle (Pillow libère le GIL) :
+# seulement au-delà de cette taille cible, bandes d'au moins 64 lignes
+_PARALLEL_RESIZE_MIN_PX = 1_000_000
+_PARALLEL_RESIZE_MIN_ROWS = 64
+# Génération G-Code multi-processus au-delà de cette taille de matrice
+# (démarrage des workers ~0.5 s)
+_PARALLEL_GEN_MIN_PX = 4_000_000
+# Tranche de lignes de scan par tâche de génération parallèle (en blocs
+# _GEN_BLOCK_LINES) : taille fixe, la mémoire en vol ne dépend que du
+# nombre de workers et pas de la taille du programme
+_GEN_RANGE_BLOCKS = 4
+# Filtre des paliers : paquets de lignes de scan d'au plus ~4 Mpx
+_FILTER_BLOCK_PX = 4 * 1024 * 1024
+
+
+def available_ram_bytes():
+    """RAM physique disponible en octets, ou None si indéterminable."""
+    try:
+        import psutil
+        return int(psutil.virtual_memory().available)
+    except Exception:
+        pass
+
+    if sys.platform == "win32":
+        try:
+            import ctypes
+
+            class _MemoryStatusEx(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong),
+                    ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong),
+                    ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong),
+                    ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong),
+                    ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            stat = _MemoryStatusEx()
+            stat.dwLength = ctypes.sizeof(stat)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+                return int(stat.ullAvailPhys)
+        except Exception:
+            pass
+        return None
+
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return int(os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"))
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _remove_file(path):
+    """Suppression d'un fichier temporaire (déjà supprimé ou encore ouvert : ignoré)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
 class GCodeEngine:
 
+    # Nom du backend (registre engine.ENGINE_BACKENDS), rappelé dans l'en-tête
+    BACKEND = "numpy"
+
     def __init__(self):
         self.matrix = None
         self.stats = {}
         self.last_gcode_body = []
+        # Cache du pipeline image : {étape: (clé, résultat)}
+        self._stage_cache = {}
+        self._stage_source = None
+        # Images sources décodées (LRU + pyramide), partagé entre instances
+        self.source_cache = source_cache
 
     # =========================================================
     # IMAGE PROCESSING PIPELINE (Industrial Stable Raster Core)
     # =========================================================
 
+    def _stage(self, name, key, compute):
+        """
+        Renvoie le résultat mémorisé de l'étape `name` si sa clé n'a pas
+        changé, sinon le recalcule via `compute()` et le mémorise.
+        Chaque clé inclut celle de l'étape amont : une étape n'est donc
+        réutilisée que si toute la chaîne qui la précède est identique.
+        """
+        cached = self._stage_cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        result = compute()
+        self._stage_cache[name] = (key, result)
+        return result
+
+    def clear_stage_cache(self):
+        """Vide le cache du pipeline (ex: changement d'image sur disque)."""
+        self._stage_cache.clear()
+        self._stage_source = None
+
     def process_image_logic(self, image_path, s, source_img_cache=None):
         """
         Traite l'image et calcule toute la géométrie.
         Force EXACTEMENT la dimension choisie par l'utilisateur.
+
+        Pipeline découpé en étapes mémorisées :
+            géométrie → redimensionnement → tonalité → quantification → stats
+        Chaque étape n'est recalculée que si les réglages dont elle dépend
+        changent (ex: modifier le gamma réutilise l'image redimensionnée,
+        modifier min/max power réutilise la tonalité).
         """
 
         # -------------------------------------------------
@@ -30,30 +161,342 @@ class GCodeEngine:
         # -------------------------------------------------
         l_step_val = max(0.0001, float(s.get("line_step", 0.1)))
         dpi_val = max(1, int(s.get("dpi", 254)))
-        
-        # Pas théorique basé sur le DPI
-        theoretical_scan_step = 25.4 / dpi_val
-        
         raster_mode = str(s.get("raster_mode", "horizontal")).strip().lower()
         feedrate = max(1.0, float(s.get("feedrate", 3000)))
-        force_dim = s.get("force_dim", False)
+        force_dim = bool(s.get("force_dim", False))
         target_dim = float(s.get("ui_dimension", 10.0))
 
         # -------------------------------------------------
         # 2) CHARGEMENT IMAGE
         # -------------------------------------------------
+        # Sans image fournie : cache LRU partagé, clé (chemin, mtime, taille),
+        # avec pyramide de réductions par 2 pour démarrer les redimensionnements.
+        # Seul l'en-tête est lu ici : le décodage (JPEG draft à la taille
+        # utile) attend la géométrie.
+        # exact_resample=True : décodage pleine résolution, sans pyramide ni
+        # bandes parallèles (résultat historique exact).
+        exact = bool(s.get("exact_resample", False))
+        img = source_img_cache or None
         try:
-            img = source_img_cache if source_img_cache else Image.open(image_path).convert("L")
+            src_size = img.size if img is not None else self.source_cache.source_size(image_path)
         except Exception as e:
             print(f"Erreur chargement image: {e}")
             return None, None, None, False
 
-        orig_w, orig_h = img.size
-        img_ratio = orig_h / orig_w if orig_w != 0 else 1.0
+        # -------------------------------------------------
+        # 3) GÉOMÉTRIE + PLAN MÉMOIRE
+        # -------------------------------------------------
+        # Mode LUT (défaut) : l'entrée étant en 8 bits, toute la chaîne
+        # tonalité + quantification est évaluée sur les 256 valeurs possibles
+        # puis appliquée en un seul gather. Résultat identique au mode float.
+        use_lut = bool(s.get("tone_lut", True))
+
+        geom_key = (src_size, l_step_val, dpi_val, raster_mode, force_dim, target_dim)
+        g = self._stage("geometry", geom_key, lambda: self._compute_geometry(
+            src_size, l_step_val, dpi_val, raster_mode, force_dim, target_dim))
+
+        # Le plafond dépend de la RAM libre (non mémorisé : elle varie)
+        g, mem_plan = self._plan_memory(g, src_size, raster_mode, l_step_val, use_lut, s)
+        w_px, h_px = g["w_px"], g["h_px"]
+        real_w, real_h = g["real_w"], g["real_h"]
+        scan_step = g["scan_step"]
+        out_of_core = mem_plan["mode"] == "out_of_core"
+
+        # -------------------------------------------------
+        # 4) REDIMENSIONNEMENT IMAGE (uint8)
+        # -------------------------------------------------
+        # Départ depuis le niveau de pyramide le plus réduit restant
+        # pyramid_gap fois plus grand que la cible (source_pyramid=False :
+        # toujours la pleine résolution).
+        gap = float(s.get("pyramid_gap", DEFAULT_PYRAMID_GAP))
+        if exact or not s.get("source_pyramid", True):
+            gap = 0.0
+        src_box = None
+        if img is None:
+            draft_size = None if exact or gap <= 0 else (w_px * gap, h_px * gap)
+            try:
+                entry = self.source_cache.get(image_path, draft_size)
+            except Exception as e:
+                print(f"Erreur chargement image: {e}")
+                return None, None, None, False
+            img = entry.image
+            src_key = entry.key
+            src_img, src_box = entry.level_for(w_px, h_px, gap)
+        else:
+            # La clé utilise id(img) : l'image précédente reste référencée tant
+            # que la nouvelle n'a pas été comparée, donc pas de réutilisation d'id.
+            src_key = (id(img), img.size)
+            src_img = img
+        self._stage_source = img
+
+        # Bandes parallèles : écart ≤ 1 niveau de gris sur ~0.01 % des pixels
+        threads = 1 if exact else int(s.get("resize_threads", os.cpu_count() or 1))
+        resize_key = (src_key, src_img.size, src_box, w_px, h_px, threads)
+        gray = None
+        if not out_of_core:
+            gray = self._stage("resize", resize_key, lambda: self._resize_gray(
+                src_img, w_px, h_px, src_box, threads))
+
+        # -------------------------------------------------
+        # 5) TONALITÉ (inversion, contraste, gamma + thermique)
+        # -------------------------------------------------
+        invert = bool(s.get("invert"))
+        contrast = float(s.get("contrast", 0))
+        combined_exp = float(s.get("gamma", 1.0)) * float(s.get("thermal", 1.0))
+        tone_key = (resize_key, use_lut, invert, contrast, combined_exp)
+        arr = None
+        if use_lut:
+            arr = self._stage("tone", tone_key, lambda: self._apply_tone(
+                np.arange(256, dtype=np.uint8), invert, contrast, combined_exp))
+        elif not out_of_core:
+            arr = self._stage("tone", tone_key, lambda: self._apply_tone(
+                gray, invert, contrast, combined_exp))
+
+        # -------------------------------------------------
+        # 6) QUANTIFICATION
+        # -------------------------------------------------
+        quant_level = max(2, int(s.get("gray_steps", 255)))
+        min_p = float(s.get("min_p", 0))
+        max_p = float(s.get("max_p", 255))
+        # La matrice stocke des indices de niveau (uint8) ; la table
+        # `levels` (puissances distinctes, triées) est déduite de la LUT :
+        # l'entrée 8 bits n'a que 256 valeurs, donc au plus 256 niveaux.
+        # quant_mode "cluster" : niveaux placés par partition optimale de
+        # l'histogramme des tons (toujours appliqués par LUT)
+        cluster = str(s.get("quant_mode", "uniform")).strip().lower() == "cluster"
+        quant_key = (tone_key, quant_level, min_p, max_p, out_of_core, cluster)
+        tone_lut = arr if use_lut else self._apply_tone(
+            np.arange(256, dtype=np.uint8), invert, contrast, combined_exp)
+        if cluster:
+            hist = self._stage("histogram", resize_key, lambda: (
+                np.asarray(src_img.histogram()[:256]) if gray is None
+                else np.bincount(gray.ravel(), minlength=256)))
+            power_lut = self._stage("clusters", quant_key, lambda: self._cluster_quantize(
+                tone_lut, hist, quant_level, min_p, max_p))
+        else:
+            power_lut = self._quantize(tone_lut, quant_level, min_p, max_p)
+        levels, index_lut = self._power_levels(power_lut)
+        if use_lut or cluster:
+            strip_fn = lambda g8: self._gather_lut(index_lut, g8)
+        else:
+            strip_fn = lambda g8: self._level_index(levels, self._quantize(
+                self._apply_tone(g8, invert, contrast, combined_exp),
+                quant_level, min_p, max_p))
+
+        if out_of_core:
+            # Redimensionnement + tonalité par bandes dans une matrice np.memmap
+            matrix = self._stage("quantize", quant_key, lambda: self._tiled_matrix(
+                src_img, w_px, h_px, strip_fn, s.get("ooc_dir"), index_lut.dtype,
+                src_box))
+        elif use_lut or cluster:
+            matrix = self._stage("quantize", quant_key, lambda: strip_fn(gray))
+        else:
+            matrix = self._stage("quantize", quant_key, lambda: self._level_index(
+                levels, self._quantize(arr, quant_level, min_p, max_p)))
 
         # -------------------------------------------------
-        # 3) CALCUL GÉOMÉTRIE (FORCE EXACT DIMENSION)
+        # 6b) FILTRE DE SEGMENTS (hystérésis + longueur minimale)
+        # -------------------------------------------------
+        # Appliqué le long du balayage, avant l'aperçu et la génération :
+        # écarts de puissance ≤ deadband ignorés, aucun changement de
+        # puissance avant min_run (mm) de palier.
+        deadband = max(0.0, float(s.get("power_deadband", 0.0) or 0.0))
+        min_run = max(0.0, float(s.get("min_run", 0.0) or 0.0))
+        min_px = int(math.ceil(min_run / scan_step - 1e-9)) if min_run > 0 else 0
+        if deadband > 0 or min_px > 1:
+            quant_key = (quant_key, raster_mode, deadband, min_px)
+            matrix = self._stage("runs", quant_key, lambda: self._filter_matrix(
+                matrix, levels, raster_mode, deadband, min_px, s.get("ooc_dir")))
+
+        # Débit de blocs du contrôleur (blocs/s, 0 = illimité) : paliers
+        # fusionnés sur les lignes qui le dépassent à la vitesse de gravure
+        max_rate = max(0.0, float(s.get("max_block_rate", 0.0) or 0.0))
+        rate_rows = 0
+        if max_rate > 0:
+            quant_key = (quant_key, raster_mode, max_rate, feedrate, scan_step)
+            matrix, rate_rows = self._stage("block_rate", quant_key, lambda: self._limit_block_rate(
+                matrix, levels, raster_mode, max_rate, feedrate, scan_step, s.get("ooc_dir")))
+
+        # -------------------------------------------------
+        # 7) OVERSCAN + RECTANGLES
         # -------------------------------------------------
+        overscan_dist = float(s.get("premove", 2.0))
+
+        if raster_mode == "horizontal":
+            num_lines = h_px
+            dist_per_line = real_w + (2 * overscan_dist)
+            rect_full = (-overscan_dist, 0, real_w + overscan_dist, real_h)
+            x_step = scan_step
+            y_step = l_step_val
+        else:
+            num_lines = w_px
+            dist_per_line = real_h + (2 * overscan_dist)
+            rect_full = (0, -overscan_dist, real_w, real_h + overscan_dist)
+            x_step = l_step_val
+            y_step = scan_step
+
+        # -------------------------------------------------
+        # 8) ESTIMATION TEMPS (profil trapézoïdal)
+        # -------------------------------------------------
+        # Chaque passe (overscan compris) et chaque décalage de ligne
+        # démarre et finit à l'arrêt ; acceleration = 0 → vitesse constante.
+        accel = float(s.get("acceleration", 0.0) or 0.0)
+        if s.get("trim_rows", False):
+            # Trajet rogné : mêmes étendues de ligne que le générateur
+            first, last = self._stage("extents", (quant_key, raster_mode), lambda: (
+                self._row_extents(*self._scan_blocks_for(
+                    matrix, raster_mode, {"levels": levels}), num_lines)))
+            scan_px = w_px if raster_mode == "horizontal" else h_px
+            pass_lengths, shift_lengths = self._trim_passes(
+                first, last, scan_px, scan_step, l_step_val, overscan_dist)
+        else:
+            pass_lengths = np.full(num_lines, dist_per_line)
+            shift_lengths = np.full(max(0, num_lines - 1), l_step_val)
+        est_sec = self.estimate_job_time(pass_lengths, shift_lengths, feedrate, accel)
+        gap_hop = float(s.get("gap_hop", 0.0) or 0.0)
+        if gap_hop > 0:
+            # Blancs internes franchis en G0 : mêmes règles que le générateur
+            gaps = self._stage("gaps", (quant_key, raster_mode), lambda: (
+                self._gap_runs(*self._scan_blocks_for(
+                    matrix, raster_mode, {"levels": levels}), num_lines))) * scan_step
+            gain = self._hop_gain(gaps, overscan_dist, feedrate,
+                                  float(s.get("rapid_feedrate", 6000.0) or 6000.0), accel)
+            est_sec -= float(gain[(gaps > gap_hop) & (gain > 0)].sum())
+        est_min = est_sec / 60.0
+
+        # -------------------------------------------------
+        # 9) TAILLE GCODE EXACTE
+        # -------------------------------------------------
+        # `gcode_job` : paramètres du payload de génération (params, framing,
+        # text_blocks, metadata, origin) pour prédire le fichier réel.
+        job = s.get("gcode_job") or {}
+        params = {"e_num": 0, "use_s_mode": False, "ctrl_max": 100.0,
+                  "laser_latency": 0.0, "gray_steps": quant_level,
+                  "premove": overscan_dist, "feedrate": s.get("feedrate", feedrate)}
+        params.update(job.get("params") or {})
+        params["raster_mode"] = raster_mode
+        dims = (h_px, w_px, y_step, x_step)
+        stats_key = (quant_key, dims, job)
+        est_size_str, n_gcode_lines, n_gcode_bytes = self._stage(
+            "stats", stats_key, lambda: self._job_statistics(
+                matrix, levels, dims, real_w, real_h, params, job))
+
+        # -------------------------------------------------
+        # 10) GEOM FINAL CONSOLIDÉ
+        # -------------------------------------------------
+        geom = {
+            "w_px":   w_px,
+            "h_px":   h_px,
+            "real_w": real_w,
+            "real_h": real_h,
+            "x_step": x_step,
+            "y_step": y_step,
+            "l_step": l_step_val,
+            "scan_step": scan_step,
+            "overscan_dist": overscan_dist,
+            "est_min": est_min,
+            "rect_burn": (0, 0, real_w, real_h),
+            "rect_full": rect_full,
+            "power_levels": levels,
+            "file_size_str": est_size_str,
+            "gcode_lines": n_gcode_lines,
+            "gcode_bytes": n_gcode_bytes,
+            "raster_mode": raster_mode,
+            "mem_plan": mem_plan,
+            "peak_mem_bytes": mem_plan["peak_bytes"],
+            "block_rate_rows": rate_rows,
+        }
+
+        return matrix, img, geom, g["mem_warn"]
+
+    def _job_statistics(self, matrix, levels, dims, real_w, real_h, params, job):
+        """Statistiques du fichier final pour un job décrit comme le payload."""
+        origin_mode, cx, cy = job.get("origin", ("Lower-Left", 0.0, 0.0))
+        offsets = self.calculate_offsets(origin_mode, real_w, real_h, cx, cy)
+        framing = job.get("framing")
+        framing_code = (self.prepare_framing(framing, (real_w, real_h), offsets)
+                        if framing else "")
+        metadata = {"version": "", "mode": "", "firing_cmd": "M3"}
+        metadata.update(job.get("metadata") or {})
+        metadata.update({"framing_code": framing_code,
+                         "gray_steps": params.get("gray_steps")})
+        text_blocks = job.get("text_blocks") or {"header": "", "footer": ""}
+        return self.get_gcode_statistics(
+            matrix, dims, offsets, params, text_blocks, metadata, levels=levels)
+
+    @staticmethod
+    def _trim_passes(first, last, n, step_scan, step_main, pre):
+        """
+        Longueurs des passes et des décalages d'un trajet rogné : seules les
+        lignes non vides sont parcourues, en serpentin, chaque passe allant
+        d'overscan à overscan ; un décalage relie la fin d'une passe au
+        départ de la suivante (éventuellement plusieurs lignes plus loin).
+        n : pixels par ligne de scan (passe bornée à (n - 1)·step_scan).
+        """
+        rows = np.nonzero(first >= 0)[0]
+        a = first[rows] * step_scan
+        b = np.minimum(last[rows] + 1, n - 1) * step_scan
+        fwd = np.arange(rows.size) % 2 == 0
+        pre_start = np.where(fwd, a - pre, b + pre)
+        pre_end = np.where(fwd, b + pre, a - pre)
+        pass_lengths = np.abs(pre_end - pre_start)
+        shift_lengths = np.hypot(np.diff(rows) * step_main, pre_start[1:] - pre_end[:-1])
+        return pass_lengths, shift_lengths
+
+    @staticmethod
+    def estimate_job_time(pass_lengths, shift_lengths, feedrate, accel):
+        """
+        Durée (s) d'un job raster, profil de vitesse trapézoïdal par mouvement.
+        Une passe de scan est une suite de G1 colinéaires que le planificateur
+        enchaîne sans ralentir : elle ne s'arrête qu'aux inversions.
+        Pour une distance d à la vitesse v (mm/s) et l'accélération a (mm/s²) :
+            d >= v²/a : t = d/v + v/a   (accélération, croisière, freinage)
+            d <  v²/a : t = 2·√(d/a)    (profil triangulaire, v jamais atteinte)
+        """
+        d = np.concatenate((np.asarray(pass_lengths, dtype=np.float64).ravel(),
+                            np.asarray(shift_lengths, dtype=np.float64).ravel()))
+        return float(GCodeEngine._move_times(d, feedrate, accel).sum())
+
+    @staticmethod
+    def _move_times(d, feedrate, accel):
+        """Durée (s) de chaque mouvement de longueur d (profil de estimate_job_time)."""
+        v = max(1.0, float(feedrate)) / 60.0
+        d = np.asarray(d, dtype=np.float64)
+        if not accel or accel <= 0:
+            return d / v
+        return np.where(d >= v * v / accel,
+                        d / v + v / accel,
+                        2.0 * np.sqrt(d / accel))
+
+    @staticmethod
+    def _hop_gain(gap, pre, feedrate, rapid_feedrate, accel):
+        """
+        Temps gagné (s) en franchissant un blanc de longueur `gap` (mm) par
+        un saut rapide plutôt qu'à la vitesse de gravure.  La passe est
+        coupée en deux : overscan de sortie et d'entrée (2·pre), un freinage
+        et une accélération de plus (v/a), puis G0 de gap - 2·pre.
+        Négatif si le saut est plus lent (ou impossible : gap <= 2·pre).
+        """
+        v = max(1.0, float(feedrate)) / 60.0
+        gap = np.asarray(gap, dtype=np.float64)
+        hop = np.maximum(gap - 2.0 * pre, 0.0)
+        ramp = v / accel if accel and accel > 0 else 0.0
+        gain = hop / v - ramp - GCodeEngine._move_times(hop, rapid_feedrate, accel)
+        return np.where(gap > 2.0 * pre, gain, -1.0)
+
+    # ─────────────────────────────────────────────────────────────────
+    # Étapes du pipeline image (appelées via _stage)
+    # ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _compute_geometry(img_size, l_step_val, dpi_val, raster_mode, force_dim, target_dim):
+        """Dimensions pixels/mm forcées sur la cote choisie (+ limite mémoire)."""
+        orig_w, orig_h = img_size
+        img_ratio = orig_h / orig_w if orig_w != 0 else 1.0
+
+        # Pas théorique basé sur le DPI
+        theoretical_scan_step = 25.4 / dpi_val
+
         if raster_mode == "horizontal":
             # 1. Calcul du nombre de pixels pour la largeur
             w_px = max(2, int(round(target_dim / theoretical_scan_step)) + 1)
@@ -88,268 +531,1428 @@ class GCodeEngine:
             w_px = max(2, int(round(real_w / l_step_val)) + 1)
             real_w = (w_px - 1) * l_step_val
 
-        # -------------------------------------------------
-        # 4) LIMITE MÉMOIRE (10MP) - RECALCUL SÉCURISÉ
-        # -------------------------------------------------
-        MAX_TOTAL_PIXELS = 10_000_000
-        current_pixels = w_px * h_px
-        mem_warn = current_pixels > 2_000_000
+        # Avertissement "matrice lourde" (le plafond est décidé par _plan_memory)
+        mem_warn = (w_px * h_px) > 2_000_000
 
-        if current_pixels > MAX_TOTAL_PIXELS:
-            scale = np.sqrt(MAX_TOTAL_PIXELS / current_pixels)
-            w_px = max(2, int(w_px * scale))
-            h_px = max(2, int(h_px * scale))
+        return {
+            "w_px": w_px,
+            "h_px": h_px,
+            "real_w": real_w,
+            "real_h": real_h,
+            "scan_step": scan_step,
+            "mem_warn": mem_warn,
+        }
 
-            # Mise à jour des dimensions réelles avec le scan_step calculé au point 3
-            if raster_mode == "horizontal":
-                real_w = (w_px - 1) * scan_step
-                real_h = (h_px - 1) * l_step_val
-            else:
-                real_w = (w_px - 1) * l_step_val
-                real_h = (h_px - 1) * scan_step
+    @staticmethod
+    def _plan_memory(g, src_size, raster_mode, l_step_val, use_lut, s):
+        """
+        Choisit entre traitement en mémoire et hors-mémoire (np.memmap par
+        bandes) selon la RAM libre, et prédit la mémoire crête du job.
+
+        - en mémoire si la crête prévue tient dans ram_fraction de la RAM libre ;
+        - sinon hors-mémoire (out_of_core, actif par défaut) : la crête ne
+          dépend plus que de la largeur des bandes, la matrice est sur disque ;
+        - sinon (out_of_core=False, ou disque plein) : réduction de la
+          définition jusqu'à tenir dans le budget, comme l'ancien plafond 10MP.
+        Retourne (géométrie éventuellement réduite, plan).
+        """
+        w_px, h_px = g["w_px"], g["h_px"]
+        src_w, src_h = src_size
+        px = w_px * h_px
+        bpp = _BYTES_PER_PX_LUT if use_lut else _BYTES_PER_PX_FLOAT
+
+        avail = available_ram_bytes()
+        ram_fraction = min(0.95, max(0.05, float(s.get("ram_fraction", 0.5))))
+        if avail is None:
+            budget = _LEGACY_MAX_PIXELS * bpp
+        else:
+            budget = int(avail * ram_fraction)
+
+        # Crête en mémoire : matrice + passe horizontale PIL (w_px x src_h)
+        def in_core_peak(w, h):
+            return w * h * bpp + w * src_h
+
+        # Crête hors-mémoire : une bande source + une bande cible + blocs du générateur
+        def ooc_peak(w, h):
+            src_rows = int(np.ceil(src_h / max(1, h) * _OOC_STRIP_ROWS)) + 4
+            return (w * src_rows + _OOC_STRIP_ROWS * w * bpp
+                    + _GEN_BLOCK_LINES * max(w, h) * 8)
+
+        plan = {
+            "mode": "in_core",
+            "requested_px": px,
+            "avail_bytes": avail,
+            "budget_bytes": budget,
+            "peak_bytes": in_core_peak(w_px, h_px),
+            "rescaled": False,
+        }
+        if plan["peak_bytes"] <= budget:
+            return g, plan
 
+        max_px = max(4, budget // bpp)
+        if bool(s.get("out_of_core", True)):
+            disk_dir = s.get("ooc_dir") or tempfile.gettempdir()
+            try:
+                disk_free = shutil.disk_usage(disk_dir).free
+            except OSError:
+                disk_free = 0
+            # Matrice d'indices uint8 : 1 octet par pixel sur disque
+            if px <= disk_free * 0.9:
+                plan["mode"] = "out_of_core"
+                plan["peak_bytes"] = ooc_peak(w_px, h_px)
+                plan["disk_bytes"] = px
+                return g, plan
+            max_px = min(max_px, int(disk_free * 0.9))
+
+        # Réduction : même règle que l'ancien plafond MAX_TOTAL_PIXELS
+        scale = np.sqrt(max(4, max_px) / px)
+        w_px = max(2, int(w_px * scale))
+        h_px = max(2, int(h_px * scale))
+        scan_step = g["scan_step"]
+        if raster_mode == "horizontal":
+            real_w = (w_px - 1) * scan_step
+            real_h = (h_px - 1) * l_step_val
+        else:
+            real_w = (w_px - 1) * l_step_val
+            real_h = (h_px - 1) * scan_step
 
+        g = dict(g, w_px=w_px, h_px=h_px, real_w=real_w, real_h=real_h)
+        plan["rescaled"] = True
+        plan["peak_bytes"] = in_core_peak(w_px, h_px)
+        return g, plan
 
-        # -------------------------------------------------
-        # 5) REDIMENSIONNEMENT IMAGE
-        # -------------------------------------------------
-        img_resized = img.resize((w_px, h_px), Image.Resampling.BICUBIC)
-        arr = np.asarray(img_resized, dtype=np.float32) / 255.0
+    @staticmethod
+    def _resize_gray(img, w_px, h_px, box=None, threads=1):
+        """
+        Redimensionnement BICUBIC vers (w_px, h_px) en uint8.  Les grandes
+        cibles sont découpées en bandes horizontales redimensionnées en
+        parallèle (resize(box=...) par bande, Pillow libère le GIL).
+        """
+        n = min(threads, h_px // _PARALLEL_RESIZE_MIN_ROWS)
+        if n <= 1 or w_px * h_px < _PARALLEL_RESIZE_MIN_PX:
+            return np.asarray(img.resize((w_px, h_px), Image.Resampling.BICUBIC,
+                                         box=box), dtype=np.uint8)
+
+        bx0, by0, bx1, by1 = box if box else (0, 0) + img.size
+        sy = (by1 - by0) / h_px
+        edges = np.linspace(0, h_px, n + 1).astype(int)
+
+        def strip(i):
+            y0, y1 = int(edges[i]), int(edges[i + 1])
+            return np.asarray(img.resize(
+                (w_px, y1 - y0), Image.Resampling.BICUBIC,
+                box=(bx0, by0 + y0 * sy, bx1, by0 + y1 * sy)), dtype=np.uint8)
+
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            return np.concatenate(list(pool.map(strip, range(n))))
+
+    @staticmethod
+    def _tiled_matrix(img, w_px, h_px, strip_fn, ooc_dir=None, dtype=np.uint8,
+                      src_box=None):
+        """
+        Redimensionne et convertit l'image en indices de niveau par bandes
+        horizontales de _OOC_STRIP_ROWS lignes, dans une matrice np.memmap
+        (fichier temporaire nommé, voir _ooc_memmap).
+        Les bandes utilisent resize(box=...) : écart d'au plus 1 niveau de
+        gris sur ~0.1 % des pixels par rapport au redimensionnement global.
+        """
+        # src_box : zone source dans les coordonnées d'un niveau de pyramide
+        src_w, src_h = src_box[2:] if src_box else img.size
+        sy = src_h / h_px
+
+        out = GCodeEngine._ooc_memmap((h_px, w_px), dtype, ooc_dir)
+
+        for y0 in range(0, h_px, _OOC_STRIP_ROWS):
+            y1 = min(h_px, y0 + _OOC_STRIP_ROWS)
+            strip = img.resize((w_px, y1 - y0), Image.Resampling.BICUBIC,
+                               box=(0, y0 * sy, src_w, y1 * sy))
+            out[y0:y1] = strip_fn(np.asarray(strip, dtype=np.uint8))
+        out.flush()
+        return out
+
+    @staticmethod
+    def _ooc_memmap(shape, dtype, ooc_dir=None):
+        """
+        Matrice np.memmap sur un fichier temporaire nommé (ooc_dir ou
+        dossier temporaire) : les workers de génération le rouvrent par son
+        nom (_share_matrix).  Le fichier est supprimé quand plus aucun
+        tableau n'utilise sa projection, au plus tard à la sortie.
+        """
+        fd, path = tempfile.mkstemp(prefix="alig_ooc_", suffix=".bin",
+                                    dir=ooc_dir or None)
+        os.close(fd)
+        try:
+            out = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+        except BaseException:
+            _remove_file(path)
+            raise
+        weakref.finalize(out.base, _remove_file, path)
+        return out
+
+    @staticmethod
+    def _apply_tone(gray, invert, contrast, combined_exp):
+        """
+        Inversion laser, contraste et gamma+thermique sur [0, 1].
+        Opérations élément par élément : appliquée à np.arange(256) elle
+        produit directement la table (LUT) du mode tone_lut.
+        """
+        arr = gray.astype(np.float32) / 255.0
 
         # Inversion laser
-        if not s.get("invert"):
+        if not invert:
             arr = 1.0 - arr
 
         # Contraste
-        contrast = float(s.get("contrast", 0))
         if contrast != 0:
             f = (259 * (contrast + 1.0)) / (255 * (259 - contrast)) * 255
             arr = np.clip((arr - 0.5) * f + 0.5, 0, 1)
 
         # Gamma + thermique
-        gamma = float(s.get("gamma", 1.0))
-        thermal = float(s.get("thermal", 1.0))
-        combined_exp = gamma * thermal
         if combined_exp != 1.0:
             arr = np.power(arr, combined_exp)
 
-        # -------------------------------------------------
-        # 6) QUANTIFICATION
-        # -------------------------------------------------
-        QUANT_LEVEL = max(2, int(s.get("gray_steps", 255)))
-        min_p = float(s.get("min_p", 0))
-        max_p = float(s.get("max_p", 255))
+        return arr
 
+    @staticmethod
+    def _quantize(arr, quant_level, min_p, max_p):
+        """Quantification en `quant_level` niveaux puis mise à l'échelle min_p..max_p."""
         norm = np.clip(arr, 0, 1)
-        quant = np.round(norm * (QUANT_LEVEL - 1)) / (QUANT_LEVEL - 1)
+        quant = np.round(norm * (quant_level - 1)) / (quant_level - 1)
         matrix = min_p + quant * (max_p - min_p)
 
         matrix *= (arr >= 0.005).astype(np.float32)
+        return matrix
 
-        # -------------------------------------------------
-        # 7) OVERSCAN + RECTANGLES
-        # -------------------------------------------------
-        overscan_dist = float(s.get("premove", 2.0))
-
-        if raster_mode == "horizontal":
-            num_lines = h_px
-            dist_per_line = real_w + (2 * overscan_dist)
-            rect_full = (-overscan_dist, 0, real_w + overscan_dist, real_h)
-            x_step = scan_step
-            y_step = l_step_val
+    @staticmethod
+    def _cluster_quantize(tone_lut, hist, quant_level, min_p, max_p):
+        """
+        Variante adaptative de _quantize sur la table des 256 tons : les tons
+        gravés (>= 0.005) sont regroupés en `quant_level` classes minimisant
+        l'écart quadratique pondéré par l'histogramme `hist` (partition
+        optimale 1-D par programmation dynamique, O(niveaux · tons²)).
+        Chaque ton prend le centre de sa classe, puis l'échelle min_p..max_p.
+        """
+        norm = np.clip(np.asarray(tone_lut, dtype=np.float64), 0, 1)
+        burn = np.asarray(tone_lut) >= 0.005
+        weight = np.where(burn, np.asarray(hist, dtype=np.float64), 0.0)
+        # Tons distincts présents, triés, poids cumulés
+        vals, inv = np.unique(norm[weight > 0], return_inverse=True)
+        w = np.bincount(inv, weights=weight[weight > 0], minlength=vals.size)
+        n = vals.size
+        if n == 0:
+            centres = np.unique(norm[burn])
         else:
-            num_lines = w_px
-            dist_per_line = real_h + (2 * overscan_dist)
-            rect_full = (0, -overscan_dist, real_w, real_h + overscan_dist)
-            x_step = l_step_val
-            y_step = scan_step
-
-        dist_decalage_total = (num_lines - 1) * l_step_val
-        # -------------------------------------------------
-        # 8) ESTIMATION TEMPS (FIABLE)
-        # -------------------------------------------------
-        dist_gravure = num_lines * dist_per_line
-        total_dist = dist_gravure + dist_decalage_total
-        est_min = (total_dist / feedrate) 
-
-        # -------------------------------------------------
-        # 9) ESTIMATION TAILLE GCODE
-        # -------------------------------------------------
-        gc_params_est = {
-            "use_s_mode": s.get("use_s_mode", False),
-            "raster_mode": raster_mode,
-            "ctrl_max": max_p
-        }
+            k = min(quant_level, n)
+            cw = np.concatenate(([0.0], np.cumsum(w)))
+            cwv = np.concatenate(([0.0], np.cumsum(w * vals)))
+            cwv2 = np.concatenate(([0.0], np.cumsum(w * vals * vals)))
+            # sse[i, j] : erreur de la classe formée des tons i..j-1
+            i, j = np.triu_indices(n + 1, 1)
+            sse = np.full((n + 1, n + 1), np.inf)
+            sw, swv = cw[j] - cw[i], cwv[j] - cwv[i]
+            sse[i, j] = np.maximum(cwv2[j] - cwv2[i] - swv * swv / sw, 0.0)
+            cost = sse[0].copy()
+            cut = np.zeros((k, n + 1), dtype=np.int64)
+            for c in range(1, k):
+                total = cost[:, None] + sse
+                cut[c] = np.argmin(total, axis=0)
+                cost = total[cut[c], np.arange(n + 1)]
+            # Remontée des bornes de classes
+            bounds = [n]
+            for c in range(k - 1, 0, -1):
+                bounds.append(int(cut[c, bounds[-1]]))
+            bounds.append(0)
+            bounds = np.array(bounds[::-1])
+            centres = ((cwv[bounds[1:]] - cwv[bounds[:-1]])
+                       / (cw[bounds[1:]] - cw[bounds[:-1]]))
+        # Tout ton gravé (présent ou non dans l'histogramme) → centre le plus proche
+        if centres.size:
+            mid = (centres[1:] + centres[:-1]) / 2
+            quant = centres[np.searchsorted(mid, norm)]
+        else:
+            quant = norm
+        matrix = (min_p + quant * (max_p - min_p)).astype(np.float32)
+        matrix *= burn.astype(np.float32)
+        return matrix
 
-        est_size_str, _ = self.get_gcode_statistics(matrix, s, gc_params_est)
+    @staticmethod
+    def _map_scan_lines(matrix, raster_mode, fn, ooc_dir=None):
+        """
+        Copie de la matrice d'indices transformée par `fn` (k lignes de scan
+        × n pixels contigus → même forme), ligne de scan par ligne de scan
+        (colonnes en vertical), par paquets d'environ _FILTER_BLOCK_PX
+        pixels ; une matrice hors-mémoire donne un nouveau np.memmap.
+        """
+        if isinstance(matrix, np.memmap):
+            out = GCodeEngine._ooc_memmap(matrix.shape, matrix.dtype, ooc_dir)
+        else:
+            out = np.empty_like(matrix)
+        src, dst = (matrix, out) if raster_mode == "horizontal" else (matrix.T, out.T)
+        step = max(1, _FILTER_BLOCK_PX // max(1, src.shape[1]))
+        for r0 in range(0, src.shape[0], step):
+            r1 = min(src.shape[0], r0 + step)
+            dst[r0:r1] = fn(np.ascontiguousarray(src[r0:r1]))
+        return out
+
+    def _filter_matrix(self, matrix, levels, raster_mode, deadband, min_px, ooc_dir=None):
+        """Copie de la matrice filtrée par _run_filter le long du balayage."""
+        pw = np.asarray(levels, dtype=np.float32)
+        return self._map_scan_lines(matrix, raster_mode, lambda lines: self._run_filter(
+            lines, pw, deadband, min_px), ooc_dir)
+
+    @staticmethod
+    def _block_demand(lines, pw, scan_step, feedrate):
+        """
+        Débit de blocs demandé par ligne (blocs/s) : paliers entre le premier
+        et le dernier pixel gravé, rapportés à la durée de ce trajet à
+        `feedrate` (mm/min).  0 pour une ligne sans gravure.
+        """
+        k, n = lines.shape
+        burn = pw[lines] > 0
+        any_burn = burn.any(axis=1)
+        first = np.argmax(burn, axis=1)
+        last = n - 1 - np.argmax(burn[:, ::-1], axis=1)
+        change = np.zeros((k, n), dtype=bool)
+        change[:, 1:] = lines[:, 1:] != lines[:, :-1]
+        cols = np.arange(n)
+        inside = (cols > first[:, None]) & (cols <= last[:, None])
+        segs = (change & inside).sum(axis=1) + 1
+        duration = (last - first + 1) * scan_step / (feedrate / 60.0)
+        return np.where(any_burn, segs / duration, 0.0)
+
+    def _limit_block_rate(self, matrix, levels, raster_mode, max_rate, feedrate,
+                          scan_step, ooc_dir=None):
+        """
+        Respect du débit de blocs du contrôleur : les lignes dont la demande
+        (_block_demand) dépasse `max_rate` sont refiltrées par _run_filter
+        avec la plus petite durée minimale de palier qui les fait passer
+        sous le budget, au plus la durée d'un bloc au débit maximal (plus
+        aucun palier plus court que 1/max_rate s, hors passages gravé ↔
+        éteint).  La demande ne croît pas avec la durée minimale : elle est
+        cherchée par dichotomie, ligne par ligne.
+        Retourne (matrice, nombre de lignes modifiées).
+        """
+        pw = np.asarray(levels, dtype=np.float32)
+        px_max = max(2, int(math.ceil(feedrate / 60.0 / max_rate / scan_step - 1e-9)))
+        n_rows = [0]
+
+        def limit(lines):
+            over = np.flatnonzero(self._block_demand(lines, pw, scan_step, feedrate) > max_rate)
+            n_rows[0] += over.size
+            if not over.size:
+                return lines
+            # Chaque durée repart des lignes d'origine ; lo hors budget
+            # (1 = ligne d'origine), hi = px_max ou dans le budget
+            orig = lines[over]
+            best = self._run_filter(orig, pw, 0.0, px_max)
+            lo = np.ones(over.size, dtype=np.int64)
+            hi = np.full(over.size, px_max, dtype=np.int64)
+            todo = np.flatnonzero(hi - lo > 1)
+            while todo.size:
+                mid = (lo[todo] + hi[todo]) // 2
+                sub = self._run_filter(orig[todo], pw, 0.0, mid)
+                ok = self._block_demand(sub, pw, scan_step, feedrate) <= max_rate
+                hi[todo[ok]] = mid[ok]
+                lo[todo[~ok]] = mid[~ok]
+                best[todo[ok]] = sub[ok]
+                todo = todo[hi[todo] - lo[todo] > 1]
+            lines[over] = best
+            return lines
+
+        return self._map_scan_lines(matrix, raster_mode, limit, ooc_dir), n_rows[0]
+
+    @staticmethod
+    def _run_filter(lines, pw, deadband, min_px):
+        """
+        Filtre des paliers de chaque ligne (k lignes × n pixels d'indices,
+        puissances pw[indice]), séquentiel le long de la ligne et vectorisé
+        sur les k lignes.  La valeur tenue ne suit le pixel courant que si
+        sa puissance s'en écarte de plus de `deadband` et que le palier
+        tenu dure déjà `min_px` pixels (scalaire, ou une valeur par ligne).
+        Les passages gravé ↔ éteint sont toujours suivis : les zones
+        éteintes ne sont jamais modifiées.
+        """
+        out = np.empty_like(lines)
+        held = lines[:, 0].copy()
+        run = np.ones(held.shape, dtype=np.int64)
+        out[:, 0] = held
+        for j in range(1, lines.shape[1]):
+            v = lines[:, j]
+            pv, ph = pw[v], pw[held]
+            keep = (pv > 0) & (ph > 0) & ((np.abs(pv - ph) <= deadband) | (run < min_px))
+            run = np.where(keep | (v == held), run + 1, 1)
+            held = np.where(keep, held, v)
+            out[:, j] = held
+        return out
+
+    @staticmethod
+    def _gather_lut(lut, gray):
+        """Applique une table de 256 entrées à l'image uint8 (un seul gather)."""
+        return lut[gray]
 
-        # -------------------------------------------------
-        # 10) GEOM FINAL CONSOLIDÉ
-        # -------------------------------------------------
-        geom = {
-            "w_px": w_px,
-            "h_px": h_px,
-            "w_px":   w_px,
-            "h_px":   h_px,
-            "real_w": real_w,
-            "real_h": real_h,
-            "x_step": x_step,
-            "y_step": y_step,
-            "l_step": l_step_val,
-            "scan_step": scan_step,
-            "overscan_dist": overscan_dist,
-            "est_min": est_min,
-            "rect_burn": (0, 0, real_w, real_h),
-            "rect_full": rect_full,
-            "file_size_str": est_size_str,
-            "raster_mode": raster_mode
-        }
+    # ─────────────────────────────────────────────────────────────────
+    # Matrice d'indices de niveau + table niveau → puissance
+    # ─────────────────────────────────────────────────────────────────
 
-        return matrix, img, geom, mem_warn
+    @staticmethod
+    def _power_levels(power_lut):
+        """
+        Déduplique exactement une table de puissances (float32).
+        Retourne (levels triés, index_lut) avec levels[index_lut] == power_lut ;
+        index_lut est en uint8 (uint16 au-delà de 256 niveaux).
+        """
+        levels, inverse = np.unique(power_lut, return_inverse=True)
+        dtype = np.uint8 if len(levels) <= 256 else np.uint16
+        return levels, inverse.reshape(np.shape(power_lut)).astype(dtype)
+
+    @staticmethod
+    def _level_index(levels, powers):
+        """Indices de niveau d'une matrice de puissances (valeurs toutes dans levels)."""
+        dtype = np.uint8 if len(levels) <= 256 else np.uint16
+        return np.searchsorted(levels, powers).astype(dtype)
+
+    @staticmethod
+    def power_matrix(matrix, levels):
+        """Matrice de puissances (float32) à partir des indices et de la table."""
+        if levels is None:
+            return np.asarray(matrix, dtype=np.float32)
+        return np.asarray(levels, dtype=np.float32)[np.asarray(matrix)]
 
     # =========================================================
     # INDUSTRIAL RASTER GCODE GENERATOR
     # =========================================================
 
     # ─────────────────────────────────────────────────────────────────
-    # Génération vectorisée : NumPy pour les segments + threads pour
-    # les lignes.  hyst_p est local à chaque ligne (pas d'état partagé).
+    # Émetteur par table de jetons : toutes les chaînes Q/S (une par
+    # puissance) et toutes les coordonnées "%.4f" (une par colonne et par
+    # sens) sont formatées une seule fois ; chaque ligne de segment est la
+    # concaténation de deux jetons, assemblée bloc par bloc en bytes.
+    # ─────────────────────────────────────────────────────────────────
+
+    def generate_gcode_list(self, matrix, h_px, w_px, l_step, x_st, offX, offY, gc,
+                            segments=None):
+        """
+        Génération G-Code optimisée : texte complet (voir iter_gcode_chunks).
+        """
+        return b"".join(self.iter_gcode_chunks(
+            matrix, h_px, w_px, l_step, x_st, offX, offY, gc,
+            segments=segments)).decode("ascii")
+
+    def iter_gcode_chunks(self, matrix, h_px, w_px, l_step, x_st, offX, offY, gc,
+                          segments=None):
+        """
+        Corps raster en morceaux bytes (ASCII, fins de ligne "\\n") : l'en-tête
+        puis un morceau par bloc de lignes de scan (ou par tranche en mode
+        parallèle), puis le pied (retour en G90 en mode relatif).  La
+        concaténation des morceaux est identique octet pour octet au texte
+        ligne à ligne, quel que soit le nombre de workers.
+        segments : liste optionnelle qui reçoit, dans l'ordre du texte, les
+        parties ("lines", table de segments d'un bloc, _block_lines) ou
+        ("text", octets) pour l'en-tête, le pied et les blocs compacts.
+        """
+        plan = self._raster_plan(h_px, w_px, l_step, x_st, offX, offY, gc)
+        head = "".join(line + "\n" for line in plan["header"]).encode("ascii")
+        if segments is not None:
+            segments.append(("text", head))
+        yield head
+        if plan["outer_range"] > 0 and plan["inner_count"] > 0:
+            yield from self._iter_body_chunks(matrix, plan, gc, segments)
+        if plan["footer"]:
+            foot = "".join(line + "\n" for line in plan["footer"]).encode("ascii")
+            if segments is not None:
+                segments.append(("text", foot))
+            yield foot
+
+    def _iter_body_chunks(self, matrix, plan, gc, segments):
+        """Morceaux bytes de toutes les lignes de scan (voir iter_gcode_chunks)."""
+        self._trim_rows(matrix, plan, gc)
+
+        workers = self._gen_workers(gc, plan)
+        # Matrice hors-mémoire non relisible par son fichier (vue partielle) :
+        # séquentiel plutôt qu'une copie entière en mémoire partagée
+        if isinstance(matrix, np.memmap) and self._file_source(matrix) is None:
+            workers = 1
+        if workers > 1:
+            emitted = False
+            try:
+                for chunk, parts in self._iter_parallel_chunks(
+                        matrix, plan, gc, workers, segments is not None):
+                    emitted = True
+                    if segments is not None:
+                        segments.extend(parts)
+                    yield chunk
+                return
+            except (OSError, BrokenProcessPool) as e:
+                if emitted:
+                    raise
+                print(f"[ALIG] Génération parallèle indisponible ({e}), repli séquentiel")
+        yield from self._iter_range_chunks(matrix, plan, gc, 0, plan["outer_range"],
+                                           segments)
+
+    def _iter_range_chunks(self, matrix, plan, gc, start, stop, segments=None):
+        """
+        Morceaux bytes des lignes de scan [start, stop) (ordre machine) ;
+        parties de la table de segments ajoutées à `segments` si fourni.
+        """
+        blocks, powers = self._scan_blocks_for(matrix, plan["raster_mode"], gc,
+                                               start, stop)
+        table = self._raster_tokens(plan, powers)
+        tokens = table["tokens"]
+        o0 = start
+        for blk in blocks:
+            k = min(blk.shape[0], stop - o0)
+            if k <= 0:
+                break
+            pid, local = self._block_pieces(blk[:k], o0, plan, table, powers)
+            chunk = self._join_tokens(np.concatenate((tokens, local)), pid)
+            if segments is not None:
+                if plan["compact"]:
+                    segments.append(("text", chunk))
+                else:
+                    lines = self._block_lines(blk[:k], o0, plan, table, powers)
+                    # Bloc entièrement vide (rognage) : aucune ligne émise
+                    if lines["rapid"].size:
+                        segments.append(("lines", lines))
+            yield chunk
+            o0 += k
+
+    # ─────────────────────────────────────────────────────────────────
+    # Génération parallèle : chaque ligne de scan ne dépend que de ses
+    # pixels et de la parité de son indice.  Les tranches de lignes sont
+    # émises par un pool de processus (matrice en mémoire partagée, ou
+    # fichier np.memmap relu par les workers) et réassemblées dans l'ordre.
+    # ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _gen_workers(gc, plan):
+        """Nombre de processus de génération (1 = séquentiel)."""
+        workers = int(gc.get("workers", 1) or 0)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        outer, inner = plan["outer_range"], plan["inner_count"]
+        if outer * inner < _PARALLEL_GEN_MIN_PX or outer < 2 * _GEN_BLOCK_LINES:
+            return 1
+        return workers
+
+    def _iter_parallel_chunks(self, matrix, plan, gc, workers, with_segments=False):
+        outer = min(plan["outer_range"],
+                    matrix.shape[0 if plan["raster_mode"] == "horizontal" else 1])
+        chunk = _GEN_RANGE_BLOCKS * _GEN_BLOCK_LINES
+
+        src, shm = self._share_matrix(matrix)
+        try:
+            jobs = ((type(self), src, plan, gc, o, min(outer, o + chunk), with_segments)
+                    for o in range(0, outer, chunk))
+            ctx = multiprocessing.get_context("spawn")
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            try:
+                # Au plus workers + 1 tranches en vol : un consommateur lent
+                # (écriture disque, parseur) ne laisse pas les résultats s'accumuler
+                pending = deque(pool.submit(_generate_range, job)
+                                for job in islice(jobs, workers + 1))
+                while pending:
+                    result = pending.popleft().result()
+                    for job in islice(jobs, 1):
+                        pending.append(pool.submit(_generate_range, job))
+                    yield result
+            finally:
+                # Abandon (annulation) : les tranches non commencées sont retirées
+                pool.shutdown(wait=True, cancel_futures=True)
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    @staticmethod
+    def _file_source(matrix):
+        """
+        Source ("file", ...) d'une matrice np.memmap relisible par son
+        fichier (_ooc_memmap) : projection entière et contiguë (une vue
+        partielle hérite du nom et de l'offset de son parent).  Sinon None.
+        """
+        if (isinstance(matrix, np.memmap) and matrix.filename
+                and isinstance(matrix.base, mmap.mmap)
+                and matrix.flags.c_contiguous):
+            return ("file", (matrix.filename, matrix.offset,
+                             matrix.dtype.str, matrix.shape))
+        return None
+
+    @staticmethod
+    def _share_matrix(matrix):
+        """
+        Description transmissible de la matrice aux workers : fichier
+        np.memmap (mode hors-mémoire, relu en lecture seule, sans copie)
+        ou copie en mémoire partagée.  Retourne (source, SharedMemory ou None).
+        """
+        src = GCodeEngine._file_source(matrix)
+        if src is not None:
+            matrix.flush()
+            return src, None
+        matrix = np.asarray(matrix)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+        np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[...] = matrix
+        return ("shm", (shm.name, matrix.dtype.str, matrix.shape)), shm
+
+    # ─────────────────────────────────────────────────────────────────
+    # Rognage (gc["trim"]) : lignes sans pixel à graver sautées, chaque
+    # ligne limitée à ses premier et dernier pixels non nuls (+ overscan).
+    # Le sens alterne sur les seules lignes émises.
     # ─────────────────────────────────────────────────────────────────
 
-    def generate_gcode_list(self, matrix, h_px, w_px, l_step, x_st, offX, offY, gc):
+    def _trim_rows(self, matrix, plan, gc):
+        """Ajoute au plan les étendues par ligne et le sens des lignes émises."""
+        if not gc.get("trim", False):
+            return
+        blocks, powers = self._scan_blocks_for(matrix, plan["raster_mode"], gc)
+        first, last = self._row_extents(blocks, powers, plan["outer_range"])
+        plan["extents"] = (first, last)
+        plan["row_parity"] = (np.cumsum(first >= 0) - 1) % 2
+
+    @staticmethod
+    def _row_extents(blocks, powers, outer):
+        """
+        Premier et dernier pixel non nul (ordre aller) de chacune des `outer`
+        premières lignes de scan, -1 pour une ligne vide.
+        """
+        first = np.full(outer, -1, dtype=np.int64)
+        last = np.full(outer, -1, dtype=np.int64)
+        o0 = 0
+        for blk in blocks:
+            k = min(blk.shape[0], outer - o0)
+            if k <= 0:
+                break
+            burn = (powers[blk[:k]] if powers is not None else blk[:k]) > 0
+            n = burn.shape[1]
+            any_burn = burn.any(axis=1)
+            first[o0:o0 + k] = np.where(any_burn, np.argmax(burn, axis=1), -1)
+            last[o0:o0 + k] = np.where(any_burn, n - 1 - np.argmax(burn[:, ::-1], axis=1), -1)
+            o0 += k
+        return first, last
+
+    @staticmethod
+    def _gap_runs(blocks, powers, outer):
         """
-        Génération G-Code optimisée.
-        La boucle interne (pixels) est vectorisée via NumPy :
-        np.diff détecte les changements de puissance en O(n) sans boucle Python.
+        Longueurs (en pixels) des blancs internes des `outer` premières
+        lignes de scan : pixels nuls entre deux pixels à graver d'une ligne.
+        """
+        runs = []
+        o0 = 0
+        for blk in blocks:
+            k = min(blk.shape[0], outer - o0)
+            if k <= 0:
+                break
+            burn = (powers[blk[:k]] if powers is not None else blk[:k]) > 0
+            rs, cs = np.nonzero(burn)
+            d = np.diff(cs)
+            runs.append(d[(rs[1:] == rs[:-1]) & (d > 1)] - 1)
+            o0 += k
+        return np.concatenate(runs) if runs else np.zeros(0, dtype=np.intp)
+
+    @staticmethod
+    def _join_tokens(tokens, pid):
+        """Concatène tokens[pid] (tableau objet de bytes) en un seul bytes."""
+        return b"".join(tokens[pid].tolist())
+
+    def _raster_plan(self, h_px, w_px, l_step, x_st, offX, offY, gc):
+        """
+        Constantes d'une génération raster, communes à l'émetteur et au
+        prédicteur : en-tête, axe, pas, et pour chaque sens (0 = aller,
+        1 = retour) le départ d'overscan, les cibles corrigées de la latence,
+        la ligne d'approche et les lignes d'overscan de sortie.
+        Mode rognage (gc["trim"]) : étendues par ligne ajoutées par _trim_rows.
         """
         e_num          = gc.get("e_num", 0)
         use_s_mode     = gc.get("use_s_mode", False)
-        ratio          = gc.get("ratio", 1.0)
-        ctrl_max       = gc.get("ctrl_max", 255)
         pre            = gc.get("premove", 2.0)
         feed           = gc.get("feedrate", 3000)
         offset_latence = gc.get("offset_latence", 0.0)
         raster_mode    = str(gc.get("raster_mode", "horizontal")).lower().strip()
 
-        parts = []
-        W = parts.append
+        compact        = bool(gc.get("compact", False))
+        incremental    = compact and bool(gc.get("incremental", False))
 
-        W("G1 F%s" % feed)
+        header = ["G1 F%s" % feed]
         if not use_s_mode:
-            W("M67 E%s Q0.00" % e_num)
-            W("G4 P0.1")
-
-        p_matrix = np.clip(matrix * ratio, 0.0, ctrl_max)
+            header.append("M67 E%s Q%s" % (e_num, "0" if compact else "0.00"))
+            header.append("G4 P0.1")
+        # G91 : retour en absolu avant l'épilogue
+        footer = ["G90"] if incremental else []
 
         if raster_mode == "horizontal":
-            outer_range  = h_px
-            inner_count  = w_px
-            step_main    = l_step
-            step_scan    = x_st
-            axis         = "X"
+            outer_range, inner_count = h_px, w_px
+            step_main, step_scan = l_step, x_st
+            axis, main_off, scan_offset = "X", offY, offX
         else:
-            outer_range  = w_px
-            inner_count  = h_px
-            step_main    = x_st
-            step_scan    = l_step
-            axis         = "Y"
+            outer_range, inner_count = w_px, h_px
+            step_main, step_scan = x_st, l_step
+            axis, main_off, scan_offset = "Y", offX, offY
+
+        plan = {
+            "header": header, "footer": footer,
+            "e_num": e_num, "use_s_mode": use_s_mode,
+            "raster_mode": raster_mode, "axis": axis,
+            "outer_range": outer_range, "inner_count": inner_count,
+            "step_main": step_main, "main_off": main_off,
+            "step_scan": step_scan, "scan_offset": scan_offset,
+            "premove": pre, "offset_latence": offset_latence,
+            # Saut rapide des blancs internes plus longs que gap_hop (0 = off)
+            "gap_hop": float(gc.get("gap_hop", 0.0) or 0.0),
+            "feedrate": feed,
+            "rapid_feedrate": gc.get("rapid_feedrate", 6000.0),
+            "acceleration": gc.get("acceleration", 0.0),
+            # Mode compact : mots modaux redondants supprimés, G91 optionnel,
+            # puissance S entière si ctrl_max est entier
+            "compact": compact, "incremental": incremental,
+            "int_power": (use_s_mode and compact
+                          and float(gc.get("ctrl_max", 255)).is_integer()),
+        }
 
         real_scan_dist = (inner_count - 1) * step_scan
+        scan_pos = (np.arange(1, inner_count + 1) * step_scan,
+                    np.arange(inner_count - 1, -1, -1) * step_scan)
+
+        par = []
+        for is_fwd in (True, False):
+            corr = -offset_latence * (1 if is_fwd else -1)
+            targets = scan_pos[0 if is_fwd else 1] + scan_offset + corr
+            p = self._pass_plan(
+                plan, is_fwd,
+                (0.0 if is_fwd else real_scan_dist) + scan_offset,
+                (real_scan_dist if is_fwd else 0.0) + scan_offset,
+                targets[-1] if inner_count > 0 else None)
+            p["targets"] = targets
+            par.append(p)
+        plan["par"] = par
+        return plan
+
+    @staticmethod
+    def _off_line(plan, pos):
+        """Ligne de déplacement laser éteint jusqu'à `pos` sur l'axe de scan."""
+        if not plan["use_s_mode"]:
+            return "M67 E%s Q0.00 G1 %s%.4f" % (plan["e_num"], plan["axis"], pos)
+        return "G1 %s%.4f S0" % (plan["axis"], pos)
+
+    @staticmethod
+    def _pass_plan(plan, is_fwd, scan_start, scan_end, last_target):
+        """
+        Géométrie d'une passe de scan de scan_start à scan_end : départ
+        d'overscan, départ et fin corrigés de la latence, ligne d'approche,
+        overscan de sortie et émission de la ligne "dernier segment"
+        (last_target : cible du dernier pixel, None si la ligne est vide).
+        """
+        pre = plan["premove"]
+        scan_dir = 1 if is_fwd else -1
+        corr     = -plan["offset_latence"] * scan_dir
+        pre_start  = scan_start - pre * scan_dir
+        pre_end    = scan_end   + pre * scan_dir
+        start_with_corr = scan_start + corr
+        end_with_corr   = scan_end + corr
+
+        approach = None
+        if abs(start_with_corr - pre_start) > 0.0001:
+            approach = GCodeEngine._off_line(plan, start_with_corr)
+
+        # Overscan de sortie (toujours depuis end_with_corr)
+        tail, tail_pos = [], []
+        current_pos   = end_with_corr
+        overscan_step = plan["step_scan"] * 4
+        for _ in range(int(abs(pre_end - current_pos) / overscan_step)):
+            current_pos += overscan_step * scan_dir
+            tail.append(GCodeEngine._off_line(plan, current_pos))
+            tail_pos.append(current_pos)
+        if abs(pre_end - current_pos) > 0.0001:
+            current_pos = pre_end
+            tail.append(GCodeEngine._off_line(plan, pre_end))
+            tail_pos.append(pre_end)
+
+        return {
+            "pre_start": pre_start,
+            "start": start_with_corr,
+            "end": end_with_corr,
+            "approach": approach,
+            "tail": tail, "tail_pos": tail_pos,
+            # Position finale de l'overscan de sortie (None : pas d'overscan)
+            "tail_end": current_pos if tail else None,
+            # Ligne "dernier segment" : émise selon la position courante
+            "end_after_last": (last_target is not None
+                               and abs(end_with_corr - last_target) > 0.0001),
+            "end_after_start": abs(end_with_corr - start_with_corr) > 0.0001,
+        }
 
-        # Positions de scan pré-calculées (partagées par toutes les lignes)
-        scan_pos_fwd = np.arange(1, inner_count + 1) * step_scan  # positions fwd
-        scan_pos_rev = np.arange(inner_count - 1, -1, -1) * step_scan  # positions rev
+    def _raster_tokens(self, plan, powers):
+        """
+        Table de jetons partagée par tous les blocs.  Une ligne de segment =
+        deux jetons : M67 → "M67 E0 Q<p> G1 X" + "<x>\\n",
+        S → "G1 X<x> S" + "<p>\\n".  Jetons de coordonnée par sens et par
+        colonne, jetons de puissance par code (powers), fin de ligne et
+        overscan de sortie par sens.  Les puissances float (powers = None)
+        sont formatées par bloc (_block_pieces).
+        """
+        toks = []
+
+        def add(items):
+            first = len(toks)
+            toks.extend(s.encode("ascii") for s in items)
+            return first
+
+        coord = lambda t: self._coord_token(plan, t)
+        coord_base = np.array([add(coord(t) for t in p["targets"].tolist())
+                               for p in plan["par"]], dtype=np.intp)
+        end_coord = np.array([add([coord(p["end"])]) for p in plan["par"]],
+                             dtype=np.intp)
+        tail = np.array([add(["".join(line + "\n" for line in p["tail"])])
+                         for p in plan["par"]], dtype=np.intp)
+        pwr_base = None
+        if powers is not None:
+            pwr_base = add(self._power_tokens(plan, powers.tolist()))
+
+        tokens = np.empty(len(toks), dtype=object)
+        tokens[:] = toks
+        table = {"tokens": tokens, "coord_base": coord_base,
+                 "end_coord": end_coord, "tail": tail, "pwr_base": pwr_base}
+        if plan["compact"]:
+            # Cibles en unités de 0.0001 mm (mode compact, _compact_pieces)
+            table["q_targets"] = np.array(
+                [[self._pos_q(t) for t in p["targets"].tolist()] for p in plan["par"]],
+                dtype=np.int64).reshape(2, -1)
+        return table
+
+    @staticmethod
+    def _coord_token(plan, t):
+        """Jeton de coordonnée (côté coordonnée de la ligne de segment)."""
+        if not plan["use_s_mode"]:
+            return "%.4f\n" % t
+        return "G1 %s%.4f S" % (plan["axis"], t)
+
+    @staticmethod
+    def _power_tokens(plan, values):
+        """Jetons de puissance "%.3f" (côté M67 ou côté S de la ligne)."""
+        if not plan["use_s_mode"]:
+            fmt = "M67 E%s Q%%.3f G1 %s" % (plan["e_num"], plan["axis"])
+        else:
+            fmt = "%.3f\n"
+        return [fmt % v for v in values]
+
+    @staticmethod
+    def _row_heads(o0, k, plan):
+        """Jetons de tête des lignes de scan [o0, o0 + k) : positionnement + approche."""
+        par = plan["par"]
+        main_pos = ((o0 + np.arange(k)) * plan["step_main"] + plan["main_off"]).tolist()
+        approach = [p["approach"] + "\n" if p["approach"] else "" for p in par]
+        pre_start = [p["pre_start"] for p in par]
+        horizontal = plan["raster_mode"] == "horizontal"
+        heads = []
+        for i, m in enumerate(main_pos):
+            p = (o0 + i) % 2
+            xy = (pre_start[p], m) if horizontal else (m, pre_start[p])
+            heads.append(("G1 X%.4f Y%.4f\n" % xy + approach[p]).encode("ascii"))
+        return heads
+
+    def _row_layout(self, o0, k, n, plan, table):
+        """
+        Paramètres par ligne des lignes de scan [o0, o0 + k) : sens (parity),
+        plage de pixels émise en ordre machine [lo, hi] (vide si lo > hi),
+        départ corrigé, émission de la ligne de fin, géométrie de la passe
+        et identifiants des jetons de tête, de fin de ligne et d'overscan de
+        sortie (index dans concat(tokens, local)), positions de l'overscan
+        de sortie (tail_pos).  Sans rognage : lignes
+        complètes, jetons de fin et d'overscan partagés par sens (table).
+        """
+        par = plan["par"]
+        base = len(table["tokens"])
+        extents = plan.get("extents")
+        if extents is None:
+            parity = (o0 + np.arange(k, dtype=np.int64)) % 2
+            by_par = lambda key: np.array([par[0][key], par[1][key]])[parity]
+            tail_end = [np.nan if p["tail_end"] is None else p["tail_end"] for p in par]
+            local = self._row_heads(o0, k, plan) if not plan["compact"] else []
+            return {
+                "parity": parity,
+                "lo": np.zeros(k, dtype=np.int64),
+                "hi": np.full(k, n - 1, dtype=np.int64),
+                "start": by_par("start"),
+                "after_last": by_par("end_after_last"),
+                "after_start": by_par("end_after_start"),
+                "pre_start": by_par("pre_start"),
+                "approach": np.array([bool(p["approach"]) for p in par])[parity],
+                "end_pos": by_par("end"),
+                "tail_end": np.array(tail_end)[parity],
+                "head": base + np.arange(k, dtype=np.intp),
+                "end": table["end_coord"][parity],
+                "tail": table["tail"][parity],
+                "tail_pos": [par[p]["tail_pos"] for p in parity.tolist()],
+                "local": local,
+            }
+
+        # ── Rognage : passe limitée aux pixels non nuls de la ligne ──────
+        first, last = extents[0][o0:o0 + k], extents[1][o0:o0 + k]
+        parity = plan["row_parity"][o0:o0 + k].astype(np.int64)
+        rev = parity == 1
+        lo = np.where(rev, n - 1 - last, first).astype(np.int64)
+        hi = np.where(rev, n - 1 - first, last).astype(np.int64)
+        empty = first < 0
+        lo[empty], hi[empty] = 0, -1
+
+        step, off = plan["step_scan"], plan["scan_offset"]
+        horizontal = plan["raster_mode"] == "horizontal"
+        start = np.zeros(k)
+        after_last = np.zeros(k, dtype=bool)
+        after_start = np.zeros(k, dtype=bool)
+        pre_start = np.zeros(k)
+        approach_on = np.zeros(k, dtype=bool)
+        end_pos = np.zeros(k)
+        tail_end = np.full(k, np.nan)
+        head = np.full(k, -1, dtype=np.intp)
+        end = np.full(k, -1, dtype=np.intp)
+        tail = np.full(k, -1, dtype=np.intp)
+        tail_pos = [[] for _ in range(k)]
+        local = []
+        for i in np.nonzero(~empty)[0].tolist():
+            p = int(parity[i])
+            # Bords exacts de la zone gravée : pixels a à b inclus, bornés
+            # à la passe complète ((n - 1)·pas, comme sans rognage)
+            a = int(first[i]) * step + off
+            b = min(int(last[i]) + 1, n - 1) * step + off
+            g = self._pass_plan(plan, p == 0, b if p else a, a if p else b,
+                                par[p]["targets"][hi[i]])
+            start[i] = g["start"]
+            after_last[i] = g["end_after_last"]
+            after_start[i] = g["end_after_start"]
+            pre_start[i] = g["pre_start"]
+            approach_on[i] = bool(g["approach"])
+            end_pos[i] = g["end"]
+            if g["tail_end"] is not None:
+                tail_end[i] = g["tail_end"]
+            tail_pos[i] = g["tail_pos"]
+            if plan["compact"]:
+                continue
+            m = (o0 + i) * plan["step_main"] + plan["main_off"]
+            xy = (g["pre_start"], m) if horizontal else (m, g["pre_start"])
+            approach = g["approach"] + "\n" if g["approach"] else ""
+            head[i] = base + len(local)
+            end[i] = head[i] + 1
+            tail[i] = head[i] + 2
+            local.append(("G1 X%.4f Y%.4f\n" % xy + approach).encode("ascii"))
+            local.append(self._coord_token(plan, g["end"]).encode("ascii"))
+            local.append("".join(line + "\n" for line in g["tail"]).encode("ascii"))
+        return {"parity": parity, "lo": lo, "hi": hi, "start": start,
+                "after_last": after_last, "after_start": after_start,
+                "pre_start": pre_start, "approach": approach_on,
+                "end_pos": end_pos, "tail_end": tail_end,
+                "head": head, "end": end, "tail": tail, "tail_pos": tail_pos,
+                "local": local}
+
+    def _block_segments(self, blk, o0, plan, table, powers):
+        """
+        Segments émis d'un bloc de lignes de scan, mêmes règles que le
+        générateur ligne à ligne : segment = plage de pixels de même
+        puissance, fin de segment sautée si à moins de 0.0001 mm de la
+        position courante, ligne de fin jusqu'à end_with_corr si la position
+        courante en diffère.  Une ligne rognée vide n'émet rien.
+
+        Hypothèse : pas de scan > 0.0002 mm (seul le premier segment d'une
+        ligne peut alors être sauté, les suivants avançant d'au moins un pas).
+        Retourne rows (_row_layout), vals (lignes en ordre machine), et par
+        segment conservé rk / ck / ek (ligne, premier et dernier pixel),
+        rank (rang dans la ligne) ; n_keep, emitted, end_emit par ligne,
+        em (lignes à ligne de fin) et targets (cibles par sens).
+        """
+        k, n = blk.shape
+        par = plan["par"]
+        rows = self._row_layout(o0, k, n, plan, table)
+        parity, lo, hi = rows["parity"], rows["lo"], rows["hi"]
+        rev = parity == 1
+        # Lignes retour lues dans le sens machine
+        vals = np.where(rev[:, None], blk[:, ::-1], blk)
+
+        # Débuts de segment (premier pixel + chaque changement de puissance)
+        starts = np.empty((k, n), dtype=bool)
+        starts[:, 0] = True
+        if powers is not None:
+            np.not_equal(vals[:, 1:], vals[:, :-1], out=starts[:, 1:])
+        else:
+            starts[:, 1:] = np.abs(np.diff(vals, axis=1)) > 0.001
+        if "extents" in plan:
+            col = np.arange(n)
+            starts &= (col >= lo[:, None]) & (col <= hi[:, None])
+            burn = np.nonzero(lo <= hi)[0]
+            starts[burn, lo[burn]] = True
+        rs, cs = np.nonzero(starts)
+        ce = np.empty_like(cs)
+        if cs.size:
+            ce[:-1] = np.where(rs[1:] == rs[:-1], cs[1:] - 1, hi[rs[:-1]])
+            ce[-1] = hi[rs[-1]]
+
+        # Premier segment sauté si sa fin coïncide avec le départ corrigé
+        targets = np.stack((par[0]["targets"], par[1]["targets"]))
+        skip = (cs == lo[rs]) & (np.abs(targets[parity[rs], ce] - rows["start"][rs]) <= 0.0001)
+        keep = ~skip
+        n_seg = np.bincount(rs, minlength=k)
+        n_keep = n_seg - np.bincount(rs[skip], minlength=k)
+
+        # Position courante en fin de ligne : dernière cible si un segment
+        # a été émis, sinon le départ corrigé
+        emitted = lo <= hi
+        end_emit = np.where(n_keep > 0, rows["after_last"], rows["after_start"]) & emitted
+
+        rk = rs[keep]
+        rank = np.arange(rk.size) - (np.cumsum(n_keep) - n_keep)[rk]
+        return {"rows": rows, "vals": vals, "rk": rk, "ck": cs[keep], "ek": ce[keep],
+                "rank": rank, "n_keep": n_keep, "emitted": emitted,
+                "end_emit": end_emit, "em": np.nonzero(end_emit)[0],
+                "targets": targets}
+
+    def _gap_hops(self, seg, plan, powers):
+        """
+        Sauts rapides : segments blancs internes (ni premier ni dernier de
+        la ligne) plus longs que plan["gap_hop"] et plus rapides franchis en
+        G0 (_hop_gain).  Retourne (indices des segments, position courante
+        avant le blanc, cible du blanc).
+        """
+        rk, ck, ek, rank = seg["rk"], seg["ck"], seg["ek"], seg["rank"]
+        none = np.zeros(0, dtype=np.intp), np.zeros(0), np.zeros(0)
+        if plan["gap_hop"] <= 0 or not rk.size:
+            return none
+        vals, parity, targets = seg["vals"], seg["rows"]["parity"], seg["targets"]
+        zero = (powers[vals[rk, ck]] if powers is not None else vals[rk, ck]) == 0
+        inner = zero & (rank > 0) & (rank < seg["n_keep"][rk] - 1)
+        h = np.nonzero(inner)[0]
+        cur = targets[parity[rk[h]], ek[h - 1]]
+        t_e = targets[parity[rk[h]], ek[h]]
+        gap = np.abs(t_e - cur)
+        gain = self._hop_gain(gap, plan["premove"], plan["feedrate"],
+                              plan["rapid_feedrate"], plan["acceleration"])
+        ok = (gap > plan["gap_hop"]) & (gain > 0)
+        return h[ok], cur[ok], t_e[ok]
+
+    def _block_pieces(self, blk, o0, plan, table, powers):
+        """
+        Suite des identifiants de jetons d'un bloc de lignes de scan (ordre
+        d'émission) et jetons locaux du bloc (lignes de positionnement +
+        approche, puissances float, géométrie des lignes rognées) pour les
+        segments de _block_segments : tête, 2 jetons par segment, ligne de
+        fin, overscan de sortie.  Un long blanc interne peut être franchi
+        en G0 (plan["gap_hop"]).  Mode compact : _compact_pieces.
+        Retourne (pid, local) : pid indexe concat(tokens, local).
+        """
+        seg = self._block_segments(blk, o0, plan, table, powers)
+        if plan["compact"]:
+            return self._compact_pieces(seg, o0, plan, table, powers)
+        k = blk.shape[0]
+        rows, vals = seg["rows"], seg["vals"]
+        parity, hi = rows["parity"], rows["hi"]
+        rk, ck, ek, rank = seg["rk"], seg["ck"], seg["ek"], seg["rank"]
+        n_keep, emitted, end_emit, em = (seg["n_keep"], seg["emitted"],
+                                         seg["end_emit"], seg["em"])
+
+        # ── Jetons locaux : positionnement (+ approche) par ligne ────────
+        local = rows["local"]
+        base = len(table["tokens"])
+
+        # ── Jetons de puissance : segments puis fins de ligne ────────────
+        if powers is not None:
+            seg_p = table["pwr_base"] + vals[rk, ck].astype(np.intp)
+            end_p = table["pwr_base"] + vals[em, hi[em]].astype(np.intp)
+        else:
+            uniq, inv = np.unique(np.concatenate((vals[rk, ck], vals[em, hi[em]])),
+                                  return_inverse=True)
+            inv = base + len(local) + inv.astype(np.intp)
+            seg_p, end_p = inv[:rk.size], inv[rk.size:]
+            local.extend(s.encode("ascii")
+                         for s in self._power_tokens(plan, uniq.tolist()))
+
+        seg_c = table["coord_base"][parity[rk]] + ek
+        end_c = rows["end"][em]
+        if not plan["use_s_mode"]:
+            seg_a, seg_b, end_a, end_b = seg_p, seg_c, end_p, end_c
+        else:
+            seg_a, seg_b, end_a, end_b = seg_c, seg_p, end_c, end_p
+
+        # ── Sauts rapides : blanc interne long → sortie, G0, réapproche ──
+        # Le premier jeton du segment blanc est préfixé de la sortie
+        # d'overscan et du G0 : la ligne du segment devient la réapproche
+        # (même position finale, disposition inchangée).
+        h, cur, t_e = self._gap_hops(seg, plan, powers)
+        if h.size:
+            seg_a = seg_a.copy()
+            tokens = table["tokens"]
+            pre = plan["premove"]
+            step = np.where(parity[rk[h]] == 1, -pre, pre)
+            for i, c, t, st in zip(h.tolist(), cur.tolist(), t_e.tolist(), step.tolist()):
+                tid = int(seg_a[i])
+                text = tokens[tid] if tid < base else local[tid - base]
+                # Sortie toujours émise : coupe le laser avant le G0
+                seg_a[i] = base + len(local)
+                local.append((self._off_line(plan, c + st) + "\n"
+                              + "G0 %s%.4f\n" % (plan["axis"], t - st)
+                              ).encode("ascii") + text)
+
+        # ── Disposition : tête, 2 jetons par segment, fin, overscan ──────
+        count = np.where(emitted, 2 + 2 * n_keep + 2 * end_emit, 0)
+        row_off = np.cumsum(count) - count
+        pid = np.empty(int(count.sum()), dtype=np.intp)
+        pid[row_off[emitted]] = rows["head"][emitted]
+        pos = row_off[rk] + 1 + 2 * rank
+        pid[pos] = seg_a
+        pid[pos + 1] = seg_b
+        pos = row_off[em] + 1 + 2 * n_keep[em]
+        pid[pos] = end_a
+        pid[pos + 1] = end_b
+        pid[(row_off + count - 1)[emitted]] = rows["tail"][emitted]
+
+        tokens = np.empty(len(local), dtype=object)
+        tokens[:] = local
+        return pid, tokens
 
-        for outer_idx in range(outer_range):
-            is_fwd   = (outer_idx % 2 == 0)
-            scan_dir = 1 if is_fwd else -1
-            corr     = -offset_latence * scan_dir
+    # ─────────────────────────────────────────────────────────────────
+    # Table de segments : les lignes G-Code d'un bloc telles que les lit
+    # GCodeParser (valeurs des mots X, Y, puissance ; NaN si absent ; G0),
+    # construite depuis les mêmes segments (_block_segments) que le texte.
+    # La simulation en tire ses points sans relire le texte
+    # (GCodeParser.parse_segments).
+    # ─────────────────────────────────────────────────────────────────
 
-            if raster_mode == "horizontal":
-                main_pos    = outer_idx * step_main + offY
-                row_data    = p_matrix[(h_px - 1) - outer_idx]
-                scan_offset = offX
-            else:
-                main_pos    = outer_idx * step_main + offX
-                row_data    = p_matrix[::-1, outer_idx]
-                scan_offset = offY
-
-            scan_start = (0.0 if is_fwd else real_scan_dist) + scan_offset
-            scan_end   = (real_scan_dist if is_fwd else 0.0) + scan_offset
-            pre_start  = scan_start - pre * scan_dir
-            pre_end    = scan_end   + pre * scan_dir
-
-            # Positionnement initial
-            if raster_mode == "horizontal":
-                W("G1 X%.4f Y%.4f" % (pre_start, main_pos))
-            else:
-                W("G1 X%.4f Y%.4f" % (main_pos, pre_start))
+    @staticmethod
+    def _q4(values):
+        """Valeurs lues dans les coordonnées écrites en "%.4f"."""
+        return np.array([float("%.4f" % v) for v in np.asarray(values, dtype=float).tolist()])
 
-            start_with_corr = scan_start + corr
-            if abs(start_with_corr - pre_start) > 0.0001:
-                if not use_s_mode:
-                    W("M67 E%s Q0.00 G1 %s%.4f" % (e_num, axis, start_with_corr))
-                else:
-                    W("G1 %s%.4f S0" % (axis, start_with_corr))
-
-            # ── Vectorisation NumPy de la boucle pixel ──────────────
-            vals = row_data if is_fwd else row_data[::-1]
-            # Positions cibles de chaque pixel
-            base_pos = scan_pos_fwd if is_fwd else scan_pos_rev
-            targets  = base_pos + scan_offset + corr  # broadcast
-
-            # Détecter les changements de puissance avec np.diff
-            # change[i] = True si vals[i] != vals[i-1]
-            changes = np.empty(len(vals), dtype=bool)
-            changes[0] = True  # premier pixel toujours un segment
-            changes[1:] = np.abs(np.diff(vals)) > 0.001
-
-            # Indices des segments (où la puissance change)
-            seg_starts = np.where(changes)[0]
-
-            current_pos = start_with_corr
-            for s_idx, seg_start in enumerate(seg_starts):
-                p_val = float(vals[seg_start])
-                # Position de fin du segment = début du prochain ou fin de scan
-                seg_end_pos = float(targets[seg_starts[s_idx + 1] - 1]
-                                    if s_idx + 1 < len(seg_starts)
-                                    else targets[-1])
-                if abs(seg_end_pos - current_pos) > 0.0001:
-                    if not use_s_mode:
-                        W("M67 E%s Q%.3f G1 %s%.4f" % (e_num, p_val, axis, seg_end_pos))
-                    else:
-                        W("G1 %s%.4f S%.3f" % (axis, seg_end_pos, p_val))
-                    current_pos = seg_end_pos
-
-            # Dernier segment jusqu'à scan_end
-            end_with_corr = scan_end + corr
-            last_p = float(vals[-1])
-            if abs(end_with_corr - current_pos) > 0.0001:
-                if not use_s_mode:
-                    W("M67 E%s Q%.3f G1 %s%.4f" % (e_num, last_p, axis, end_with_corr))
-                else:
-                    W("G1 %s%.4f S%.3f" % (axis, end_with_corr, last_p))
-            current_pos = end_with_corr
-
-            # Overscan de sortie
-            overscan_step     = step_scan * 4
-            dist_to_go        = abs(pre_end - current_pos)
-            num_steps_overscan = int(dist_to_go / overscan_step)
-            for _ in range(num_steps_overscan):
-                current_pos += overscan_step * scan_dir
-                if not use_s_mode:
-                    W("M67 E%s Q0.00 G1 %s%.4f" % (e_num, axis, current_pos))
-                else:
-                    W("G1 %s%.4f S0" % (axis, current_pos))
+    def _block_lines(self, blk, o0, plan, table, powers):
+        """
+        Table de segments d'un bloc (disposition non compacte de
+        _block_pieces) : une entrée par ligne G-Code émise, clés "x", "y",
+        "power" (float, NaN si le mot est absent) et "rapid" (G0).
+        """
+        seg = self._block_segments(blk, o0, plan, table, powers)
+        k = blk.shape[0]
+        rows, vals = seg["rows"], seg["vals"]
+        parity, hi = rows["parity"], rows["hi"]
+        rk, ck, ek, rank = seg["rk"], seg["ck"], seg["ek"], seg["rank"]
+        n_keep, emitted, end_emit, em = (seg["n_keep"], seg["emitted"],
+                                         seg["end_emit"], seg["em"])
+        q4 = self._q4
+        if "coord_vals" not in table:
+            table["coord_vals"] = np.stack([q4(p["targets"]) for p in plan["par"]])
+        if powers is not None and "pwr_vals" not in table:
+            table["pwr_vals"] = np.array([float("%.3f" % v) for v in powers.tolist()])
+        pwr_val = lambda v: (table["pwr_vals"][v.astype(np.intp)] if powers is not None
+                             else np.array([float("%.3f" % p) for p in v.tolist()]))
+
+        # ── Lignes par ligne de scan : tête, approche, 3 lignes par saut
+        #    rapide (sortie, G0, segment) ou 1 par segment, fin, overscan ──
+        h, cur, t_e = self._gap_hops(seg, plan, powers)
+        hop = np.zeros(rk.size, dtype=np.int64)
+        hop[h] = 2
+        approach = rows["approach"].astype(np.int64)
+        n_tail = np.array([len(t) for t in rows["tail_pos"]], dtype=np.int64)
+        extra = np.bincount(rk, weights=hop, minlength=k).astype(np.int64)
+        count = np.where(emitted, 1 + approach + n_keep + extra + end_emit + n_tail, 0)
+        row_off = np.cumsum(count) - count
+        total = int(count.sum())
+
+        x = np.full(total, np.nan)
+        y = np.full(total, np.nan)
+        power = np.full(total, np.nan)
+        rapid = np.zeros(total, dtype=bool)
+        horizontal = plan["raster_mode"] == "horizontal"
+        scan, main = (x, y) if horizontal else (y, x)
+
+        r = np.nonzero(emitted)[0]
+        scan[row_off[r]] = q4(rows["pre_start"][r])
+        main[row_off[r]] = q4((o0 + r) * plan["step_main"] + plan["main_off"])
+        ra = np.nonzero(emitted & rows["approach"])[0]
+        scan[row_off[ra] + 1] = q4(rows["start"][ra])
+        power[row_off[ra] + 1] = 0.0
+
+        # Segments (précédés de leurs lignes de saut rapide)
+        first_seg = np.cumsum(n_keep) - n_keep
+        hop_cum = np.cumsum(hop)
+        hop_row0 = np.concatenate(([0], hop_cum))[first_seg[rk]]
+        pos = row_off[rk] + 1 + approach[rk] + rank + (hop_cum - hop_row0)
+        scan[pos] = table["coord_vals"][parity[rk], ek]
+        power[pos] = pwr_val(vals[rk, ck])
+        if h.size:
+            st = np.where(parity[rk[h]] == 1, -plan["premove"], plan["premove"])
+            scan[pos[h] - 2] = q4(cur + st)
+            power[pos[h] - 2] = 0.0
+            scan[pos[h] - 1] = q4(t_e - st)
+            rapid[pos[h] - 1] = True
+
+        # Ligne de fin, overscan de sortie
+        end_at = row_off[em] + 1 + approach[em] + n_keep[em] + extra[em]
+        scan[end_at] = q4(rows["end_pos"][em])
+        power[end_at] = pwr_val(vals[em, hi[em]])
+        for i in r.tolist():
+            if n_tail[i]:
+                at = row_off[i] + count[i] - n_tail[i]
+                scan[at:at + n_tail[i]] = q4(rows["tail_pos"][i])
+                power[at:at + n_tail[i]] = 0.0
+        return {"x": x, "y": y, "power": power, "rapid": rapid}
 
-            if abs(pre_end - current_pos) > 0.0001:
-                if not use_s_mode:
-                    W("M67 E%s Q0.00 G1 %s%.4f" % (e_num, axis, pre_end))
-                else:
-                    W("G1 %s%.4f S0" % (axis, pre_end))
+    # ─────────────────────────────────────────────────────────────────
+    # Mode compact (gc["compact"]) : mots modaux redondants supprimés.
+    # Chaque ligne de scan rétablit son état (première puissance de la
+    # ligne toujours écrite) : les lignes restent indépendantes, donc
+    # compatibles avec la génération par blocs et par tranches.
+    # ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _fixed_str(q, decimals):
+        """Entier q en unités de 10**-decimals → décimal sans zéros finaux."""
+        sign = "-" if q < 0 else ""
+        i, f = divmod(abs(q), 10 ** decimals)
+        f = ("%0*d" % (decimals, f)).rstrip("0") if decimals else ""
+        return sign + str(i) + ("." + f if f else "")
+
+    @staticmethod
+    def _pos_q(v):
+        """Position en unités de 0.0001 mm, arrondie comme "%.4f"."""
+        return int(("%.4f" % v).replace(".", ""))
+
+    @staticmethod
+    def _compact_power(plan, v):
+        """Puissance compacte : entière en S si ctrl_max est entier, sinon "%.3f" sans zéros."""
+        if plan["int_power"]:
+            return "%.0f" % v
+        return GCodeEngine._fixed_str(int(("%.3f" % v).replace(".", "")), 3)
+
+    def _compact_pieces(self, seg, o0, plan, table, powers):
+        """
+        Disposition compacte des segments de _block_segments.  Chaque ligne
+        G-Code = 3 jetons : préfixe (M67 E Q si la puissance change, G0/G1
+        si le mode de mouvement change), coordonnée (absolue, ou relative en
+        G91 depuis la tête de ligne absolue), suffixe (S si la puissance
+        change, fin de ligne).  Overscan de sortie en un seul mouvement.
+        Retourne (pid, local) comme _block_pieces.
+        """
+        rows, vals = seg["rows"], seg["vals"]
+        parity, hi = rows["parity"], rows["hi"]
+        rk, ck, ek, rank = seg["rk"], seg["ck"], seg["ek"], seg["rank"]
+        emitted, em = seg["emitted"], seg["em"]
+        q_t = table["q_targets"]
+        pos_q = self._pos_q
+        pwr = lambda v: powers[v] if powers is not None else v
+
+        # ── Mouvements de chaque ligne : (ligne, ordre, position, puissance,
+        #    mouvement 0 = modal, 1 = G1, 2 = G0) ────────────────────────
+        end_seq = 3 * int(seg["n_keep"].max(initial=0)) + 4
+        parts = []
+        ra = np.nonzero(emitted & rows["approach"])[0]
+        parts.append((ra, np.zeros(ra.size, dtype=np.int64),
+                      [pos_q(v) for v in rows["start"][ra].tolist()],
+                      np.zeros(ra.size), 0))
+        motion = np.zeros(rk.size, dtype=np.int64)
+        h, cur, t_e = self._gap_hops(seg, plan, powers)
+        if h.size:
+            motion[h] = 1
+            st = np.where(parity[rk[h]] == 1, -plan["premove"], plan["premove"])
+            parts.append((rk[h], 1 + 3 * rank[h],
+                          [pos_q(v) for v in (cur + st).tolist()], np.zeros(h.size), 0))
+            parts.append((rk[h], 2 + 3 * rank[h],
+                          [pos_q(v) for v in (t_e - st).tolist()], np.zeros(h.size), 2))
+        parts.append((rk, 3 + 3 * rank, q_t[parity[rk], ek],
+                      pwr(vals[rk, ck]).astype(np.float64), motion))
+        parts.append((em, np.full(em.size, end_seq),
+                      [pos_q(v) for v in rows["end_pos"][em].tolist()],
+                      pwr(vals[em, hi[em]]).astype(np.float64), 0))
+        rt = np.nonzero(emitted & ~np.isnan(rows["tail_end"]))[0]
+        parts.append((rt, np.full(rt.size, end_seq + 1),
+                      [pos_q(v) for v in rows["tail_end"][rt].tolist()],
+                      np.zeros(rt.size), 0))
+
+        row = np.concatenate([p[0] for p in parts]).astype(np.int64)
+        seq = np.concatenate([p[1] for p in parts]).astype(np.int64)
+        q = np.concatenate([np.asarray(p[2], dtype=np.int64) for p in parts])
+        pv = np.concatenate([p[3] for p in parts])
+        mo = np.concatenate([np.broadcast_to(p[4], p[0].shape) for p in parts])
+        order = np.lexsort((seq, row))
+        row, q, pv, mo = row[order], q[order], pv[order], mo[order]
+
+        # ── Mots modaux : puissance écrite si première de la ligne ou si
+        #    sa valeur formatée change ────────────────────────────────────
+        uv, inv = np.unique(pv, return_inverse=True)
+        text_id = {}
+        uid = [text_id.setdefault(self._compact_power(plan, v), len(text_id))
+               for v in uv.tolist()]
+        ut = list(text_id)
+        fid = np.array(uid, dtype=np.int64)[inv]
+        first = np.ones(row.size, dtype=bool)
+        first[1:] = row[1:] != row[:-1]
+        word = first.copy()
+        word[1:] |= fid[1:] != fid[:-1]
+
+        # ── Coordonnées : absolues, ou relatives (G91) depuis la tête ────
+        pre_q = np.array([pos_q(v) for v in rows["pre_start"].tolist()], dtype=np.int64)
+        if plan["incremental"]:
+            prev = np.empty_like(q)
+            prev[1:] = q[:-1]
+            prev[first] = pre_q[row[first]]
+            coord = q - prev
+        else:
+            coord = q
+        uc, cinv = np.unique(coord, return_inverse=True)
+
+        # ── Jetons locaux : têtes, préfixes, coordonnées, suffixes ───────
+        axis = plan["axis"]
+        local = []
+        base = len(table["tokens"])
+        horizontal = plan["raster_mode"] == "horizontal"
+        head_fmt = ("G90 %s\nG91\n" if plan["incremental"] else "%s\n")
+        head = np.full(rows["parity"].size, -1, dtype=np.intp)
+        for i in np.nonzero(emitted)[0].tolist():
+            m = self._fixed_str(pos_q((o0 + i) * plan["step_main"] + plan["main_off"]), 4)
+            s0 = self._fixed_str(int(pre_q[i]), 4)
+            xy = "X%s Y%s" % ((s0, m) if horizontal else (m, s0))
+            head[i] = base + len(local)
+            local.append((head_fmt % xy).encode("ascii"))
+
+        motion_words = ("", "G1 ", "G0 ")
+        nf = len(ut)
+        pre_base = base + len(local)
+        if not plan["use_s_mode"]:
+            # Préfixe (puissance ou rien) × mouvement ; suffixe "\n" unique
+            for f in range(nf + 1):
+                pw = "M67 E%s Q%s " % (plan["e_num"], ut[f - 1]) if f else ""
+                local.extend((pw + mw).encode("ascii") for mw in motion_words)
+            pre_id = pre_base + np.where(word, fid + 1, 0) * 3 + mo
+            suf_id = np.full(row.size, base + len(local), dtype=np.intp)
+            local.append(b"\n")
+        else:
+            local.extend(mw.encode("ascii") for mw in motion_words)
+            pre_id = pre_base + mo
+            suf_base = base + len(local)
+            local.append(b"\n")
+            local.extend((" S%s\n" % t).encode("ascii") for t in ut)
+            suf_id = suf_base + np.where(word, fid + 1, 0)
+        coord_id = base + len(local) + cinv.astype(np.intp)
+        local.extend(("%s%s" % (axis, self._fixed_str(int(c), 4))).encode("ascii")
+                     for c in uc.tolist())
+
+        # ── Disposition : tête puis 3 jetons par mouvement ───────────────
+        n_rec = np.bincount(row, minlength=emitted.size)
+        count = np.where(emitted, 1 + 3 * n_rec, 0)
+        row_off = np.cumsum(count) - count
+        pid = np.empty(int(count.sum()), dtype=np.intp)
+        pid[row_off[emitted]] = head[emitted]
+        rec_rank = np.arange(row.size) - (np.cumsum(n_rec) - n_rec)[row]
+        pos = row_off[row] + 1 + 3 * rec_rank
+        pid[pos] = pre_id
+        pid[pos + 1] = coord_id
+        pid[pos + 2] = suf_id
+
+        tokens = np.empty(len(local), dtype=object)
+        tokens[:] = local
+        return pid, tokens
 
-        return "\n".join(parts) + "\n"
 
+    # ─────────────────────────────────────────────────────────────────
+    # Prédiction exacte de la taille du G-Code (sans construire le texte)
+    # ─────────────────────────────────────────────────────────────────
+
+    def predict_gcode_list_size(self, matrix, h_px, w_px, l_step, x_st,
+                                offX, offY, gc, newline_bytes=1):
+        """
+        Nombre exact d'octets et de lignes que produirait generate_gcode_list
+        avec les mêmes arguments, sans assembler le texte : mêmes jetons et
+        même disposition que l'émetteur (_block_pieces), dont on ne fait que
+        sommer les longueurs et les fins de ligne.
+        Retourne (octets, lignes) ; `newline_bytes` = 2 pour un fichier CRLF.
+        """
+        plan = self._raster_plan(h_px, w_px, l_step, x_st, offX, offY, gc)
+        n_lines = len(plan["header"])
+        n_bytes = sum(len(line) + newline_bytes for line in plan["header"])
+        if plan["outer_range"] <= 0 or plan["inner_count"] <= 0:
+            return n_bytes, n_lines
+        self._trim_rows(matrix, plan, gc)
+        n_lines += len(plan["footer"])
+        n_bytes += sum(len(line) + newline_bytes for line in plan["footer"])
+
+        blocks, powers = self._scan_blocks_for(matrix, plan["raster_mode"], gc)
+        table = self._raster_tokens(plan, powers)
+        tok_len = np.array([len(t) for t in table["tokens"]], dtype=np.int64)
+        tok_nl = np.array([t.count(b"\n") for t in table["tokens"]], dtype=np.int64)
+        o0 = 0
+        for blk in blocks:
+            k = min(blk.shape[0], plan["outer_range"] - o0)
+            if k <= 0:
+                break
+            pid, local = self._block_pieces(blk[:k], o0, plan, table, powers)
+            lens = np.concatenate((tok_len, [len(t) for t in local]))
+            nls = np.concatenate((tok_nl, [t.count(b"\n") for t in local]))
+            lines = int(nls[pid].sum())
+            n_lines += lines
+            n_bytes += int(lens[pid].sum()) + lines * (newline_bytes - 1)
+            o0 += k
+
+        return n_bytes, n_lines
+
+    def _scan_blocks_for(self, matrix, raster_mode, gc, start=0, stop=None):
+        """
+        Blocs de lignes de scan pour le générateur et le prédicteur.
+        Matrice d'indices + gc["levels"] : blocs de codes entiers et table
+        code → puissance contrôleur (`powers`), deux codes voisins différents
+        ⇔ |Δpuissance| > 0.001 : la détection de segment devient une
+        comparaison entière.  Sinon (matrice de puissances, ou niveaux trop
+        proches) : blocs de puissances float et powers = None.
+        start / stop : plage de lignes de scan (ordre machine).
+        Retourne (itérateur de blocs, powers).
+        """
+        ratio    = gc.get("ratio", 1.0)
+        ctrl_max = gc.get("ctrl_max", 255)
+        levels   = gc.get("levels")
+        inner = matrix.shape[1 if raster_mode == "horizontal" else 0]
+        block = max(1, min(_GEN_BLOCK_LINES, _GEN_BLOCK_PX // max(1, inner)))
+        if levels is None or not np.issubdtype(matrix.dtype, np.integer):
+            return self._iter_scan_blocks(matrix, raster_mode, ratio, ctrl_max,
+                                          block, start=start, stop=stop), None
+
+        table = np.clip(np.asarray(levels, dtype=np.float32) * ratio, 0.0, ctrl_max)
+        powers, code_lut = self._power_levels(table)
+        if len(powers) > 1 and not np.all(np.diff(powers) > 0.001):
+            return self._iter_scan_blocks(matrix, raster_mode, block=block, table=table,
+                                          start=start, stop=stop), None
+        return self._iter_scan_blocks(matrix, raster_mode, block=block, table=code_lut,
+                                      start=start, stop=stop), powers
+
+    @staticmethod
+    def _iter_scan_blocks(matrix, raster_mode, ratio=1.0, ctrl_max=255,
+                          block=_GEN_BLOCK_LINES, table=None, start=0, stop=None):
+        """
+        Produit les lignes de scan dans l'ordre machine (bas → haut en
+        horizontal, gauche → droite en vertical, pixels bas → haut),
+        converties en unités contrôleur, par blocs 2D de `block` lignes
+        (une ligne de scan par rangée, sans copie : vues inversées).
+        Avec `table`, la matrice (indices) est convertie par table[indice].
+        La matrice n'est jamais copiée en entier : une matrice np.memmap
+        est lue par tranches de `block` lignes (ou colonnes).
+        start / stop : seules les lignes de scan [start, stop) sont produites.
+        """
+        def convert(m):
+            m = np.asarray(m)
+            if table is not None:
+                return table[m]
+            return np.clip(m * ratio, 0.0, ctrl_max)
+
+        h_px, w_px = matrix.shape
+        if raster_mode == "horizontal":
+            # Ligne de scan o = rangée h_px - 1 - o de la matrice
+            stop = h_px if stop is None else min(stop, h_px)
+            for top in range(h_px - start, h_px - stop, -block):
+                bottom = max(h_px - stop, top - block)
+                yield convert(matrix[bottom:top])[::-1]
+        else:
+            stop = w_px if stop is None else min(stop, w_px)
+            for c0 in range(start, stop, block):
+                c1 = min(stop, c0 + block)
+                yield convert(matrix[:, c0:c1])[::-1].T
+
+    @staticmethod
+    def _iter_scan_lines(matrix, raster_mode, ratio=1.0, ctrl_max=255,
+                         block=_GEN_BLOCK_LINES, table=None):
+        """Lignes de scan une à une (voir _iter_scan_blocks)."""
+        for blk in GCodeEngine._iter_scan_blocks(matrix, raster_mode, ratio,
+                                                 ctrl_max, block, table):
+            yield from blk
 
     def generate_framing_gcode(self, w, h, offX, offY, power,
                                 feedrate, pause_cmd=None,
@@ -402,6 +2005,14 @@ class GCodeEngine:
     def assemble_gcode(self, body, header_custom,
                    footer_custom, settings, metadata):
 
+        return "".join((
+            self._gcode_prologue(header_custom, settings, metadata),
+            body,
+            self._gcode_epilogue(footer_custom, settings),
+        ))
+
+    def _gcode_prologue(self, header_custom, settings, metadata):
+        """En-tête, sécurité laser et framing (tout ce qui précède le corps)."""
         e_num = settings["e_num"]
         use_s_mode = settings["use_s_mode"]
 
@@ -413,53 +2024,55 @@ class GCodeEngine:
             else f"M67 E{e_num} Q0.00\nG4 P0.2\nM5\nG4 P0.3"
         )
 
-        buf = io.StringIO()
-
-        buf.write(f"( A.L.I.G. v{metadata['version']} )\n")
-        buf.write(f"( Mode: {metadata['mode']} )\n")
-        buf.write(f"( Firing Mode: {metadata['firing_cmd']} )\n")
-        buf.write(f"( Grayscale Levels: {metadata['gray_steps']} )\n")
-
-        buf.write("G21 G90 G17 G94\n")
-
-        buf.write(header_custom + "\n")
-        buf.write(init_safety + "\n\n")
+        parts = [
+            f"( A.L.I.G. v{metadata['version']} )\n",
+            f"( Mode: {metadata['mode']} )\n",
+            f"( Firing Mode: {metadata['firing_cmd']} )\n",
+            f"( Grayscale Levels: {metadata['gray_steps']} )\n",
+            f"( Engine: {self.BACKEND} )\n",
+            "G21 G90 G17 G94\n",
+            header_custom + "\n",
+            init_safety + "\n\n",
+        ]
 
         if metadata.get("framing_code"):
-            buf.write(metadata["framing_code"] + "\n")
-            buf.write(f"{firing_cmd} ( Re-arming laser )\n")
+            parts.append(metadata["framing_code"] + "\n")
+            parts.append(f"{firing_cmd} ( Re-arming laser )\n")
         else:
-            buf.write(f"{firing_cmd}\n")
+            parts.append(f"{firing_cmd}\n")
 
-        buf.write(body)
+        return "".join(parts)
 
-        if not use_s_mode:
-            buf.write(f"M67 E{e_num} Q0.00\n")
+    def _gcode_epilogue(self, footer_custom, settings):
+        """Extinction laser, pied personnalisé et fin de programme."""
+        parts = []
+        if not settings["use_s_mode"]:
+            parts.append(f"M67 E{settings['e_num']} Q0.00\n")
 
-        buf.write("\nM5 S0 ( Ensure laser is off )\n")
+        parts.append("\nM5 S0 ( Ensure laser is off )\n")
 
         if footer_custom:
-            buf.write("\n" + footer_custom + "\n")
+            parts.append("\n" + footer_custom + "\n")
 
-        buf.write("M30\n")
+        parts.append("M30\n")
 
-        return buf.getvalue()
-
-    def build_final_gcode(self,
-                        matrix,
-                        dims,
-                        offsets,
-                        settings_raw,
-                        text_blocks,
-                        metadata_raw):
+        return "".join(parts)
 
-        # Calcul de la latence (compensation matérielle)
-        latency_mm = (
+    @staticmethod
+    def latency_mm(settings_raw):
+        """Compensation de latence laser (mm) : feedrate (mm/min) × latence (ms)."""
+        return (
             settings_raw["feedrate"] *
             settings_raw["laser_latency"]
         ) / 60000
 
-        gc_settings = {
+    @staticmethod
+    def _gc_settings(settings_raw):
+        """Réglages du générateur déduits des paramètres du payload."""
+        # Calcul de la latence (compensation matérielle)
+        latency_mm = GCodeEngine.latency_mm(settings_raw)
+
+        return {
             "e_num": settings_raw["e_num"],
             "use_s_mode": settings_raw["use_s_mode"],
             "ratio": settings_raw["ctrl_max"] / 100.0, # À vérifier selon ton calcul de puissance
@@ -467,37 +2080,143 @@ class GCodeEngine:
             "premove": settings_raw["premove"],
             "feedrate": settings_raw["feedrate"],
             "offset_latence": latency_mm,
-            "raster_mode": settings_raw.get("raster_mode", "horizontal")
+            "raster_mode": settings_raw.get("raster_mode", "horizontal"),
+            # Processus de génération (0 = tous les cœurs, 1 = séquentiel)
+            "workers": settings_raw.get("gen_workers", 1),
+            # Lignes vides sautées, lignes rognées à leur zone de gravure
+            "trim": bool(settings_raw.get("trim_rows", False)),
+            # Sortie compacte (mots modaux redondants supprimés), G91 optionnel
+            "compact": bool(settings_raw.get("compact_gcode", False)),
+            "incremental": bool(settings_raw.get("incremental_gcode", False)),
+            # Blancs internes > gap_hop mm franchis en G0 (si plus rapide)
+            "gap_hop": settings_raw.get("gap_hop", 0.0),
+            "rapid_feedrate": settings_raw.get("rapid_feedrate", 6000.0),
+            "acceleration": settings_raw.get("acceleration", 0.0),
         }
 
+    def build_final_gcode(self,
+                        matrix,
+                        dims,
+                        offsets,
+                        settings_raw,
+                        text_blocks,
+                        metadata_raw,
+                        levels=None,
+                        with_segments=False):
+        """
+        G-Code final.  `matrix` est soit une matrice de puissances (float),
+        soit une matrice d'indices de niveau accompagnée de `levels`
+        (table niveau → puissance, geom["power_levels"]).
+        with_segments : retourne aussi la table de segments du programme
+        (voir iter_final_gcode), lue par GCodeParser.parse_segments.
+        """
+        latency_mm = self._gc_settings(settings_raw)["offset_latence"]
+        segments = [] if with_segments else None
+        final_text = "".join(self.iter_final_gcode(
+            matrix, dims, offsets, settings_raw, text_blocks, metadata_raw,
+            levels=levels, segments=segments))
+
+        if with_segments:
+            return final_text, latency_mm, segments
+        return final_text, latency_mm
+
+    def iter_final_gcode(self,
+                         matrix,
+                         dims,
+                         offsets,
+                         settings_raw,
+                         text_blocks,
+                         metadata_raw,
+                         levels=None,
+                         segments=None):
+        """
+        G-Code final en morceaux de texte, dans l'ordre : en-tête et framing,
+        corps raster bloc par bloc, pied.  Seul un bloc de lignes de scan est
+        en mémoire à la fois.  "".join(...) == build_final_gcode(...)[0].
+        segments : liste optionnelle qui reçoit la table de segments du
+        programme, dans l'ordre du texte : ("text", en-tête / framing / pied)
+        et ("lines", lignes d'un bloc raster) — voir iter_gcode_chunks.
+        """
+        gc_settings = self._gc_settings(settings_raw)
+        gc_settings["levels"] = levels
+
         # Désassemblage du tuple dims (envoyé par generate_gcode)
         # Rappel : dims = (h_px, w_px, y_step, x_step)
         h_px, w_px, y_st, x_st = dims
         offX, offY = offsets
 
-        # Appel au générateur de liste de lignes
+        prologue = self._gcode_prologue(text_blocks["header"], gc_settings, metadata_raw)
+        if segments is not None:
+            segments.append(("text", prologue))
+        yield prologue
         # On s'assure de passer y_st et x_st dans le bon ordre
-        gcode_body = self.generate_gcode_list(
-            matrix,
-            h_px,
-            w_px,
-            y_st,  # Anciennement l_step
-            x_st,
-            offX,
-            offY,
-            gc_settings
-        )
+        for chunk in self.iter_gcode_chunks(matrix, h_px, w_px, y_st, x_st,
+                                            offX, offY, gc_settings, segments=segments):
+            yield chunk.decode("ascii")
+        epilogue = self._gcode_epilogue(text_blocks["footer"], gc_settings)
+        if segments is not None:
+            segments.append(("text", epilogue))
+        yield epilogue
+
+    def write_final_gcode(self,
+                          sink,
+                          matrix,
+                          dims,
+                          offsets,
+                          settings_raw,
+                          text_blocks,
+                          metadata_raw,
+                          levels=None):
+        """
+        Écrit le G-Code final au fil de la génération (voir iter_final_gcode).
+        `sink` : chemin (fichier texte, fins de ligne du système comme
+        open(path, "w")) ou objet fichier texte ouvert.
+        Retourne le nombre de lignes écrites.
+        """
+        if isinstance(sink, (str, os.PathLike)):
+            with open(sink, "w") as f:
+                return self.write_final_gcode(f, matrix, dims, offsets, settings_raw,
+                                              text_blocks, metadata_raw, levels=levels)
+        n_lines = 0
+        for chunk in self.iter_final_gcode(matrix, dims, offsets, settings_raw,
+                                           text_blocks, metadata_raw, levels=levels):
+            sink.write(chunk)
+            n_lines += chunk.count("\n")
+        return n_lines
+    
+    def predict_final_gcode_size(self,
+                                 matrix,
+                                 dims,
+                                 offsets,
+                                 settings_raw,
+                                 text_blocks,
+                                 metadata_raw,
+                                 levels=None,
+                                 newline_bytes=len(os.linesep)):
+        """
+        Taille exacte (octets, lignes) du fichier que produirait
+        build_final_gcode avec les mêmes arguments.  Le corps raster est
+        prédit sans être généré ; l'en-tête/pied (courts) sont assemblés
+        autour d'un corps vide.  Par défaut les fins de ligne sont celles
+        du système, comme à l'écriture du fichier en mode texte.
+        """
+        gc_settings = self._gc_settings(settings_raw)
+        gc_settings["levels"] = levels
+        h_px, w_px, y_st, x_st = dims
+        offX, offY = offsets
 
-        final_text = self.assemble_gcode(
-            gcode_body,
-            text_blocks["header"],
-            text_blocks["footer"],
-            gc_settings,
-            metadata_raw
-        )
+        body_bytes, body_lines = self.predict_gcode_list_size(
+            matrix, h_px, w_px, y_st, x_st, offX, offY, gc_settings,
+            newline_bytes=newline_bytes)
+
+        wrapper = self.assemble_gcode(
+            "", text_blocks["header"], text_blocks["footer"],
+            gc_settings, metadata_raw)
+        wrap_lines = wrapper.count("\n")
+        wrap_bytes = len(wrapper.encode("utf-8")) + wrap_lines * (newline_bytes - 1)
+
+        return body_bytes + wrap_bytes, body_lines + wrap_lines
 
-        return final_text, latency_mm
-    
     def generate_pointing_gcode(self, offX, offY, power,
                                 pause_cmd=None,
                                 use_s_mode=True,
@@ -673,64 +2392,52 @@ class GCodeEngine:
     #         "rect_full": rect_full,
     #         "raster_mode": raster_mode
     #     }
-    def simulate_gcode_size(self, matrix, raster_mode, g_steps):
+    def get_gcode_statistics(self, matrix, dims, offsets, settings_raw,
+                             text_blocks, metadata_raw, levels=None):
         """
-        Version NumPy ultra-rapide pour estimer le nombre de lignes G-Code.
+        Taille et nombre de lignes exacts du fichier final (voir
+        predict_final_gcode_size).  Retourne (texte, lignes, octets).
         """
-        # On s'assure que la matrice est en entiers pour des comparaisons exactes
-        m = matrix.astype(np.int16)
-        
-        if raster_mode == "horizontal":
-            # Différence entre chaque pixel et son voisin de gauche
-            # np.diff renvoie une matrice de taille (H, W-1)
-            diffs = np.diff(m, axis=1)
-            # Un changement survient si la différence est non nulle
-            changes = np.count_nonzero(diffs)
-            # On ajoute le premier pixel de chaque ligne s'il n'est pas blanc
-            starts = np.count_nonzero(m[:, 0] > 0)
-        else:
-            # Idem pour le mode vertical (axis=0)
-            diffs = np.diff(m, axis=0)
-            changes = np.count_nonzero(diffs)
-            starts = np.count_nonzero(m[0, :] > 0)
-
-        # Calcul des lignes :
-        # Chaque 'change' est une nouvelle commande G1 ou S
-        # On ajoute les retours à la ligne (H ou W selon le mode)
-        n_gcode_lines = changes + starts + (m.shape[0] if raster_mode == "horizontal" else m.shape[1])
-        
-        # Estimation du poids :
-        # 16 octets est une moyenne réaliste pour "G1X123.45S255\n"
-        total_chars = n_gcode_lines * 16
-        
-        return total_chars, n_gcode_lines
-    
-    def get_gcode_statistics(self, matrix, s, gc_params):
         try:
-            h_px, w_px = matrix.shape
-            raster_mode = str(gc_params.get("raster_mode", "horizontal")).lower().strip()
-            g_steps = int(s.get("grayscale_steps", 256))
-            
-            # Quantification Vectorisée (Ultra rapide)
-            if g_steps < 256:
-                factor = 255 / (g_steps - 1)
-                sim_matrix = np.round(matrix / factor) * factor
-            else:
-                sim_matrix = matrix
-
-            # Simulation NumPy
-            total_bytes, n_gcode_lines = self.simulate_gcode_size(sim_matrix, raster_mode, g_steps)
-
-            # Header/Footer forfaitaire
-            total_bytes += 1500 
+            total_bytes, n_gcode_lines = self.predict_final_gcode_size(
+                matrix, dims, offsets, settings_raw, text_blocks, metadata_raw,
+                levels=levels)
 
             if total_bytes < 1024 * 1024:
                 est_size_str = f"{total_bytes / 1024:.1f} KB"
             else:
                 est_size_str = f"{total_bytes / (1024 * 1024):.2f} MB"
 
-            return est_size_str, int(n_gcode_lines)
+            return est_size_str, int(n_gcode_lines), int(total_bytes)
 
         except Exception as e:
             print(f"Estimation error: {e}")
-            return "0 KB", 0
\ No newline at end of file
+            return "0 KB", 0, 0
+
+
+def _generate_range(job):
+    """
+    Worker de génération parallèle (niveau module : sérialisable) :
+    rattache la matrice partagée et retourne les octets des lignes de
+    scan [start, stop) et leurs parties de table de segments (liste
+    vide si non demandées).
+    """
+    engine_cls, (kind, info), plan, gc, start, stop, with_segments = job
+    parts = [] if with_segments else None
+    if kind == "file":
+        filename, offset, dtype, shape = info
+        matrix = np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+        out = b"".join(engine_cls()._iter_range_chunks(
+            matrix, plan, gc, start, stop, parts))
+        return out, parts or []
+
+    name, dtype, shape = info
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        out = b"".join(engine_cls()._iter_range_chunks(
+            matrix, plan, gc, start, stop, parts))
+        del matrix
+        return out, parts or []
+    finally:
+        shm.close()
@@ -1,7 +1,56 @@
+import mmap
+import multiprocessing
+import os
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 import numpy as np
 import gc
 
 
+# ─────────────────────────────────────────────────────────────────
+# Tokenizer en bloc (parse, parse_file) : le texte est lu par tranches
+# d'environ _BULK_CHUNK_BYTES octets coupées en fin de ligne, l'état
+# modal étant reporté d'une tranche à l'autre.  Un mot = lettre
+# + caractères numériques qui suivent + caractère suivant, exactement
+# ce que lisent _extract et _is_g0 ligne à ligne.
+# ─────────────────────────────────────────────────────────────────
+_BULK_CHUNK_BYTES = 1024 * 1024
+# Puissances de 10 exactes : mantisse (≤ 15 chiffres) / 10**k arrondi
+# correctement, identique à float() jusqu'à k = 22
+_POW10 = np.array([float("1e%d" % k) for k in range(23)])
+# Mots plus longs lus par float() un à un
+_BULK_WORD_WIDTH = 24
+# Classes d'octets : caractère numérique, blanc retiré par strip, lettre
+# lue par le parseur, fin de ligne
+_NUM, _WS, _LETTER, _NL = 1, 2, 4, 8
+_BYTE_CLASS = np.zeros(256, dtype=np.uint8)
+_BYTE_CLASS[list(b"0123456789.+-")] = _NUM
+_BYTE_CLASS[list(b" \t\r")] = _WS
+_BYTE_CLASS[list(b"GQSFXY")] = _LETTER
+_BYTE_CLASS[10] = _NL
+# Octets qui séparent ou entourent les lignes autrement que "\n" / "\r\n"
+# pour splitlines / strip : tranche confiée au parseur ligne à ligne
+_BULK_UNSAFE = (b"\v", b"\f", b"\x1c", b"\x1d", b"\x1e", b"\x1f")
+# Lecture des mots en multi-processus au-delà de cette taille de texte
+# (démarrage des workers ~0.5 s), par plages de lignes d'environ
+# _PARSE_RANGE_BYTES, au plus 2 plages en cours par worker (mémoire bornée)
+_PARALLEL_PARSE_MIN_BYTES = 16 * 1024 * 1024
+_PARSE_RANGE_BYTES = 4 * 1024 * 1024
+
+# Enregistrement d'un point pendant la lecture (un par ligne qui déplace
+# l'outil ou change la puissance), converti en colonnes (PointArray) à la fin
+_POINT_DTYPE = np.dtype([
+    ("x", np.float32),       # mm, offset retiré
+    ("y", np.float32),
+    ("power", np.float32),   # 0 sous min_power et en G0
+    ("line", np.uint32),     # numéro de ligne G-Code (1 = première)
+    ("feed", np.float32),    # mm/min
+])
+
+
 class GCodeParser:
     def __init__(self, stats):
         self.stats   = stats
@@ -9,6 +58,8 @@ class GCodeParser:
         self.offY    = stats.get("offY", 0)
         self.min_pwr = stats.get("min_power", 0)
         self.rect_h  = stats.get("rect_h", 0)
+        # Processus de lecture des gros textes (0 = tous les CPU, 1 = séquentiel)
+        self.workers = stats.get("workers", 1)
 
     @staticmethod
     def _extract(line, char):
@@ -35,37 +86,123 @@ class GCodeParser:
         after = line[idx + 2] if idx + 2 < len(line) else ' '
         return after in (' ', '\t', '') or (after.isdigit() and after != '.')
 
+    @staticmethod
+    def _distance_mode(line, incremental):
+        """
+        Mode de coordonnées après la ligne : True en relatif (G91), False en
+        absolu (G90).  Mots entiers seulement : G91.1 (centres d'arcs IJK)
+        ou G900 ne changent pas le mode.
+        """
+        for word, mode in (('G90', False), ('G91', True)):
+            idx = line.find(word)
+            while idx != -1:
+                after = line[idx + 3:idx + 4]
+                if not (after.isdigit() or after == '.'):
+                    incremental = mode
+                    break
+                idx = line.find(word, idx + 3)
+        return incremental
+
     def parse(self, gcode_text):
-        """Parse principal — retourne (points_array, 0.0, limits).
+        """Parse principal — retourne (points, 0.0, limits), points : PointArray.
 
         Corrections vs version précédente :
           - G0 : position mémorisée, puissance forcée à 0, EXCLUS des bounds.
             Les overscan (ex: X=-2) ne gonflent plus le cadre de rendu.
           - parseScmd en double supprimé.
           - parseQcmd ajouté (alias propre).
+          - G90 / G91 : coordonnées absolues ou relatives (G-Code compact).
+          - Tranches ASCII : tokenizer en bloc (_bulk_words), résultat
+            identique à la lecture ligne à ligne (_parse_lines).
         """
         if not gcode_text:
             return None, 0.0, (0.0, 0.0, 0.0, 0.0)
+        return self._parse_chunks(gcode_text.encode("utf-8", "surrogatepass"))
+
+    def parse_file(self, path, progress=None, cancel=None):
+        """
+        parse() en flux sur un fichier projeté en mémoire (mmap) : le
+        texte n'est jamais chargé en entier, seuls les points le sont.
+        Même résultat que parse() sur le fichier lu en UTF-8 (errors="replace").
 
-        lines   = gcode_text.splitlines()
-        n_lines = len(lines)
-        if n_lines == 0:
+        Au-delà de _PARALLEL_PARSE_MIN_BYTES, les mots sont lus par
+        self.workers processus (stats["workers"]).
+
+        progress : appelé avec la fraction lue (0..1) après chaque tranche.
+        cancel   : appelé avant chaque tranche ; True → abandon, retour vide.
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None, 0.0, (0.0, 0.0, 0.0, 0.0)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return self._parse_chunks(buf, progress, cancel, path)
+
+    def _parse_lines(self, gcode_text):
+        """Parse ligne à ligne (référence) — même retour que parse()."""
+        lines = gcode_text.splitlines()
+        state, bounds = self._initial_state()
+        pts = self._lines_chunk(lines, 0, state, bounds)
+        if pts is None:
             return None, 0.0, (0.0, 0.0, 0.0, 0.0)
+        return self._finish(PointArray.from_records(pts), bounds)
+
+    @staticmethod
+    def _initial_state():
+        """État modal en début de programme et bounds vides."""
+        state = {"x": 0.0, "y": 0.0, "f": 1000.0, "pwr": 0.0, "inc": False}
+        bounds = [float("inf"), float("-inf"), float("inf"), float("-inf")]
+        return state, bounds
+
+    @staticmethod
+    def _finish(points, bounds):
+        """Retour de parse() : points (PointArray), durée, bounds (ou ceux des points)."""
+        min_x, max_x, min_y, max_y = bounds
+        # Fallback si aucun G1 trouvé (gcode sans laser)
+        if min_x == float("inf"):
+            min_x, max_x = float(points.x.min()), float(points.x.max())
+            min_y, max_y = float(points.y.min()), float(points.y.max())
+        return points, 0.0, (min_x, max_x, min_y, max_y)
+
+    @staticmethod
+    def timestamps(points):
+        """
+        Remplit points.time : temps cumulé (s, float64) des segments
+        parcourus au feedrate de leur point d'arrivée.  Retourne la durée.
+        """
+        if points is None or not len(points):
+            return 0.0
+        times = points.time
+        times[0] = 0.0
+        if len(points) > 1:
+            distances = np.hypot(np.diff(points.x), np.diff(points.y))
+            rates = points.feed[1:] / 60.0
+            np.cumsum(np.divide(distances, rates, out=np.zeros(len(distances)),
+                                where=rates > 0), out=times[1:])
+        return float(times[-1])
+
+    def _lines_chunk(self, lines, line0, state, bounds):
+        """
+        Points des lignes `lines` (numérotées à partir de line0 + 1) lues
+        une à une ; met à jour state et bounds.  Retourne None sans point.
+        """
+        if not lines:
+            return None
 
         gc_was_enabled = gc.isenabled()
         gc.disable()
 
-        points_array = np.zeros((n_lines * 2, 5), dtype=np.float32)
+        # Au plus un point par ligne
+        points_array = np.zeros(len(lines), dtype=_POINT_DTYPE)
         idx_point = 0
 
-        curr_x = curr_y = 0.0
-        curr_f = 1000.0
-        curr_pwr = 0.0
+        curr_x, curr_y = state["x"], state["y"]
+        curr_f = state["f"]
+        curr_pwr = state["pwr"]
+        incremental = state["inc"]
 
-        min_x = min_y = float('inf')
-        max_x = max_y = float('-inf')
+        min_x, max_x, min_y, max_y = bounds
 
-        for line_idx, raw_line in enumerate(lines, start=1):
+        for line_idx, raw_line in enumerate(lines, start=line0 + 1):
             line = raw_line.strip().upper()
             if not line or line.startswith(('(', ';')):
                 continue
@@ -91,14 +228,17 @@ class GCodeParser:
                 curr_f = val_f
 
             # ── coordonnées ───────────────────────────────────────────────
+            if 'G9' in line:
+                incremental = self._distance_mode(line, incremental)
+
             val_x, found_x = self._extract(line, 'X')
             if found_x:
-                curr_x  = val_x
+                curr_x  = curr_x + val_x if incremental else val_x
                 changed = True
 
             val_y, found_y = self._extract(line, 'Y')
             if found_y:
-                curr_y  = val_y
+                curr_y  = curr_y + val_y if incremental else val_y
                 changed = True
 
             # ── enregistrement ────────────────────────────────────────────
@@ -116,24 +256,385 @@ class GCodeParser:
                 px = curr_x - self.offX
                 py = curr_y - self.offY
 
-                if idx_point < points_array.shape[0]:
-                    points_array[idx_point, :] = (px, py, pwr_to_store,
-                                                   float(line_idx), curr_f)
-                    idx_point += 1
+                points_array[idx_point] = (px, py, pwr_to_store,
+                                           line_idx, curr_f)
+                idx_point += 1
 
         if gc_was_enabled:
             gc.enable()
 
-        if idx_point == 0:
+        state.update(x=curr_x, y=curr_y, f=curr_f, pwr=curr_pwr, inc=incremental)
+        bounds[:] = (min_x, max_x, min_y, max_y)
+        return points_array[:idx_point] if idx_point else None
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Tokenizer en bloc
+    # ──────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _bulk_ok(raw):
+        """True si splitlines / strip / upper se réduisent aux octets "\n", " \t\r"."""
+        return (raw.isascii()
+                and not any(c in raw for c in _BULK_UNSAFE)
+                and raw.count(b"\r") == raw.count(b"\r\n"))
+
+    @staticmethod
+    def _ffill(found, vals, init):
+        """Dernière valeur trouvée à chaque ligne (init avant la première)."""
+        idx = np.where(found, np.arange(found.size), -1)
+        np.maximum.accumulate(idx, out=idx)
+        return np.where(idx >= 0, vals[np.maximum(idx, 0)], init)
+
+    @staticmethod
+    def _first_per_line(mask, tok_line):
+        """(lignes, indices de mot) du premier mot de `mask` de chaque ligne."""
+        sel = np.flatnonzero(mask)
+        ln = tok_line[sel]
+        first = np.ones(sel.size, dtype=bool)
+        first[1:] = ln[1:] != ln[:-1]
+        return ln[first], sel[first]
+
+    def _parse_chunks(self, buf, progress=None, cancel=None, path=None):
+        """
+        Boucle de parse() / parse_file() sur les octets UTF-8 du texte.
+        Tranches ASCII : masques de classes d'octets (lettres, caractères
+        numériques, fins de ligne) → mots par ligne (_bulk_words, sans état),
+        puis état modal (position, puissance, F, G90/G91) résolu tranche
+        après tranche par remplissages « dernière valeur trouvée »
+        (_bulk_resolve).  Autres tranches : décodées et lues ligne à ligne.
+        Mêmes règles que _parse_lines : premier mot de chaque lettre par
+        ligne, Q prioritaire sur S, puissance nulle en G0, bounds sur les
+        seuls mouvements hors G0.  Les points sont ajoutés à un tableau
+        agrandi par doublement.
+        """
+        size = len(buf)
+        state, bounds = self._initial_state()
+        out = _PointBuffer()
+        line0 = 0
+        words_iter = self._iter_words(buf, path)
+        try:
+            for pos, end, words in words_iter:
+                if cancel is not None and cancel():
+                    return None, 0.0, (0.0, 0.0, 0.0, 0.0)
+                line0 += self._chunk_points(buf, pos, end, words, line0, state, bounds, out)
+                if progress is not None:
+                    progress(end / size)
+        finally:
+            words_iter.close()
+
+        if not out.size:
             return None, 0.0, (0.0, 0.0, 0.0, 0.0)
+        return self._finish(out.points(), bounds)
+
+    def _chunk_points(self, buf, pos, end, words, line0, state, bounds, out):
+        """Points de la tranche buf[pos:end] ajoutés à out ; retourne son nombre de lignes."""
+        if words is not None:
+            pts, n_lines = self._bulk_resolve(words, line0, state, bounds)
+        else:
+            lines = buf[pos:end].decode("utf-8", errors="replace").splitlines()
+            pts = self._lines_chunk(lines, line0, state, bounds)
+            n_lines = len(lines)
+        if pts is not None:
+            out.append(pts)
+        return n_lines
+
+    def parse_segments(self, segments):
+        """
+        Même retour que parse() sur le G-Code final, lu depuis la table de
+        segments du moteur (GCodeEngine.build_final_gcode(with_segments=True)) :
+        parties ("text", texte) lues normalement, parties ("lines", table)
+        converties en mots sans passer par le texte.
+        """
+        state, bounds = self._initial_state()
+        out = _PointBuffer()
+        line0 = 0
+        for kind, data in segments:
+            if kind == "lines":
+                pts, n_lines = self._bulk_resolve(self._table_words(data), line0,
+                                                  state, bounds)
+                if pts is not None:
+                    out.append(pts)
+                line0 += n_lines
+                continue
+            if isinstance(data, str):
+                data = data.encode("utf-8", "surrogatepass")
+            for pos, end, words in self._iter_lexed(data, 0, len(data)):
+                line0 += self._chunk_points(data, pos, end, words, line0, state, bounds, out)
 
-        # Fallback si aucun G1 trouvé (gcode sans laser)
-        if min_x == float('inf'):
-            pts  = points_array[:idx_point]
-            min_x, max_x = float(pts[:, 0].min()), float(pts[:, 0].max())
-            min_y, max_y = float(pts[:, 1].min()), float(pts[:, 1].max())
+        if not out.size:
+            return None, 0.0, (0.0, 0.0, 0.0, 0.0)
+        return self._finish(out.points(), bounds)
+
+    @staticmethod
+    def _table_words(table):
+        """Mots (_bulk_words) des lignes d'une table de segments du moteur."""
+        n = table["rapid"].size
+        none = np.zeros(n, dtype=bool)
+        words = {"n_nl": n, "rapid": table["rapid"],
+                 "mode_set": none, "mode_inc": none,
+                 "f_found": none, "f_val": np.zeros(n)}
+        for key, col in (("x", "x"), ("y", "y"), ("p", "power")):
+            v = table[col]
+            found = ~np.isnan(v)
+            words[key + "_found"] = found
+            words[key + "_val"] = np.where(found, v, 0.0)
+        words["eff"] = np.where(table["rapid"], 0.0, words.pop("p_val"))
+        return words
+
+    @staticmethod
+    def _iter_lexed(buf, start, stop):
+        """
+        (début, fin, mots ou None) de chaque tranche de buf[start:stop] ;
+        None : tranche hors ASCII simple, à lire ligne à ligne.
+        """
+        pos = start
+        while pos < stop:
+            end = buf.find(b"\n", pos + _BULK_CHUNK_BYTES, stop)
+            end = stop if end == -1 else end + 1
+            raw = buf[pos:end]
+            words = None
+            if GCodeParser._bulk_ok(raw):
+                words = GCodeParser._bulk_words(np.frombuffer(raw.upper(), dtype=np.uint8))
+            yield pos, end, words
+            pos = end
+
+    @staticmethod
+    def _bulk_words(a):
+        """
+        Mots d'une tranche `a` (octets en majuscules, lignes complètes), par
+        ligne et indépendamment de l'état modal entrant : valeurs X, Y, F,
+        puissance, drapeaux G0 / G90 / G91, nombre de "\n".
+        """
+        size = a.size
+        cls = _BYTE_CLASS[a]
+        nl_pos = np.flatnonzero(cls & _NL)
+        n = nl_pos.size + (a[-1] != 10)
+
+        # ── Lignes utiles : premier caractère après les blancs ni "(" ni ";"
+        starts = np.concatenate(([0], nl_pos + 1))[:n]
+        solid = np.append(np.flatnonzero((cls & _WS) == 0), size)
+        first = solid[np.searchsorted(solid, starts)]
+        head = np.append(a, 10)[first]
+        valid = (head != 10) & (head != 40) & (head != 59)
+
+        # ── Mots : lettre + caractères numériques [s, e) + caractère suivant
+        tok = np.flatnonzero(cls & _LETTER)
+        tok_line = np.searchsorted(nl_pos, tok)
+        keep = valid[tok_line]
+        tok, tok_line = tok[keep], tok_line[keep]
+        letter = a[tok]
+        s = tok + 1
+        stop = np.append(np.flatnonzero((cls & _NUM) == 0), size)
+        e = stop[np.searchsorted(stop, s)]
+        length = e - s
+        nxt = np.append(a, 0)[e]
+        nxt[nxt == 10] = 0
+
+        # ── Valeurs : [+-]?(chiffres[.chiffres]|.chiffres), comme float().
+        #    Un mot ne contient que chiffres, "." et signes : on compte
+        #    points et signes par recherche dans leurs positions.
+        width = int(min(length.max(initial=0), _BULK_WORD_WIDTH))
+        pad = np.append(a, np.full(width + 3, 10, dtype=np.uint8))
+        c0, c1 = pad[s], pad[s + 1]
+        dots = np.flatnonzero(a == 46)
+        signs = np.flatnonzero((a == 43) | (a == 45))
+        d_lo = np.searchsorted(dots, s)
+        n_dot = np.searchsorted(dots, e) - d_lo
+        n_sgn = np.searchsorted(signs, e) - np.searchsorted(signs, s)
+        signed = (length > 0) & ((c0 == 43) | (c0 == 45))
+        n_dig = length - n_dot - n_sgn
+        ok = (n_dig > 0) & (n_sgn == signed) & (n_dot <= 1)
+        dot_at = np.append(dots, size)[d_lo]
+        frac = np.where(n_dot > 0, e - dot_at - 1, 0)
+        # Mantisse entière exacte (≤ 15 chiffres) : caractères du mot en
+        # colonnes (largeur du plus long mot, bornée), Horner sur les chiffres
+        cols = pad[s + np.arange(max(width, 3))[:, None]] - np.uint8(48)
+        mant = np.zeros(tok.size, dtype=np.int64)
+        for j in range(width):
+            d = (cols[j] < 10) & (j < length)
+            mant = np.where(d, mant * 10 + cols[j], mant)
+        val = mant / _POW10[np.minimum(frac, 22)]
+        val[signed & (c0 == 45)] *= -1.0
+        slow = np.flatnonzero(ok & ((n_dig > 15) | (length > width) | (frac > 22)))
+        for i in slow.tolist():
+            val[i] = float(a[s[i]:e[i]].tobytes())
+        val[~ok] = np.nan
+
+        def word(char):
+            ln, ti = GCodeParser._first_per_line(letter == ord(char), tok_line)
+            found = np.zeros(n, dtype=bool)
+            v = np.zeros(n)
+            found[ln] = ok[ti]
+            v[ln] = np.where(ok[ti], val[ti], 0.0)
+            return found, v
+
+        # ── Mots G : premier "G0" de la ligne, mots "G90" / "G91" entiers
+        #    (ni chiffre ni "." ensuite : G91.1 n'est pas G91) ──────────────
+        is_g = letter == ord("G")
+        d1 = (length > 1) & (cols[1] < 10)
+        more = (length > 2) & ((cols[2] < 10) | (pad[s + 2] == 46))
+        rapid = np.zeros(n, dtype=bool)
+        ln, ti = GCodeParser._first_per_line(is_g & (length > 0) & (c0 == 48), tok_line)
+        end_ok = np.isin(nxt[ti], (0, 32, 9, 13))
+        rapid[ln] = d1[ti] | ((length[ti] == 1) & end_ok)
+        # G91 l'emporte si la ligne porte les deux (même ordre que _distance_mode)
+        mode_set = np.zeros(n, dtype=bool)
+        mode_inc = np.zeros(n, dtype=bool)
+        for unit, inc in ((48, False), (49, True)):
+            ln = tok_line[is_g & (length > 1) & (c0 == 57) & (c1 == unit) & ~more]
+            mode_set[ln] = True
+            mode_inc[ln] = inc
+
+        # ── Puissance (Q prioritaire sur S) ───────────────────────────────
+        q_found, q_val = word("Q")
+        s_found, s_val = word("S")
+        f_found, f_val = word("F")
+        x_found, x_val = word("X")
+        y_found, y_val = word("Y")
+        return {"n_nl": nl_pos.size, "rapid": rapid,
+                "mode_set": mode_set, "mode_inc": mode_inc,
+                "p_found": q_found | s_found,
+                "eff": np.where(rapid, 0.0, np.where(q_found, q_val, s_val)),
+                "f_found": f_found, "f_val": f_val,
+                "x_found": x_found, "x_val": x_val,
+                "y_found": y_found, "y_val": y_val}
+
+    def _bulk_resolve(self, w, line0, state, bounds):
+        """
+        Points d'une tranche à partir de ses mots (_bulk_words) et de l'état
+        modal entrant ; met à jour state et bounds.  Retourne (points ou
+        None, nombre de "\n").
+        """
+        rapid, p_found, eff = w["rapid"], w["p_found"], w["eff"]
+        n = rapid.size
+        if not n:
+            return None, w["n_nl"]
+        inc = self._ffill(w["mode_set"], w["mode_inc"], state["inc"])
+
+        # ── Puissance, feedrate ───────────────────────────────────────────
+        pwr = self._ffill(p_found, eff, state["pwr"])
+        before = np.empty(n)
+        before[0] = state["pwr"]
+        before[1:] = pwr[:-1]
+        power_changed = p_found & (eff != before)
+        feed = self._ffill(w["f_found"], w["f_val"], state["f"])
+
+        # ── Coordonnées (absolues, ou cumulées en G91) ───────────────────
+        cx = self._resolve_axis(w["x_found"], w["x_val"], inc, state["x"])
+        cy = self._resolve_axis(w["y_found"], w["y_val"], inc, state["y"])
+        changed = w["x_found"] | w["y_found"]
+
+        state.update(x=float(cx[-1]), y=float(cy[-1]), f=float(feed[-1]),
+                     pwr=float(pwr[-1]), inc=bool(inc[-1]))
+
+        rec = np.flatnonzero(changed | power_changed)
+        if not rec.size:
+            return None, w["n_nl"]
+        moves = changed & ~rapid
+        if moves.any():
+            bounds[0] = min(bounds[0], float(cx[moves].min()))
+            bounds[1] = max(bounds[1], float(cx[moves].max()))
+            bounds[2] = min(bounds[2], float(cy[moves].min()))
+            bounds[3] = max(bounds[3], float(cy[moves].max()))
+        p = pwr[rec]
+        pts = np.empty(rec.size, dtype=_POINT_DTYPE)
+        pts["x"] = cx[rec] - self.offX
+        pts["y"] = cy[rec] - self.offY
+        pts["power"] = np.where(p > self.min_pwr, p, 0.0)
+        pts["line"] = rec + (line0 + 1)
+        pts["feed"] = feed[rec]
+        return pts, w["n_nl"]
+
+    def _resolve_axis(self, found, vals, inc, init):
+        """
+        Position d'un axe à chaque ligne : dernière valeur absolue, ou somme
+        (séquentielle, mêmes arrondis que le parseur ligne à ligne) des
+        déplacements G91 depuis la dernière position absolue.
+        """
+        rel = found & inc
+        if not rel.any():
+            return self._ffill(found, vals, init)
+        idx = np.flatnonzero(found)
+        pos = np.empty(idx.size)
+        cur = init
+        # Segments : une position absolue (ou l'état entrant) puis des déplacements
+        starts = np.flatnonzero(~rel[idx])
+        bounds = np.concatenate(([0], starts, [idx.size]))
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if a == b:
+                continue
+            if not rel[idx[a]]:
+                cur = vals[idx[a]]
+                pos[a] = cur
+                a += 1
+            if b > a:
+                pos[a:b] = np.cumsum(np.concatenate(([cur], vals[idx[a:b]])))[1:]
+                cur = pos[b - 1]
+        resolved = np.zeros(found.size)
+        resolved[idx] = pos
+        return self._ffill(found, resolved, init)
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Lecture parallèle : les mots d'une tranche ne dépendent pas de l'état
+    # modal.  Des plages de lignes sont lues par un pool de processus
+    # (fichier relu par chaque worker, ou octets transmis), puis l'état est
+    # propagé ici dans l'ordre : résultat identique à la lecture séquentielle.
+    # ──────────────────────────────────────────────────────────────────────────
 
-        return points_array[:idx_point], 0.0, (min_x, max_x, min_y, max_y)
+    def _parse_workers(self, size):
+        """Nombre de processus de lecture (1 = séquentiel)."""
+        workers = int(self.workers or 0)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        if size < _PARALLEL_PARSE_MIN_BYTES:
+            return 1
+        return workers
+
+    def _iter_words(self, buf, path=None):
+        """_iter_lexed sur tout le texte, en parallèle si possible."""
+        size = len(buf)
+        workers = self._parse_workers(size)
+        if workers > 1:
+            emitted = False
+            try:
+                for item in self._iter_parallel_words(buf, path, workers):
+                    emitted = True
+                    yield item
+                return
+            except (OSError, BrokenProcessPool) as e:
+                if emitted:
+                    raise
+                print(f"[ALIG] Lecture parallèle indisponible ({e}), repli séquentiel")
+        yield from self._iter_lexed(buf, 0, size)
+
+    @staticmethod
+    def _iter_parallel_words(buf, path, workers):
+        """_iter_lexed par plages de lignes dans un pool de processus, dans l'ordre."""
+        size = len(buf)
+
+        def jobs():
+            start = 0
+            while start < size:
+                stop = buf.find(b"\n", start + _PARSE_RANGE_BYTES)
+                stop = size if stop == -1 else stop + 1
+                src = ("file", path) if path is not None else ("bytes", buf[start:stop])
+                yield src, start, stop
+                start = stop
+
+        ctx = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+        try:
+            todo = jobs()
+            pending = deque(pool.submit(_lex_range, job)
+                            for job in islice(todo, 2 * workers))
+            while pending:
+                lexed = pending.popleft().result()
+                for job in islice(todo, 1):
+                    pending.append(pool.submit(_lex_range, job))
+                yield from lexed
+        finally:
+            # Abandon (annulation) : les plages non commencées sont retirées
+            pool.shutdown(wait=True, cancel_futures=True)
 
     # ──────────────────────────────────────────────────────────────────────────
 
@@ -141,12 +642,13 @@ class GCodeParser:
         """Parser mode S — repère image (Y inversé via rect_h)."""
         lines        = gcode_text.splitlines()
         n_lines      = len(lines)
-        points_array = np.zeros((n_lines, 5), dtype=np.float32)
+        points_array = np.zeros(n_lines, dtype=_POINT_DTYPE)
         idx_point    = 0
 
         curr_x = curr_y = 0.0
         curr_f = 1000.0
         curr_pwr = 0.0
+        incremental = False
 
         for line_idx, raw_line in enumerate(lines, start=1):
             line = raw_line.strip().upper()
@@ -166,14 +668,17 @@ class GCodeParser:
             if found_f:
                 curr_f = val_f
 
+            if 'G9' in line:
+                incremental = self._distance_mode(line, incremental)
+
             val_x, found_x = self._extract(line, 'X')
             if found_x:
-                curr_x  = val_x
+                curr_x  = curr_x + val_x if incremental else val_x
                 changed = True
 
             val_y, found_y = self._extract(line, 'Y')
             if found_y:
-                curr_y  = val_y
+                curr_y  = curr_y + val_y if incremental else val_y
                 changed = True
 
             if changed and not is_rapid:
@@ -181,12 +686,12 @@ class GCodeParser:
                 px = curr_x - self.offX
                 py = self.rect_h - (curr_y - self.offY)
                 points_array[idx_point] = (px, py, pwr_to_store,
-                                            float(line_idx), curr_f)
+                                            line_idx, curr_f)
                 idx_point += 1
 
         if idx_point == 0:
             return None, 0.0
-        return points_array[:idx_point], 0.0
+        return PointArray.from_records(points_array[:idx_point]), 0.0
 
     def parseQcmd(self, gcode_text):
         """Parser mode Q — alias propre de parseScmd (Q déjà géré dedans)."""
@@ -199,3 +704,88 @@ class GCodeParser:
         if mode.upper() == 'Q':
             return self.parseQcmd(gcode_text)
         return self.parseScmd(gcode_text)
+
+
+class PointArray:
+    """
+    Points du parseur en colonnes contiguës : x, y, power (float32, mm et
+    unités de puissance), line (uint32, numéro de ligne G-Code exact
+    au-delà de 2**24 lignes), feed (float32, mm/min) et time (float64,
+    s cumulées remplies par GCodeParser.timestamps : résolution
+    sub-milliseconde sur des jobs de plusieurs heures).  Colonne par nom
+    (pts["time"], pts.time) ou tranche pts[a:b] : vues sans copie, prêtes
+    pour searchsorted et le renderer.
+    """
+
+    COLUMNS = ("x", "y", "power", "line", "feed", "time")
+    __slots__ = COLUMNS
+
+    def __init__(self, x, y, power, line, feed, time):
+        self.x, self.y, self.power = x, y, power
+        self.line, self.feed, self.time = line, feed, time
+
+    @classmethod
+    def from_records(cls, rec):
+        """Colonnes d'un tableau d'enregistrements _POINT_DTYPE (temps à 0)."""
+        cols = [np.ascontiguousarray(rec[name]) for name in _POINT_DTYPE.names]
+        return cls(*cols, np.zeros(len(rec)))
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        if isinstance(key, slice):
+            return PointArray(*(getattr(self, name)[key] for name in self.COLUMNS))
+        raise TypeError("PointArray : colonne (str) ou tranche attendue")
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+
+class _PointBuffer:
+    """Colonnes de points agrandies par doublement (enregistrements _POINT_DTYPE ajoutés)."""
+
+    def __init__(self):
+        self._cols = {name: np.empty(0, dtype=_POINT_DTYPE[name])
+                      for name in _POINT_DTYPE.names}
+        self.size = 0
+
+    def append(self, pts):
+        n = self.size + len(pts)
+        for name, col in self._cols.items():
+            if n > len(col):
+                grown = np.empty(max(2 * len(col), n), dtype=col.dtype)
+                grown[:self.size] = col[:self.size]
+                self._cols[name] = col = grown
+            col[self.size:n] = pts[name]
+        self.size = n
+
+    def points(self):
+        """
+        PointArray à la taille exacte : chaque colonne est recopiée puis son
+        tampon (jusqu'à 2× trop grand) libéré avant la suivante.  Le tampon
+        est vide ensuite.
+        """
+        cols = []
+        for name in _POINT_DTYPE.names:
+            cols.append(self._cols[name][:self.size].copy())
+            self._cols[name] = np.empty(0, dtype=_POINT_DTYPE[name])
+        size, self.size = self.size, 0
+        return PointArray(*cols, np.zeros(size))
+
+
+def _lex_range(job):
+    """
+    Worker de lecture parallèle (niveau module : sérialisable) : mots des
+    tranches de la plage [start, stop) du texte, positions absolues.
+    """
+    (kind, src), start, stop = job
+    if kind == "bytes":
+        return [(a + start, b + start, w)
+                for a, b, w in GCodeParser._iter_lexed(src, 0, len(src))]
+    with open(src, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return list(GCodeParser._iter_lexed(buf, start, stop))
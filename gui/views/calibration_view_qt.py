@@ -906,7 +906,8 @@ class CalibrationView(QWidget):
         grid.addWidget(QLabel(self.texts.get("max_accel", "Max Acceleration (mm/s²):")), 1, 0)
         self.overscan_accel_entry = QLineEdit()
         self.overscan_accel_entry.setPlaceholderText("ex: 500")
-        self.overscan_accel_entry.setText("500")
+        current_accel = self.controller.get_item("machine_settings", "acceleration", "500")
+        self.overscan_accel_entry.setText(str(current_accel))
         grid.addWidget(self.overscan_accel_entry, 1, 1)
 
         # Latence laser (pré-remplie depuis la config, peut être négative)
@@ -91,24 +91,22 @@ class _Renderer:
 
         safe_end = min(end, len(pts_arr) - 1)
 
-        p1 = pts_arr[start:safe_end].copy()
-        p2 = pts_arr[start+1:safe_end+1].copy()
+        p1 = pts_arr[start:safe_end]
+        p2 = pts_arr[start+1:safe_end+1]
         if len(p1) == 0:
             return None
 
         # ── filtre puissance
         laser_threshold = max(self.pwr_min, self.ctrl_max * 0.001)
-        mask = p2[:,2] > laser_threshold
+        mask = p2['power'] > laser_threshold
         if not mask.any():
             return None
 
-        p1 = p1[mask]
-        p2 = p2[mask]
-
-        x1 = p1[:,0].copy()
-        y1_mm = p1[:,1].copy()
-        x2 = p2[:,0].copy()
-        y2_mm = p2[:,1].copy()
+        x1 = p1['x'][mask]
+        y1_mm = p1['y'][mask]
+        x2 = p2['x'][mask]
+        y2_mm = p2['y'][mask]
+        pwr = p2['power'][mask]
 
         # ── correction latence
         if use_lat and lat_mm != 0:
@@ -154,7 +152,7 @@ class _Renderer:
 
         fx1=fx1[ok]; fy1=fy1[ok]
         fx2=fx2[ok]; fy2=fy2[ok]
-        pwr=p2[:,2][ok]
+        pwr=pwr[ok]
         y1_mm=y1_mm[ok]; y2_mm=y2_mm[ok]
 
         # ── filtre longueur : ne rejeter que les segments strictement nuls
@@ -545,47 +543,80 @@ class _SimCanvas(QWidget):
 #  WORKER : parsing G-Code hors thread UI
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Texte affiché dans l'aperçu G-Code : au-delà, seules les premières
+# lignes sont chargées (QPlainTextEdit fige l'UI sur des centaines de Mo)
+_VIEW_MAX_CHARS = 16 * 1024 * 1024
+
+
 class _ParseWorker(QThread):
-    done  = pyqtSignal(dict)
-    error = pyqtSignal(str)
+    done     = pyqtSignal(dict)
+    error    = pyqtSignal(str)
+    progress = pyqtSignal(int)
 
-    def __init__(self, gcode: str):
+    def __init__(self, path: str, workers: int = 1):
         super().__init__()
-        self.gcode = gcode
+        self.path = path
+        self.workers = workers
+        self._pct = -1
+
+    def _on_progress(self, frac):
+        pct = int(frac * 100)
+        if pct != self._pct:
+            self._pct = pct
+            self.progress.emit(pct)
+
+    def _read_preview(self):
+        """(texte de l'aperçu, nombre de lignes du fichier, aperçu tronqué)."""
+        with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read(_VIEW_MAX_CHARS)
+            truncated = bool(f.read(1))
+        if truncated:
+            text = text[:text.rfind('\n') + 1]
+        nb_lines = 0
+        with open(self.path, 'rb') as f:
+            for blk in iter(lambda: f.read(1 << 20), b''):
+                if self.isInterruptionRequested():
+                    break
+                nb_lines += blk.count(b'\n')
+        return text, nb_lines, truncated
 
     def run(self):
         try:
-            parser = GCodeParser({})
-            pts, dur, lim = parser.parse(self.gcode)
+            # Parse en flux (mmap) : le fichier n'est jamais chargé en entier
+            parser = GCodeParser({'workers': self.workers})
+            pts, dur, lim = parser.parse_file(
+                self.path, progress=self._on_progress,
+                cancel=self.isInterruptionRequested)
+            if self.isInterruptionRequested():
+                return
 
             if lim is not None and not all(abs(v) < 1e-9 for v in lim):
                 bx0, bx1, by0, by1 = lim
             else:
                 if pts is not None and len(pts):
-                    bx0, bx1 = float(pts[:,0].min()), float(pts[:,0].max())
-                    by0, by1 = float(pts[:,1].min()), float(pts[:,1].max())
+                    bx0, bx1 = float(pts['x'].min()), float(pts['x'].max())
+                    by0, by1 = float(pts['y'].min()), float(pts['y'].max())
                 else:
                     bx0 = bx1 = by0 = by1 = 0.0
 
-            # Timestamps cumulés
+            # Timestamps cumulés (champ time, float64)
             if pts is not None and len(pts) > 1:
-                deltas    = np.diff(pts[:, :2], axis=0)
-                distances = np.hypot(deltas[:, 0], deltas[:, 1])
-                rates     = pts[1:, 4] / 60.0
-                # Feedrate moyen (col 4 avant écrasement) — pour la latence
-                feedrate_mmmin = float(np.median(pts[pts[:, 4] > 0, 4])) if (pts[:, 4] > 0).any() else 3000.0
-                times     = np.divide(distances, rates,
-                                      out=np.zeros_like(distances),
-                                      where=rates > 0)
-                pts[0, 4]  = 0.0
-                pts[1:, 4] = np.cumsum(times)
-                total_dur  = float(pts[-1, 4])
+                # Feedrate moyen — pour la latence
+                feed = pts['feed']
+                feedrate_mmmin = float(np.median(feed[feed > 0])) if (feed > 0).any() else 3000.0
+                total_dur = GCodeParser.timestamps(pts)
             else:
                 total_dur = 0.0
                 feedrate_mmmin = 3000.0
 
+            gcode, nb_lines, truncated = self._read_preview()
+            if self.isInterruptionRequested():
+                return
+
             self.done.emit({
-                'gcode':          self.gcode,
+                'gcode':          gcode,
+                'nb_lines':       nb_lines,
+                'truncated':      truncated,
                 'pts':            pts,
                 'total_dur':      total_dur,
                 'bounds':         (bx0, bx1, by0, by1),
@@ -952,16 +983,46 @@ class CheckerViewQt(QWidget):
         pb = QProgressBar()
         pb.setFixedHeight(10)
         pb.setRange(0, 0)
+        pb.setTextVisible(False)
         pb.setStyleSheet('QProgressBar{background:#555;border-radius:5px;border:none;}'
                          'QProgressBar::chunk{background:#27ae60;border-radius:5px;}')
         bl.addWidget(pb)
+        self._ov_bar = pb
+
+        btn = QPushButton(self.t.get('cancel', 'Cancel'))
+        btn.setFixedHeight(26)
+        btn.setStyleSheet(self._gbtn('#333', '#444'))
+        btn.clicked.connect(self._cancel_parse)
+        bl.addWidget(btn)
         lo.addWidget(box)
 
+    def _on_parse_progress(self, pct):
+        if hasattr(self, '_ov_bar'):
+            self._ov_bar.setRange(0, 100)
+            self._ov_bar.setValue(pct)
+
     def _hide_loading(self):
         if hasattr(self, '_ov'):
             self._ov.hide()
             self._ov.deleteLater()
             del self._ov
+            del self._ov_bar
+
+    def _cancel_parse(self):
+        """Abandonne le parse en cours (bouton de l'overlay, nouveau fichier, fermeture)."""
+        w = getattr(self, '_parse_worker', None)
+        self._parse_worker = None
+        if w is None or not w.isRunning():
+            return
+        for sig in (w.done, w.error, w.progress):
+            sig.disconnect()
+        # Arrêt à la tranche suivante (quelques ms) avant de libérer le thread
+        w.requestInterruption()
+        w.wait()
+        self._hide_loading()
+        if not self.final_gcode:
+            self._loaded_path = ''
+            self.lbl_file.setText(self.t.get('no_file', 'No file loaded'))
 
     def _update_gcode_font(self):
         """Adapte la taille de la police du G-Code à la largeur du panneau gauche."""
@@ -1047,10 +1108,10 @@ class CheckerViewQt(QWidget):
 
         self._show_loading()
 
-        # Lecture
+        # Lecture (le parse projette le fichier en mémoire, sans le charger)
         try:
-            with open(path, 'r', encoding='utf-8', errors='replace') as f:
-                gcode = f.read()
+            with open(path, 'rb'):
+                pass
         except Exception as e:
             self._hide_loading()
             QMessageBox.critical(self,
@@ -1059,9 +1120,12 @@ class CheckerViewQt(QWidget):
             return
 
         # Parsing dans un thread pour ne pas bloquer l'UI
-        self._parse_worker = _ParseWorker(gcode)
+        workers = self.controller.config_manager.get_item(
+            'machine_settings', 'gen_workers', 0)
+        self._parse_worker = _ParseWorker(path, workers)
         self._parse_worker.done.connect(self._on_parse_done)
         self._parse_worker.error.connect(self._on_parse_error)
+        self._parse_worker.progress.connect(self._on_parse_progress)
         self._parse_worker.start()
 
     def _on_parse_error(self, msg):
@@ -1092,20 +1156,26 @@ class CheckerViewQt(QWidget):
         # On veut voir l'intégralité des déplacements, overscan inclus
         pts = self.points_list
         if pts is not None and len(pts):
-            self._mnx = float(pts[:, 0].min())
-            self._mxx = float(pts[:, 0].max())
-            self._mny = float(pts[:, 1].min())
-            self._mxy = float(pts[:, 1].max())
+            self._mnx = float(pts['x'].min())
+            self._mxx = float(pts['x'].max())
+            self._mny = float(pts['y'].min())
+            self._mxy = float(pts['y'].max())
         else:
             self._mnx = self._mxx = self._mny = self._mxy = 0.0
 
         # Infos affichées
-        nb_lines = self.final_gcode.count('\n')
+        nb_lines = d.get('nb_lines', self.final_gcode.count('\n'))
         self.lbl_size.setText(f'{nb_lines} lines')
         self.lbl_dur.setText(self._fmt(self.total_sec))
 
         if self.final_gcode:
-            self.gcode_view.setPlainText(self.final_gcode)
+            text = self.final_gcode
+            if d.get('truncated'):
+                # Aperçu limité aux premières lignes (gros fichiers)
+                shown = text.count('\n')
+                text += self.t.get('preview_truncated',
+                                   '(… preview limited to the first {n} lines …)').format(n=shown)
+            self.gcode_view.setPlainText(text)
             self._update_gcode_font()
 
         self.lbl_time.setText(f'00:00:00 / {self._fmt(self.total_sec)}')
@@ -1113,8 +1183,8 @@ class CheckerViewQt(QWidget):
 
         # Détecter l'axe dominant du raster pour pré-remplir le line_step
         if pts is not None and len(pts) > 1:
-            dx_total = float(np.sum(np.abs(np.diff(pts[:, 0]))))
-            dy_total = float(np.sum(np.abs(np.diff(pts[:, 1]))))
+            dx_total = float(np.sum(np.abs(np.diff(pts['x']))))
+            dy_total = float(np.sum(np.abs(np.diff(pts['y']))))
             is_horizontal = dx_total >= dy_total
             try:
                 key = 'hor_linestep' if is_horizontal else 'ver_linestep'
@@ -1206,7 +1276,7 @@ class CheckerViewQt(QWidget):
         # (ex: 40), laser_threshold = max(40, ctrl_max*0.001) = 40, et la
         # condition pwr > threshold serait False pour Q=40 → rien dessiné.
         # pwr_max_s = valeur max trouvée dans le fichier (ou ctrl_max par défaut).
-        pwr_col = pts[:, 2]
+        pwr_col = pts['power']
         pwr_active = pwr_col[pwr_col > 0]
         if len(pwr_active):
             pwr_min_s = 0.0
@@ -1242,9 +1312,8 @@ class CheckerViewQt(QWidget):
         # ─────────────────────────────
         # Position initiale laser
         # ─────────────────────────────
-        p0 = self.points_list[0]
-        lx = x0 + (p0[0] - self._mnx) * sc
-        ly = y0 + ph - (p0[1] - self._mny) * sc
+        lx = x0 + (self.points_list['x'][0] - self._mnx) * sc
+        ly = y0 + ph - (self.points_list['y'][0] - self._mny) * sc
 
         # ─────────────────────────────
         # Setup canvas (AVEC l_step en dernier argument)
@@ -1309,7 +1378,7 @@ class CheckerViewQt(QWidget):
         # Avancement index via searchsorted
         # ───────────────────────────────
         idx = np.searchsorted(
-            pts[:, 4],
+            pts['time'],
             self.current_sim_time,
             side='right'
         ) - 1
@@ -1352,19 +1421,19 @@ class CheckerViewQt(QWidget):
         # ───────────────────────────────
         # Interpolation laser fluide
         # ───────────────────────────────
-        pc = pts[self.current_idx]
-        pn = pts[self.current_idx + 1]
+        i  = self.current_idx
+        xs, ys, ts = pts['x'], pts['y'], pts['time']
 
-        td = pn[4] - pc[4]
+        td = ts[i + 1] - ts[i]
 
         if td > 0:
-            r = (self.current_sim_time - pc[4]) / td
+            r = (self.current_sim_time - ts[i]) / td
             r = max(0.0, min(1.0, r))
         else:
             r = 0.0
 
-        lx_mm = pc[0] + (pn[0] - pc[0]) * r
-        ly_mm = pc[1] + (pn[1] - pc[1]) * r
+        lx_mm = xs[i] + (xs[i + 1] - xs[i]) * r
+        ly_mm = ys[i] + (ys[i + 1] - ys[i]) * r
 
         self.canvas.set_laser(*self._mm_to_screen(lx_mm, ly_mm))
 
@@ -1420,8 +1489,8 @@ class CheckerViewQt(QWidget):
 
         self.canvas.notify_dirty()
 
-        mx = float(self.points_list[target_idx][0])
-        my = float(self.points_list[target_idx][1])
+        mx = float(self.points_list['x'][target_idx])
+        my = float(self.points_list['y'][target_idx])
         self.canvas.set_laser(*self._mm_to_screen(mx, my))
 
     # ══════════════════════════════════════════════════════════════
@@ -1434,11 +1503,11 @@ class CheckerViewQt(QWidget):
             return None
         try:
             # Chercher les transitions laser actif → inactif (fin de ligne)
-            pwr = pts[:, 2]
+            pwr = pts['power']
             starts = np.where((pwr[:-1] == 0) & (pwr[1:] > 0))[0] + 1
             if len(starts) < 2:
                 # Fallback : diffs Y uniques pour raster horizontal
-                y_unique = np.unique(np.round(pts[:, 1], 6))
+                y_unique = np.unique(np.round(pts['y'], 6))
                 if len(y_unique) > 1:
                     diffs = np.diff(y_unique)
                     diffs = diffs[diffs > 1e-6]
@@ -1449,9 +1518,8 @@ class CheckerViewQt(QWidget):
             n = min(len(starts) - 1, 30)
             dists = []
             for i in range(n):
-                p1 = pts[starts[i], :2]
-                p2 = pts[starts[i + 1], :2]
-                d = float(np.hypot(p2[0] - p1[0], p2[1] - p1[1]))
+                a, b = starts[i], starts[i + 1]
+                d = float(np.hypot(pts['x'][b] - pts['x'][a], pts['y'][b] - pts['y'][a]))
                 if 1e-4 < d < 10.0:
                     dists.append(d)
             if dists:
@@ -1467,9 +1535,9 @@ class CheckerViewQt(QWidget):
             self._init_canvas()
 
     def toggle_pause(self):
-        if self.points_list is None or self.points_list.size == 0:
+        if self.points_list is None or len(self.points_list) == 0:
             return
-        if self.current_idx >= self.points_list.shape[0] - 1:   # fin atteinte → replay
+        if self.current_idx >= len(self.points_list) - 1:   # fin atteinte → replay
             self.rewind_sim(); self._start_play(); return
         if self.sim_running:
             self._stop_play()
@@ -1488,8 +1556,8 @@ class CheckerViewQt(QWidget):
             self.last_frame_time  = 0.0
             self.prog_bar.setValue(0)
             self.lbl_time.setText(f'00:00:00 / {self._fmt(self.total_sec)}')
-            if self.points_list is not None and self.points_list.size > 0:
-                lx, ly = self._mm_to_screen(self.points_list[0][0], self.points_list[0][1])
+            if self.points_list is not None and len(self.points_list) > 0:
+                lx, ly = self._mm_to_screen(self.points_list['x'][0], self.points_list['y'][0])
                 self.canvas.set_laser(lx, ly)
         self.sim_running     = True
         self.last_frame_time = time.perf_counter()
@@ -1525,9 +1593,9 @@ class CheckerViewQt(QWidget):
         self.btn_play.setIcon(QIcon(self.play_pixmap))
         self.btn_play.setStyleSheet(self._gbtn('#27ae60', '#1e8449'))
         self._highlight_gcode(0)
-        if self.points_list is not None and self.points_list.size > 0:
+        if self.points_list is not None and len(self.points_list) > 0:
             lx, ly = self._mm_to_screen(
-                self.points_list[0][0], self.points_list[0][1])
+                self.points_list['x'][0], self.points_list['y'][0])
             self.canvas.set_laser(lx, ly)
 
     def skip_to_end(self):
@@ -1588,9 +1656,9 @@ class CheckerViewQt(QWidget):
         self.current_sim_time = ratio * self.total_sec
 
         # Recherche de l'index correspondant au temps dans les données NumPy
-        # (on suppose que self.points_list[:, 4] contient les timestamps cumulés)
+        # (on suppose que self.points_list['time'] contient les timestamps cumulés)
         idx = np.searchsorted(
-            self.points_list[:, 4],
+            self.points_list['time'],
             self.current_sim_time,
             side='right'
         ) - 1
@@ -1624,16 +1692,12 @@ class CheckerViewQt(QWidget):
         if self.points_list is None or len(self.points_list) == 0:
             return
         pts = self.points_list
-        # pts[:,3] contient le numéro de ligne G-Code
-        matches = np.where(pts[:, 3].astype(int) >= line_num)[0]
-        if len(matches) == 0:
-            idx = len(pts) - 1
-        else:
-            idx = int(matches[0])
+        # pts['line'] : numéros de ligne G-Code (entiers, croissants)
+        idx = min(int(np.searchsorted(pts['line'], line_num)), len(pts) - 1)
         was_running = self.sim_running
         self._stop_play()
         self.current_idx      = idx
-        self.current_sim_time = float(pts[idx][4])
+        self.current_sim_time = float(pts['time'][idx])
         self._redraw_to(idx)
         self._update_ui(idx)
         if was_running:
@@ -1680,7 +1744,7 @@ class CheckerViewQt(QWidget):
     def _update_ui(self, idx):
         if self.points_list is None or idx >= len(self.points_list): return
         
-        ts  = float(self.points_list[idx][4])
+        ts  = float(self.points_list['time'][idx])
         
         # On base le rendu visuel sur l'écoulement du TEMPS, pas sur l'index des points
         pct = ts / max(0.001, self.total_sec) 
@@ -1694,7 +1758,7 @@ class CheckerViewQt(QWidget):
     def _highlight_gcode(self, idx):
         if self.points_list is None or idx >= len(self.points_list): return
         try:
-            line_num = int(self.points_list[idx][3])
+            line_num = int(self.points_list['line'][idx])
             block    = self.gcode_view.document().findBlockByLineNumber(line_num-1)
             if block.isValid():
                 cur = self.gcode_view.textCursor()
@@ -1847,6 +1911,7 @@ class CheckerViewQt(QWidget):
         else:                              self.controller.show_dashboard()
 
     def _stop_all(self):
+        self._cancel_parse()
         self.sim_running = False
         self._anim_timer.stop()
         if hasattr(self, '_worker') and self._worker.isRunning():
@@ -43,7 +43,7 @@ from gui.utils_qt import (
 )
 from core.translations import TRANSLATIONS
 from core.themes import get_theme
-from engine.gcode_engine import GCodeEngine
+from engine import create_engine
 from core.config_manager import save_json_file, load_json_file
 from core.utils import get_app_paths
 from gui.utils_qt import get_svg_pixmap
@@ -67,6 +67,7 @@ class _HistogramWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self._matrix      = None
+        self._levels      = None
         self._v_min       = 0
         self._v_max       = 255
         self._label_power = "Power"
@@ -84,8 +85,11 @@ class _HistogramWidget(QWidget):
     def update_data(self, matrix, v_min, v_max,
                     label_title="Power Distribution",
                     label_power="Power",
-                    label_count="Pixel count"):
+                    label_count="Pixel count",
+                    levels=None):
+        """`levels` : table niveau → puissance si `matrix` est une matrice d'indices."""
         self._matrix      = matrix
+        self._levels      = levels
         self._v_min       = float(v_min)
         self._v_max       = float(v_max)
         self._label_title = label_title
@@ -119,13 +123,23 @@ class _HistogramWidget(QWidget):
             qp.end()
             return
 
-        flat  = self._matrix.ravel()[::8]
-        total = max(flat.size, 1) # Le dénominateur pour le pourcentage
         v_min = self._v_min
         v_max = self._v_max
 
-        data_off    = flat[flat == 0]
-        data_active = flat[flat > 0]
+        if self._levels is not None:
+            # Matrice d'indices : comptage exact par niveau (entiers)
+            levels   = np.asarray(self._levels, dtype=np.float64)
+            n_level  = np.bincount(self._matrix.ravel(), minlength=len(levels))
+            total    = max(int(self._matrix.size), 1)
+            n_off    = int(n_level[levels == 0].sum())
+            data_active = levels[levels > 0]
+            weights     = n_level[levels > 0]
+        else:
+            flat  = self._matrix.ravel()[::8]
+            total = max(flat.size, 1) # Le dénominateur pour le pourcentage
+            n_off       = int(np.count_nonzero(flat == 0))
+            data_active = flat[flat > 0]
+            weights     = None
 
         BINS = 64
         if len(data_active) > 0:
@@ -135,6 +149,7 @@ class _HistogramWidget(QWidget):
                 data_active,
                 bins=BINS,
                 range=(lo_range, hi_range),
+                weights=weights,
                 density=False
             )
             # Conversion des comptes en pourcentages
@@ -144,7 +159,7 @@ class _HistogramWidget(QWidget):
             edges      = np.linspace(v_min, v_max, BINS + 1)
 
         # Pourcentage de pixels "éteints" (Laser OFF)
-        count_off_pct = (data_off.size / total) * 100.0
+        count_off_pct = (n_off / total) * 100.0
         
         # Le y_max est maintenant le pourcentage le plus élevé trouvé (max 100)
         y_max = max(counts_pct.max() if counts_pct.size else 0, count_off_pct, 1.0)
@@ -632,7 +647,9 @@ class RasterViewQt(QWidget):
         self.t_stats = TRANSLATIONS[lang]["stats"]
         self.t_orig  = TRANSLATIONS[lang]["origin_options"]
 
-        self.engine   = GCodeEngine()
+        self._engine_backend = controller.config_manager.get_item(
+            "machine_settings", "engine_backend", None)
+        self.engine   = create_engine(self._engine_backend)
         self._loading = True
 
         self.input_image_path = ""
@@ -665,8 +682,6 @@ class RasterViewQt(QWidget):
         self._last_matrix        = None
         self._last_geom          = None
         self.estimated_file_size = "N/A"
-        self._source_img_cache   = None
-        self._source_img_path    = ""
 
         self._build_ui()
         self._loading = False
@@ -933,6 +948,20 @@ class RasterViewQt(QWidget):
         self._add_slider_input(lo, "feedrate", 500, 20000, 3000, "feedrate", is_int=True)
         self._add_slider_input(lo, "overscan",    0,   50,    10.0, "premove")
 
+        # Lignes vides sautées, lignes rognées à leur zone de gravure
+        trim_row = QHBoxLayout()
+        lbl_trim = QLabel(self.t.get("trim_rows", "trim_rows"))
+        lbl_trim.setStyleSheet("color:#ddd;font-size:12px;")
+        self.translation_map[lbl_trim] = "trim_rows"
+        self.sw_trim = Switch()
+        self.sw_trim.toggled.connect(self._on_switch_with_delay)
+        trim_row.addWidget(lbl_trim)
+        trim_row.addStretch()
+        trim_row.addWidget(self.sw_trim)
+        lo.addLayout(trim_row)
+        # Blancs internes plus longs que ce seuil franchis en G0 (0 = off)
+        self._add_slider_input(lo, "gap_hop", 0, 100, 0.0, "gap_hop")
+
         pow_row = QHBoxLayout()
         left_p = QVBoxLayout()
         self._add_simple_input(left_p, "max_power", 40.0, "max_p")
@@ -947,6 +976,13 @@ class RasterViewQt(QWidget):
 
         self._add_slider_input(lo, "laser_latency", -20, 20, 0, "laser_latency")
         self._add_slider_input(lo, "gray_steps", 2, 256, 256, "gray_steps", is_int=True)
+        # Niveaux uniformes ou adaptés à l'histogramme de l'image
+        quant_opts = [(k, self.t.get("quant_" + k, k)) for k in ("uniform", "cluster")]
+        self._add_combo(lo, "quant_mode", quant_opts, "quant_mode")
+        # Filtre des micro-segments : écart de puissance ignoré (même unité
+        # que min/max power) et durée minimale d'un palier (mm), 0 = off
+        self._add_slider_input(lo, "power_deadband", 0, 20, 0.0, "power_deadband")
+        self._add_slider_input(lo, "min_run", 0, 5, 0.0, "min_run")
 
     def _setup_tab_gcode(self):
         lo = self._tab_gcode._inner
@@ -1171,7 +1207,7 @@ class RasterViewQt(QWidget):
         stats_text_lo.setContentsMargins(8, 6, 8, 6)
         stats_text_lo.setAlignment(Qt.AlignmentFlag.AlignVCenter)
         self.stats_labels = []
-        for _ in range(6):
+        for _ in range(8):
             lbl = QLabel("")
             lbl.setFont(QFont("Consolas", 10))
             lbl.setStyleSheet("color:#aaaaaa;font-family:Consolas;font-size:12px;"
@@ -1597,7 +1633,8 @@ class RasterViewQt(QWidget):
             except Exception: pass
             self._rect_overscan = None
 
-        self._update_image_artist(matrix, offX, offY, real_w, real_h, v_min, v_max)
+        self._update_image_artist(matrix, offX, offY, real_w, real_h, v_min, v_max,
+                                  geom.get("power_levels"))
 
         # Colorbar Qt fixe
         self._cbar_widget.setVisible(True)
@@ -1695,18 +1732,34 @@ class RasterViewQt(QWidget):
         ts = int(est_min * 60)
         hh, mm, ss = ts // 3600, (ts % 3600) // 60, ts % 60
         self._update_stats(geom["w_px"], geom["h_px"], real_w, real_h,
-                           geom["scan_step"], geom["l_step"], hh, mm, ss)
+                           geom["scan_step"], geom["l_step"], hh, mm, ss,
+                           geom.get("block_rate_rows", 0))
 
         self._hist_widget.update_data(
-            matrix, v_min, v_max,
+            self._preview_matrix(matrix), v_min, v_max,
             label_title=self.t_stats.get("power_distribution", "Power Distribution"),
             label_power=self.t_stats.get("power_value", "Power"),
             label_count=self.t_stats.get("pixel_count", "Pixel count"),
+            levels=geom.get("power_levels"),
         )
 
         self._canvas.redraw(fit=fit)
 
-    def _update_image_artist(self, matrix, offX, offY, real_w, real_h, v_min, v_max):
+    @staticmethod
+    def _preview_matrix(matrix, max_px=4_000_000):
+        """
+        Sous-échantillonne (vue, sans copie) les très grandes matrices avant
+        affichage : matplotlib copie l'image entière, inutile au-delà de la
+        résolution écran et coûteux pour une matrice hors-mémoire (np.memmap).
+        """
+        h, w = matrix.shape
+        k = int(math.ceil(math.sqrt((w * h) / max_px))) if w * h > max_px else 1
+        return matrix[::k, ::k] if k > 1 else matrix
+
+    def _update_image_artist(self, matrix, offX, offY, real_w, real_h, v_min, v_max,
+                             levels=None):
+        # Indices → puissances sur l'aperçu seulement (≤ 4 MP)
+        matrix = self.engine.power_matrix(self._preview_matrix(matrix), levels)
         if self._placeholder_text is not None:
             try: self._placeholder_text.remove()
             except Exception: pass
@@ -1728,7 +1781,7 @@ class RasterViewQt(QWidget):
             self._img_plot.set_visible(True)
 
     def _update_stats(self, w_px, h_px, real_w, real_h,
-                      scan_step, line_step, hh, mm, ss):
+                      scan_step, line_step, hh, mm, ss, rate_rows=0):
         ts = self.t_stats
         lines = [
             f"{ts.get('real_dims','REAL DIMS'):<18}: {real_w:.2f} x {real_h:.2f} mm",
@@ -1737,6 +1790,9 @@ class RasterViewQt(QWidget):
             f"{ts.get('matrix_size','MATRIX'):<18}: {w_px} x {h_px} px",
             f"{ts.get('scan_step','SCAN STEP'):<18}: {scan_step:.4f} mm",
             f"{ts.get('line_step','LINE STEP'):<18}: {line_step:.4f} mm",
+            f"{ts.get('engine','ENGINE'):<18}: {self.engine.BACKEND}",
+            f"{ts.get('block_rate','BLOCK RATE'):<18}: "
+            f"{rate_rows} {ts.get('rows_merged', 'rows merged')}",
         ]
         for lbl, txt in zip(self.stats_labels, lines):
             lbl.setText(txt)
@@ -1759,6 +1815,9 @@ class RasterViewQt(QWidget):
                 "max_p":        self._get_val("max_p"),
                 "dpi":          self._get_val("dpi"),
                 "gray_steps":   self._get_val("gray_steps"),
+                "quant_mode":   self.controls["quant_mode"]["combo"].currentData() or "uniform",
+                "power_deadband": self._get_val("power_deadband"),
+                "min_run":      self._get_val("min_run"),
                 "premove":      self._get_val("premove"),
                 "feedrate":     self._get_val("feedrate"),
                 "speed":        self._get_val("feedrate"),
@@ -1766,6 +1825,12 @@ class RasterViewQt(QWidget):
                 "ui_dimension": ui_dim,
                 "raster_mode":  raster_mode,
                 "force_dim":    self.sw_force_width.isChecked(),
+                "trim_rows":    self.sw_trim.isChecked(),
+                "gap_hop":      self._get_val("gap_hop"),
+                "rapid_feedrate": self._machine_rapid(),
+                "acceleration": self._machine_accel(),
+                "max_block_rate": self._machine_block_rate(),
+                "gcode_job":    self._gcode_job(),
             }
             if settings["force_dim"]:
                 if raster_mode == "horizontal":
@@ -1773,13 +1838,9 @@ class RasterViewQt(QWidget):
                 else:
                     settings["height"] = ui_dim
 
-            current_cache = None
-            if self._source_img_path == self.input_image_path:
-                current_cache = self._source_img_cache
-
+            # Image source : cache LRU du moteur (chemin, mtime, taille)
             results = self.engine.process_image_logic(
-                self.input_image_path, settings,
-                source_img_cache=current_cache
+                self.input_image_path, settings
             )
             matrix, img_obj, geom, mem_warn = results
 
@@ -1794,8 +1855,6 @@ class RasterViewQt(QWidget):
                 geom["machine_step_x"] = geom.get("x_step", 0.1)
                 geom["machine_step_y"] = geom.get("y_step", 0.1)
 
-            self._source_img_cache   = img_obj
-            self._source_img_path    = self.input_image_path
             self._last_matrix        = matrix
             self._last_geom          = geom
             self.estimated_file_size = geom.get("file_size_str", "N/A")
@@ -1805,6 +1864,109 @@ class RasterViewQt(QWidget):
             import traceback; traceback.print_exc()
             return None, None
 
+    def _machine_accel(self):
+        """Accélération machine (mm/s²) pour l'estimation de durée, 0 si invalide."""
+        raw = self.controller.config_manager.get_item("machine_settings", "acceleration", 500.0)
+        try:
+            return max(0.0, float(raw))
+        except (ValueError, TypeError):
+            return 0.0
+
+    def _machine_block_rate(self):
+        """Débit de blocs maximal du contrôleur (blocs/s), 0 = illimité."""
+        raw = self.controller.config_manager.get_item("machine_settings", "max_block_rate", 0.0)
+        try:
+            return max(0.0, float(raw))
+        except (ValueError, TypeError):
+            return 0.0
+
+    def _machine_rapid(self):
+        """Vitesse des déplacements G0 (mm/min) pour décider des sauts rapides."""
+        raw = self.controller.config_manager.get_item("machine_settings", "rapid_feedrate", 6000.0)
+        try:
+            return max(1.0, float(raw))
+        except (ValueError, TypeError):
+            return 6000.0
+
+    def _gcode_job(self):
+        """
+        Paramètres de génération (params, framing, text_blocks, metadata)
+        communs au payload de simulation et à la prédiction de taille.
+        """
+        raster_mode  = self._raster_mode
+        cmd_mode_val = self.controls["cmd_mode"]["combo"].currentText() \
+            if "cmd_mode" in self.controls else "M67 (Analog)"
+        firing_val   = self.controls["firing_mode"]["combo"].currentText() \
+            if "firing_mode" in self.controls else "M3/M5"
+        origin_val   = (self.controls["origin_mode"]["combo"].currentData()
+                        or self.controls["origin_mode"]["combo"].currentText()) \
+            if "origin_mode" in self.controls else "Lower-Left"
+
+        ratio_raw = "20%"
+        if "frame_feed_ratio_menu" in self.controls:
+            ratio_raw = self.controls["frame_feed_ratio_menu"]["combo"].currentText()
+
+        global_h = self.controller.config_manager.get_item("machine_settings", "custom_header", "").strip()
+        global_f = self.controller.config_manager.get_item("machine_settings", "custom_footer", "").strip()
+        raster_h = self.txt_header.toPlainText().strip()
+        raster_f = self.txt_footer.toPlainText().strip()
+        full_header = f"{global_h}\n{raster_h}".strip() if global_h and raster_h else (global_h or raster_h)
+        full_footer = f"{raster_f}\n{global_f}".strip() if global_f and raster_f else (global_f or raster_f)
+
+        file_ext  = self.controller.config_manager.get_item("machine_settings", "gcode_extension", ".nc")
+        file_name = (os.path.splitext(os.path.basename(self.input_image_path))[0]
+                     if self.input_image_path else "export")
+
+        return {
+            "params": {
+                "e_num":       int(self._get_val("m67_e_num")),
+                "use_s_mode":  "S (Spindle)" in cmd_mode_val,
+                "ctrl_max":    self._get_val("ctrl_max"),
+                "min_power":   self._get_val("min_p"),
+                "max_power":   self._get_val("max_p"),
+                "premove":     self._get_val("premove"),
+                "feedrate":    self._get_val("feedrate"),
+                "laser_latency":   self._get_val("laser_latency"),
+                "acceleration":    self._machine_accel(),
+                "gen_workers":     self.controller.config_manager.get_item(
+                    "machine_settings", "gen_workers", 0),
+                "gray_scales": int(self._get_val("gray_steps")),
+                "gray_steps":  int(self._get_val("gray_steps")),
+                "raster_mode": raster_mode,
+                "trim_rows":   self.sw_trim.isChecked(),
+                "gap_hop":     self._get_val("gap_hop"),
+                "rapid_feedrate":  self._machine_rapid(),
+                "compact_gcode":   bool(self.controller.config_manager.get_item(
+                    "machine_settings", "compact_gcode", False)),
+                "incremental_gcode": bool(self.controller.config_manager.get_item(
+                    "machine_settings", "incremental_gcode", False)),
+            },
+            "framing": {
+                "is_pointing":   self.sw_pointer.isChecked(),
+                "is_framing":    self.sw_frame.isChecked(),
+                "f_pwr":         self.frame_power_entry.text(),
+                "f_ratio":       ratio_raw.replace("%", ""),
+                "f_pause":       self.pause_cmd_entry.text().strip() or None,
+                "use_s_mode":    "S (Spindle)" in cmd_mode_val,
+                "e_num":         int(self._get_val("m67_e_num")),
+                "base_feedrate": self._get_val("feedrate"),
+            },
+            "text_blocks": {"header": full_header, "footer": full_footer},
+            "metadata": {
+                "version":          self.version,
+                "mode":             cmd_mode_val.split(" ")[0],
+                "firing_cmd":       firing_val.split("/")[0],
+                "file_extension":   file_ext,
+                "file_name":        file_name,
+                "output_dir":       self.output_dir,
+                "origin_mode":      origin_val,
+                "raster_direction": raster_mode,
+            },
+            "origin": (origin_val,
+                       self._get_val("custom_x") or 0.0,
+                       self._get_val("custom_y") or 0.0),
+        }
+
     def calculate_offsets(self, real_w, real_h):
         origin_ctrl = self.controls.get("origin_mode")
         origin_key  = "Lower-Left"
@@ -1823,19 +1985,30 @@ class RasterViewQt(QWidget):
         w_px = geom.get("w_px", 0)
         h_px = geom.get("h_px", 0)
         total = w_px * h_px
-        rescaled = total < (self._get_val("width") / (25.4 / max(1, self._get_val("dpi"))))
+        plan  = geom.get("mem_plan", {})
+        peak_mb = plan.get("peak_bytes", 0) / (1024 * 1024)
 
-        if total > 10_000_000:
+        if plan.get("rescaled"):
             dpi_now = int(self._get_val("dpi"))
             dpi_sug = max(10, int(dpi_now * 0.7))
             tpl = self.t.get("mem_warn_hard",
                 "⚠ Matrix too large ({total:.1f}M px) — image was rescaled."
                 "\nTry reducing DPI (e.g. {dpi_sug} instead of {dpi_now}).")
-            msg = tpl.format(total=total/1_000_000, dpi_sug=dpi_sug, dpi_now=dpi_now)
+            msg = tpl.format(total=plan.get("requested_px", total)/1_000_000,
+                             dpi_sug=dpi_sug, dpi_now=dpi_now)
             self._mem_warn_label.setStyleSheet(
                 "color: #e74c3c; font-size: 11px; background: transparent; border: none;")
             self._mem_warn_label.setText(msg)
             self._mem_warn_label.setVisible(True)
+        elif plan.get("mode") == "out_of_core":
+            tpl = self.t.get("mem_warn_ooc",
+                "⚠ Very large matrix ({total:.1f}M px) — processed out-of-core"
+                " (disk-backed).\nPredicted peak memory: {peak:.0f} MB.")
+            msg = tpl.format(total=total/1_000_000, peak=peak_mb)
+            self._mem_warn_label.setStyleSheet(
+                "color: #FF9500; font-size: 11px; background: transparent; border: none;")
+            self._mem_warn_label.setText(msg)
+            self._mem_warn_label.setVisible(True)
         elif mem_warn:
             dpi_now = int(self._get_val("dpi"))
             dpi_sug = max(10, int(dpi_now * 0.7))
@@ -1921,72 +2094,21 @@ class RasterViewQt(QWidget):
         real_h  = geom["real_h"]
         offX, offY = self.calculate_offsets(real_w, real_h)
 
-        raster_mode  = self._raster_mode
-        cmd_mode_val = self.controls["cmd_mode"]["combo"].currentText() \
-            if "cmd_mode" in self.controls else "M67 (Analog)"
-        firing_val   = self.controls["firing_mode"]["combo"].currentText() \
-            if "firing_mode" in self.controls else "M3/M5"
-        origin_val   = (self.controls["origin_mode"]["combo"].currentData()
-                        or self.controls["origin_mode"]["combo"].currentText()) \
-            if "origin_mode" in self.controls else "Lower-Left"
-
-        ratio_raw = "20%"
-        if "frame_feed_ratio_menu" in self.controls:
-            ratio_raw = self.controls["frame_feed_ratio_menu"]["combo"].currentText()
-
-        global_h = self.controller.config_manager.get_item("machine_settings", "custom_header", "").strip()
-        global_f = self.controller.config_manager.get_item("machine_settings", "custom_footer", "").strip()
-        raster_h = self.txt_header.toPlainText().strip()
-        raster_f = self.txt_footer.toPlainText().strip()
-        full_header = f"{global_h}\n{raster_h}".strip() if global_h and raster_h else (global_h or raster_h)
-        full_footer = f"{raster_f}\n{global_f}".strip() if global_f and raster_f else (global_f or raster_f)
-
-        file_ext  = self.controller.config_manager.get_item("machine_settings", "gcode_extension", ".nc")
-        file_name = (os.path.splitext(os.path.basename(self.input_image_path))[0]
-                     if self.input_image_path else "export")
-
+        job = self._gcode_job()
         payload = {
             "matrix": matrix,
+            "levels": geom.get("power_levels"),
             "dims":   (geom["h_px"], geom["w_px"], geom["y_step"], geom["x_step"]),
             "estimated_size": self.estimated_file_size,
             "offsets": (offX, offY),
-            "params": {
-                "e_num":       int(self._get_val("m67_e_num")),
-                "use_s_mode":  "S (Spindle)" in cmd_mode_val,
-                "ctrl_max":    self._get_val("ctrl_max"),
-                "min_power":   self._get_val("min_p"),
-                "max_power":   self._get_val("max_p"),
-                "premove":     self._get_val("premove"),
-                "feedrate":    self._get_val("feedrate"),
-                "laser_latency":   self._get_val("laser_latency"),
-                "gray_scales": int(self._get_val("gray_steps")),
-                "gray_steps":  int(self._get_val("gray_steps")),
-                "raster_mode": raster_mode,
-            },
-            "framing": {
-                "is_pointing":   self.sw_pointer.isChecked(),
-                "is_framing":    self.sw_frame.isChecked(),
-                "f_pwr":         self.frame_power_entry.text(),
-                "f_ratio":       ratio_raw.replace("%", ""),
-                "f_pause":       self.pause_cmd_entry.text().strip() or None,
-                "use_s_mode":    "S (Spindle)" in cmd_mode_val,
-                "e_num":         int(self._get_val("m67_e_num")),
-                "base_feedrate": self._get_val("feedrate"),
-            },
-            "text_blocks": {"header": full_header, "footer": full_footer},
-            "metadata": {
-                "version":          self.version,
-                "mode":             cmd_mode_val.split(" ")[0],
-                "firing_cmd":       firing_val.split("/")[0],
-                "file_extension":   file_ext,
-                "file_name":        file_name,
-                "output_dir":       self.output_dir,
-                "origin_mode":      origin_val,
+            "params":      job["params"],
+            "framing":     job["framing"],
+            "text_blocks": job["text_blocks"],
+            "metadata": dict(job["metadata"], **{
                 "real_w":           real_w,
                 "real_h":           real_h,
                 "est_sec":          int(geom.get("est_min", 0) * 60),
-                "raster_direction": raster_mode,
-            }
+            }),
         }
 
         self.controller.show_simulation(self.engine, payload, return_view="raster")
@@ -2074,6 +2196,12 @@ class RasterViewQt(QWidget):
         machine_data = self.controller.config_manager.get_section("machine_settings") or {}
         raster_data  = self.controller.config_manager.get_section("raster_settings")  or {}
 
+        # Backend moteur changé dans les réglages : nouveau moteur (caches vides)
+        backend = machine_data.get("engine_backend")
+        if backend != self._engine_backend:
+            self._engine_backend = backend
+            self.engine = create_engine(backend)
+
         self._loading = True
         self._apply_settings(machine_data, is_machine=True)
         self._apply_settings(raster_data)
@@ -2116,6 +2244,7 @@ class RasterViewQt(QWidget):
         data["include_pointer"] = self.sw_pointer.isChecked()
         data["force_width"]     = self.sw_force_width.isChecked()
         data["invert_relief"]   = self.sw_invert.isChecked()
+        data["trim_rows"]       = self.sw_trim.isChecked()
         data["frame_power"]     = self.frame_power_entry.text()
         data["custom_pause_cmd"]= self.pause_cmd_entry.text()
         data["raster_mode"]     = self._raster_mode
@@ -2151,6 +2280,7 @@ class RasterViewQt(QWidget):
             "include_frame":   self.sw_frame,
             "include_pointer": self.sw_pointer,
             "force_width":     self.sw_force_width,
+            "trim_rows":       self.sw_trim,
         }
         for key, sw in sw_map.items():
             if key in data:
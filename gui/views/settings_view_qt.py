@@ -192,11 +192,23 @@ class SettingsViewQt(QWidget):
         # Extension de fichier
         self.create_simple_input(sec_gcode, "label_extension", "gcode_extension")
 
+        # Moteur de génération (registre engine.ENGINE_BACKENDS)
+        from engine import ENGINE_BACKENDS
+        self.create_dropdown(sec_gcode, "label_engine_backend",
+                             list(ENGINE_BACKENDS), "engine_backend")
+
+        # Compaction modale du G-Code raster (mots répétés omis, G91 optionnel)
+        self.create_switch(sec_gcode, "compact_gcode", "compact_gcode")
+        self.create_switch(sec_gcode, "incremental_gcode", "incremental_gcode")
+
         # --- SECTION HARDWARE ---
         sec_hw = self.create_section(self.left_col, "sec_hardware")
         # Sliders
         self.create_slider_input(sec_hw, "label_latency", -20, 20, 0, "laser_latency")
         self.create_slider_input(sec_hw, "label_overscan", 0, 50, 10, "premove")
+        self.create_simple_input(sec_hw, "label_acceleration", "acceleration", precision=0)
+        self.create_simple_input(sec_hw, "label_rapid_feedrate", "rapid_feedrate", precision=0)
+        self.create_simple_input(sec_hw, "label_max_block_rate", "max_block_rate", precision=0)
         self.create_slider_input(sec_hw, "hor_linestep", 0.01, 0.5, 0.1, "hor_linestep", decimals=4)
         self.create_slider_input(sec_hw, "ver_linestep", 0.01, 0.5, 0.1, "ver_linestep", decimals=4)
 
@@ -382,15 +394,25 @@ class SettingsViewQt(QWidget):
                 "m67_e_num": int(float(self.controls["m67_e_num"]["entry"].text() or "0")),
                 "ctrl_max":  int(float(self.controls["ctrl_max"]["entry"].text()  or "0")),
                 "gcode_extension": self.controls["gcode_extension"]["entry"].text(),
+                "engine_backend": self.controls["engine_backend"]["combo"].currentText(),
+                "compact_gcode": self.controls["compact_gcode"]["check"].isChecked(),
+                "incremental_gcode": self.controls["incremental_gcode"]["check"].isChecked(),
                 "laser_latency": get_float("laser_latency"),
                 "premove": get_float("premove"),
+                "acceleration": get_float("acceleration"),
+                "rapid_feedrate": get_float("rapid_feedrate"),
+                "max_block_rate": get_float("max_block_rate"),
                 "hor_linestep": get_float("hor_linestep"),
                 "ver_linestep": get_float("ver_linestep"),
                 "custom_header": self.controls["custom_header"]["text"].toPlainText(),
                 "custom_footer": self.controls["custom_footer"]["text"].toPlainText()
             }
 
-            self.controller.set_section("machine_settings", new_settings)
+            # Les clés sans contrôle dans cette vue (gen_workers, jit_cache_dir…)
+            # sont conservées
+            merged = dict(self.controller.get_section("machine_settings") or {})
+            merged.update(new_settings)
+            self.controller.set_section("machine_settings", merged)
             
             if self.controller.save():
                 from core.translations import TRANSLATIONS
@@ -603,7 +625,7 @@ class SettingsViewQt(QWidget):
         # --- LOGIQUE SÉCURISÉE ---
         
         # 1. ComboBox
-        for key in ["theme", "language", "cmd_mode", "firing_mode"]:
+        for key in ["theme", "language", "cmd_mode", "firing_mode", "engine_backend"]:
             if key in self.controls:
                 val = data.get(key, "") # Si None, on prend une chaîne vide
                 index = self.controls[key]["combo"].findText(str(val))
@@ -622,6 +644,24 @@ class SettingsViewQt(QWidget):
         for key in ["gcode_extension"]:
             if key in self.controls:
                 self.controls[key]["entry"].setText(str(data.get(key, "")))
+        if "acceleration" in self.controls:
+            try:
+                val = float(data.get("acceleration", 500.0))
+            except (ValueError, TypeError):
+                val = 500.0
+            self.controls["acceleration"]["entry"].setText(f"{val:.0f}")
+        if "rapid_feedrate" in self.controls:
+            try:
+                val = float(data.get("rapid_feedrate", 6000.0))
+            except (ValueError, TypeError):
+                val = 6000.0
+            self.controls["rapid_feedrate"]["entry"].setText(f"{val:.0f}")
+        if "max_block_rate" in self.controls:
+            try:
+                val = float(data.get("max_block_rate", 0.0))
+            except (ValueError, TypeError):
+                val = 0.0
+            self.controls["max_block_rate"]["entry"].setText(f"{val:.0f}")
 
         # 3. Sliders 
         for key in ["laser_latency", "premove"]:
@@ -649,6 +689,9 @@ class SettingsViewQt(QWidget):
             self.controls["custom_footer"]["text"].setPlainText(data.get("custom_footer", ""))
         if "enable_thumbnails" in self.controls:
             self.controls["enable_thumbnails"]["check"].setChecked(bool(data.get("enable_thumbnails", True)))
+        for key in ["compact_gcode", "incremental_gcode"]:
+            if key in self.controls:
+                self.controls[key]["check"].setChecked(bool(data.get(key, False)))
 
         self.loading = False
         self.set_button_style("idle")
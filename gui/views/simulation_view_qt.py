@@ -43,6 +43,11 @@ from gui.switch import Switch
 #  WORKER : génération G-Code hors thread UI
 # ══════════════════════════════════════════════════════════════════════════════
 
+# Texte G-Code gardé pour l'aperçu (QPlainTextEdit) : au-delà, seules les
+# premières lignes sont affichées ; l'export relit la matrice en flux
+_VIEW_MAX_CHARS = 16 * 1024 * 1024
+
+
 class _GenWorker(QThread):
     done  = pyqtSignal(dict)
     error = pyqtSignal(str)
@@ -77,21 +82,40 @@ class _GenWorker(QThread):
                 'scan_axis':    'X' if raster_mode == 'horizontal' else 'Y',
             })
 
-            # C — G-Code final
-            final_gcode, latence_mm = self.engine.build_final_gcode(
-                self.payload['matrix'],
-                self.payload['dims'],
-                self.payload['offsets'],
-                p,
-                self.payload['text_blocks'],
-                meta,
-            )
-            latence_mm = float(latence_mm)
+            # C — G-Code final en flux : la table de segments de chaque
+            #     morceau est lue aussitôt (pas de re-parsing du texte), seul
+            #     un aperçu borné du texte est conservé
+            latence_mm = float(self.engine.latency_mm(p))
+            segments = []
+            head, head_chars = [], 0
+
+            def parts():
+                nonlocal head_chars
+                for chunk in self.engine.iter_final_gcode(
+                        self.payload['matrix'],
+                        self.payload['dims'],
+                        self.payload['offsets'],
+                        p,
+                        self.payload['text_blocks'],
+                        meta,
+                        levels=self.payload.get('levels'),
+                        segments=segments):
+                    if head_chars <= _VIEW_MAX_CHARS:
+                        head.append(chunk)
+                        head_chars += len(chunk)
+                    yield from segments
+                    segments.clear()
 
             # D — Parsing
             f_pts, f_dur, f_lim = self.parser.parse(framing_gcode)
             framing_end = len(f_pts) if f_pts is not None else 0
-            pts, _, lim  = self.parser.parse(final_gcode)
+            pts, _, lim  = self.parser.parse_segments(parts())
+
+            final_gcode = ''.join(head)
+            truncated = len(final_gcode) > _VIEW_MAX_CHARS
+            if truncated:
+                final_gcode = final_gcode[:_VIEW_MAX_CHARS]
+                final_gcode = final_gcode[:final_gcode.rfind('\n') + 1]
 
             valid = [l for l in [f_lim, lim]
                      if l is not None and not all(abs(v) < 1e-9 for v in l)]
@@ -103,30 +127,31 @@ class _GenWorker(QThread):
             else:
                 bx0 = bx1 = by0 = by1 = 0.0
 
-            # E — Timestamps cumulés
+            # E — Timestamps cumulés (champ time, float64)
             dur = 0.0
             if pts is not None and len(pts) > 1:
-                deltas    = np.diff(pts[:, :2], axis=0)
-                distances = np.hypot(deltas[:, 0], deltas[:, 1])
-                rates     = pts[1:, 4] / 60.0
-                times     = np.divide(distances, rates,
-                                      out=np.zeros_like(distances),
-                                      where=rates > 0)
-                pts[0, 4]  = 0.0
-                pts[1:, 4] = np.cumsum(times)
+                GCodeParser.timestamps(pts)
 
+                # Durée théorique avec accélération (inversions de ligne) :
+                # estimation de la vue raster (rognage et sauts G0 compris),
+                # sinon passes pleine largeur
                 m      = self.payload.get('metadata', {})
-                dims   = self.payload.get('dims', (0, 0, 0, 0))
-                h_px, w_px = dims[0], dims[1]
-                if raster_mode == 'vertical':
-                    nb = float(w_px);  dist = float(m.get('real_h', 0))
+                if 'est_sec' in m:
+                    theo = float(m['est_sec'] or 0)
                 else:
-                    nb = float(h_px);  dist = float(m.get('real_w', 0))
-                feedrate = float(p.get('feedrate', 3000))
-                overscan = float(p.get('premove', 2.0))
-                lstep    = float(p.get('line_step', p.get('l_step', 0.1)))
-                theo     = (nb * (dist + 2*overscan) + (nb-1)*lstep) / (feedrate/60)
-                dur      = max(pts[-1, 4], theo)
+                    dims   = self.payload.get('dims', (0, 0, 0, 0))
+                    h_px, w_px, y_st, x_st = dims
+                    if raster_mode == 'vertical':
+                        nb = int(w_px);  dist = float(m.get('real_h', 0));  lstep = float(x_st)
+                    else:
+                        nb = int(h_px);  dist = float(m.get('real_w', 0));  lstep = float(y_st)
+                    feedrate = float(p.get('feedrate', 3000))
+                    overscan = float(p.get('premove', 2.0))
+                    accel    = float(p.get('acceleration', 0.0) or 0.0)
+                    theo     = self.engine.estimate_job_time(
+                        np.full(nb, dist + 2*overscan), np.full(max(0, nb-1), lstep),
+                        feedrate, accel)
+                dur      = max(float(pts['time'][-1]), theo)
 
             self.done.emit({
                 'pts':           pts,
@@ -137,6 +162,7 @@ class _GenWorker(QThread):
                 'est_size':      est_size_str,
                 'bounds':        (bx0, bx1, by0, by1),
                 'final_gcode':   final_gcode,
+                'truncated':     truncated,
                 'framing_gcode': framing_gcode,
             })
         except Exception as e:
@@ -144,6 +170,36 @@ class _GenWorker(QThread):
             self.error.emit(str(e))
 
 
+class _SaveWorker(QThread):
+    """Export : G-Code régénéré et écrit en flux (write_final_gcode) hors thread UI."""
+    done  = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, engine, payload, meta, path):
+        super().__init__()
+        self.engine  = engine
+        self.payload = payload
+        self.meta    = meta
+        self.path    = path
+
+    def run(self):
+        try:
+            n_lines = self.engine.write_final_gcode(
+                self.path,
+                self.payload['matrix'],
+                self.payload['dims'],
+                self.payload['offsets'],
+                self.payload['params'],
+                self.payload['text_blocks'],
+                self.meta,
+                levels=self.payload.get('levels'),
+            )
+            self.done.emit(n_lines)
+        except Exception as e:
+            import traceback; traceback.print_exc()
+            self.error.emit(str(e))
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  RENDERER  —  logique de rasterisation batch (100 % NumPy + une passe QPainter)
 # ══════════════════════════════════════════════════════════════════════════════
@@ -195,24 +251,22 @@ class _Renderer:
 
         safe_end = min(end, len(pts_arr) - 1)
 
-        p1 = pts_arr[start:safe_end].copy()
-        p2 = pts_arr[start+1:safe_end+1].copy()
+        p1 = pts_arr[start:safe_end]
+        p2 = pts_arr[start+1:safe_end+1]
         if len(p1) == 0:
             return None
 
         # ── filtre puissance
         laser_threshold = max(self.pwr_min, self.ctrl_max * 0.001)
-        mask = p2[:,2] > laser_threshold
+        mask = p2['power'] > laser_threshold
         if not mask.any():
             return None
 
-        p1 = p1[mask]
-        p2 = p2[mask]
-
-        x1 = p1[:,0].copy()
-        y1_mm = p1[:,1].copy()
-        x2 = p2[:,0].copy()
-        y2_mm = p2[:,1].copy()
+        x1 = p1['x'][mask]
+        y1_mm = p1['y'][mask]
+        x2 = p2['x'][mask]
+        y2_mm = p2['y'][mask]
+        pwr = p2['power'][mask]
 
         # ── correction latence
         if use_lat and lat_mm != 0:
@@ -258,7 +312,7 @@ class _Renderer:
 
         fx1=fx1[ok]; fy1=fy1[ok]
         fx2=fx2[ok]; fy2=fy2[ok]
-        pwr=p2[:,2][ok]
+        pwr=pwr[ok]
         y1_mm=y1_mm[ok]; y2_mm=y2_mm[ok]
 
         # ── filtre longueur
@@ -1230,7 +1284,13 @@ class SimulationViewQt(QWidget):
                 self.lbl_lat.setVisible(visible)
 
         if self.final_gcode:
-            self.gcode_view.setPlainText(self.final_gcode)
+            text = self.final_gcode
+            if d.get('truncated'):
+                # Aperçu limité aux premières lignes (gros programmes)
+                shown = text.count('\n')
+                text += self.t.get('preview_truncated',
+                                   '(… preview limited to the first {n} lines …)').format(n=shown)
+            self.gcode_view.setPlainText(text)
             self._update_gcode_font()
 
         # 1. Mise à jour du texte
@@ -1342,9 +1402,8 @@ class SimulationViewQt(QWidget):
         # ─────────────────────────────
         # Position initiale laser
         # ─────────────────────────────
-        p0 = self.points_list[0]
-        lx = x0 + (p0[0] - self._mnx) * sc
-        ly = y0 + ph - (p0[1] - self._mny) * sc
+        lx = x0 + (self.points_list['x'][0] - self._mnx) * sc
+        ly = y0 + ph - (self.points_list['y'][0] - self._mny) * sc
 
         # ─────────────────────────────
         # Setup canvas (AVEC l_step en dernier argument)
@@ -1403,7 +1462,7 @@ class SimulationViewQt(QWidget):
         # Avancement index via searchsorted
         # ───────────────────────────────
         idx = np.searchsorted(
-            pts[:, 4],
+            pts['time'],
             self.current_sim_time,
             side='right'
         ) - 1
@@ -1446,19 +1505,19 @@ class SimulationViewQt(QWidget):
         # ───────────────────────────────
         # Interpolation laser fluide
         # ───────────────────────────────
-        pc = pts[self.current_idx]
-        pn = pts[self.current_idx + 1]
+        i  = self.current_idx
+        xs, ys, ts = pts['x'], pts['y'], pts['time']
 
-        td = pn[4] - pc[4]
+        td = ts[i + 1] - ts[i]
 
         if td > 0:
-            r = (self.current_sim_time - pc[4]) / td
+            r = (self.current_sim_time - ts[i]) / td
             r = max(0.0, min(1.0, r))
         else:
             r = 0.0
 
-        lx_mm = pc[0] + (pn[0] - pc[0]) * r
-        ly_mm = pc[1] + (pn[1] - pc[1]) * r
+        lx_mm = xs[i] + (xs[i + 1] - xs[i]) * r
+        ly_mm = ys[i] + (ys[i + 1] - ys[i]) * r
 
         self.canvas.set_laser(*self._mm_to_screen(lx_mm, ly_mm))
 
@@ -1514,8 +1573,8 @@ class SimulationViewQt(QWidget):
 
         self.canvas.notify_dirty()
 
-        mx = float(self.points_list[target_idx][0])
-        my = float(self.points_list[target_idx][1])
+        mx = float(self.points_list['x'][target_idx])
+        my = float(self.points_list['y'][target_idx])
         self.canvas.set_laser(*self._mm_to_screen(mx, my))
 
     # ══════════════════════════════════════════════════════════════
@@ -1523,9 +1582,9 @@ class SimulationViewQt(QWidget):
     # ══════════════════════════════════════════════════════════════
 
     def toggle_pause(self):
-        if self.points_list is None or self.points_list.size == 0:
+        if self.points_list is None or len(self.points_list) == 0:
             return
-        if self.current_idx >= self.points_list.shape[0] - 1:   # fin atteinte → replay
+        if self.current_idx >= len(self.points_list) - 1:   # fin atteinte → replay
             self.rewind_sim(); self._start_play(); return
         if self.sim_running:
             self._stop_play()
@@ -1568,9 +1627,9 @@ class SimulationViewQt(QWidget):
         self.btn_play.setIcon(QIcon(self.play_pixmap))
         self.btn_play.setStyleSheet(self._gbtn('#27ae60', '#1e8449'))
         self._highlight_gcode(0)
-        if self.points_list is not None and self.points_list.size > 0:
+        if self.points_list is not None and len(self.points_list) > 0:
             lx, ly = self._mm_to_screen(
-                self.points_list[0][0], self.points_list[0][1])
+                self.points_list['x'][0], self.points_list['y'][0])
             self.canvas.set_laser(lx, ly)
 
     def skip_to_end(self):
@@ -1629,9 +1688,9 @@ class SimulationViewQt(QWidget):
         self.current_sim_time = ratio * self.total_sec
 
         # Recherche de l'index correspondant au temps dans les données NumPy
-        # (on suppose que self.points_list[:, 4] contient les timestamps cumulés)
+        # (on suppose que self.points_list['time'] contient les timestamps cumulés)
         idx = np.searchsorted(
-            self.points_list[:, 4],
+            self.points_list['time'],
             self.current_sim_time,
             side='right'
         ) - 1
@@ -1665,16 +1724,12 @@ class SimulationViewQt(QWidget):
         if self.points_list is None or len(self.points_list) == 0:
             return
         pts = self.points_list
-        # pts[:,3] contient le numéro de ligne G-Code
-        matches = np.where(pts[:, 3].astype(int) >= line_num)[0]
-        if len(matches) == 0:
-            idx = len(pts) - 1
-        else:
-            idx = int(matches[0])
+        # pts['line'] : numéros de ligne G-Code (entiers, croissants)
+        idx = min(int(np.searchsorted(pts['line'], line_num)), len(pts) - 1)
         was_running = self.sim_running
         self._stop_play()
         self.current_idx      = idx
-        self.current_sim_time = float(pts[idx][4])
+        self.current_sim_time = float(pts['time'][idx])
         self._redraw_to(idx)
         self._update_ui(idx)
         if was_running:
@@ -1721,7 +1776,7 @@ class SimulationViewQt(QWidget):
     def _update_ui(self, idx):
         if self.points_list is None or idx >= len(self.points_list): return
         
-        ts  = float(self.points_list[idx][4])
+        ts  = float(self.points_list['time'][idx])
         
         # On base le rendu visuel sur l'écoulement du TEMPS, pas sur l'index des points
         pct = ts / max(0.001, self.total_sec) 
@@ -1735,7 +1790,7 @@ class SimulationViewQt(QWidget):
     def _highlight_gcode(self, idx):
         if self.points_list is None or idx >= len(self.points_list): return
         try:
-            line_num = int(self.points_list[idx][3])
+            line_num = int(self.points_list['line'][idx])
             block    = self.gcode_view.document().findBlockByLineNumber(line_num-1)
             if block.isValid():
                 cur = self.gcode_view.textCursor()
@@ -1834,28 +1889,45 @@ class SimulationViewQt(QWidget):
                              self.t.get('no_gcode', 'No G-Code to save.'))
                 return
 
-            with open(path, 'w') as f:
-                f.write(self.final_gcode)
+            if getattr(self, '_save_worker', None) is not None and self._save_worker.isRunning():
+                return
+
+            # Écriture en flux depuis la matrice dans un thread : le fichier
+            # n'est jamais assemblé en mémoire (mêmes octets que l'aperçu)
+            self._show_loading()
+            self._save_worker = _SaveWorker(self.engine, self.payload,
+                                            self.full_metadata, path)
+            self._save_worker.done.connect(lambda n: self._on_saved(path, n))
+            self._save_worker.error.connect(self._on_save_error)
+            self._save_worker.start()
 
+        except Exception as e:
+            self._on_save_error(str(e))
+
+    def _on_saved(self, path, n_lines):
+        self._hide_loading()
+        try:
             matrix = self.payload.get('matrix')
             if matrix is not None:
-                from core.utils import save_dashboard_data
                 estimated_time = getattr(self, 'total_sec', 0)
                 save_dashboard_data(
                     config_manager=self.controller.config_manager,
                     matrix=matrix,
-                    gcode_content=self.final_gcode,
-                    estimated_time=estimated_time
+                    estimated_time=estimated_time,
+                    levels=self.payload.get('levels'),
+                    line_count=n_lines,
                 )
-                print(estimated_time)
+        except Exception as e:
+            print(f"[ALIG] Statistiques non enregistrées : {e}")
 
-            self._msgbox(QMessageBox.Icon.Information, 'Success',
-                         f'{self.t.get("save_success", "G-Code saved successfully:")}\n{path}')
-            self._navigate_back()
+        self._msgbox(QMessageBox.Icon.Information, 'Success',
+                     f'{self.t.get("save_success", "G-Code saved successfully:")}\n{path}')
+        self._navigate_back()
 
-        except Exception as e:
-            self._msgbox(QMessageBox.Icon.Critical, 'Error',
-                         f'{self.t.get("save_failed", "Save failed:")}\n{str(e)}')
+    def _on_save_error(self, msg):
+        self._hide_loading()
+        self._msgbox(QMessageBox.Icon.Critical, 'Error',
+                     f'{self.t.get("save_failed", "Save failed:")}\n{msg}')
 
     # ══════════════════════════════════════════════════════════════
     #  NAVIGATION / FERMETURE
@@ -1874,6 +1946,9 @@ class SimulationViewQt(QWidget):
         self._anim_timer.stop()
         if hasattr(self, '_worker') and self._worker.isRunning():
             self._worker.quit(); self._worker.wait(500)
+        # Export en cours : fichier terminé avant de quitter la vue
+        if getattr(self, '_save_worker', None) is not None and self._save_worker.isRunning():
+            self._save_worker.wait()
 
     def closeEvent(self, e):
         self._stop_all(); super().closeEvent(e)
@@ -9,6 +9,8 @@ License: MIT
 
 import sys
 import os
+import multiprocessing
+import threading
 import traceback
 
 # Force XWayland sous Linux/Wayland pour obtenir la décoration native Qt
@@ -26,6 +28,7 @@ from PyQt6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve
 from PyQt6.QtGui import QPalette, QColor
 
 from core.config_manager import ConfigManager
+from engine import configure_jit_cache, warm_up_engine
 from utils.gui_utils import setup_app_id
 from gui.main_window_qt import MainWindowQt
 
@@ -71,6 +74,19 @@ def main():
         config_path = os.path.join(base_dir, "alig_config.json")
         config_manager = ConfigManager(config_path)
 
+        # Cache JIT persistant à côté de alig_config.json (le dossier _MEIPASS
+        # de l'exécutable figé est temporaire), puis compilation des noyaux
+        # en tâche de fond pendant le démarrage de l'interface
+        jit_dir = (config_manager.get_item("machine_settings", "jit_cache_dir", "")
+                   or os.path.join(base_dir, "jit_cache"))
+        try:
+            configure_jit_cache(jit_dir)
+        except OSError as e:
+            print(f"[ALIG] Cache JIT indisponible ({jit_dir}) : {e}")
+        backend = config_manager.get_item("machine_settings", "engine_backend", None)
+        threading.Thread(target=warm_up_engine, args=(backend,),
+                         name="jit-warmup", daemon=True).start()
+
         app = QApplication(sys.argv)
 
         # Détection APRÈS création de QApplication — platformName() est alors fiable.
@@ -126,4 +142,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Requis pour les workers de génération (spawn) dans l'exécutable figé
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les tests importent les paquets du dépôt (engine, core) depuis la racine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
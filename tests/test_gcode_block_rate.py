@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from engine.gcode_engine import GCodeEngine
+from engine.gcode_engine_numba import GCodeEngine as NumbaGCodeEngine
+
+LEVELS = np.linspace(0, 80, 8).astype(np.float32)
+FEED, STEP = 3000.0, 0.05
+
+
+def _matrix():
+    rng = np.random.default_rng(2)
+    m = rng.integers(1, 8, size=(60, 400)).astype(np.uint8)
+    m[:, 150:170] = 0           # blanc interne : jamais modifié
+    m[:10] = 4                  # lignes unies : dans le budget
+    m[10:20, ::7] = 2           # paliers courts réguliers
+    return m
+
+
+@pytest.mark.parametrize("engine_cls", [GCodeEngine, NumbaGCodeEngine], ids=["numpy", "numba"])
+@pytest.mark.parametrize("max_rate", [500.0, 100.0, 20.0])
+def test_block_rate_rows_within_budget(engine_cls, max_rate):
+    engine = engine_cls()
+    m = _matrix()
+    demand = engine._block_demand(m, LEVELS, STEP, FEED)
+    out, n_rows = engine._limit_block_rate(m.copy(), LEVELS, "horizontal",
+                                           max_rate, FEED, STEP)
+    over = demand > max_rate
+    assert n_rows == over.sum() > 0
+    assert np.array_equal(out[~over], m[~over])
+    assert np.array_equal(out == 0, m == 0)
+
+    # Plus petite durée minimale de palier qui passe sous le budget
+    # (recherche linéaire), sinon la durée d'un bloc au débit maximal
+    px_max = max(2, int(np.ceil(FEED / 60.0 / max_rate / STEP - 1e-9)))
+    rows = m[over]
+    ref = engine._run_filter(rows, LEVELS, 0.0, px_max)
+    todo = np.arange(len(rows))
+    for min_px in range(2, px_max):
+        sub = engine._run_filter(rows[todo], LEVELS, 0.0, min_px)
+        ok = engine._block_demand(sub, LEVELS, STEP, FEED) <= max_rate
+        ref[todo[ok]] = sub[ok]
+        todo = todo[~ok]
+    assert np.array_equal(out[over], ref)
+    after = engine._block_demand(out[over], LEVELS, STEP, FEED)
+    capped = engine._run_filter(rows, LEVELS, 0.0, px_max)
+    assert ((after <= max_rate) | (out[over] == capped).all(axis=1)).all()
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from engine.gcode_engine import GCodeEngine
+from engine.gcode_engine_numba import GCodeEngine as NumbaGCodeEngine
+
+LEVELS = np.array([0.0, 5.0, 12.5, 33.333, 80.0], dtype=np.float32)
+
+
+def _reference_gcode(matrix, h_px, w_px, l_step, x_st, offX, offY, gc):
+    """Émetteur ligne à ligne d'origine (formatage "%" par segment)."""
+    e_num, use_s_mode = gc["e_num"], gc["use_s_mode"]
+    pre, lat = gc["premove"], gc["offset_latence"]
+    horizontal = gc["raster_mode"] == "horizontal"
+    out = ["G1 F%s" % gc["feedrate"]]
+    if not use_s_mode:
+        out += ["M67 E%s Q0.00" % e_num, "G4 P0.1"]
+
+    def line(pos, p=None):
+        if not use_s_mode:
+            return ("M67 E%s Q0.00 G1 %s%.4f" % (e_num, axis, pos) if p is None
+                    else "M67 E%s Q%.3f G1 %s%.4f" % (e_num, p, axis, pos))
+        return ("G1 %s%.4f S0" % (axis, pos) if p is None
+                else "G1 %s%.4f S%.3f" % (axis, pos, p))
+
+    p_matrix = np.clip(matrix * gc["ratio"], 0.0, gc["ctrl_max"])
+    if horizontal:
+        outer, n, step_main, step_scan, axis = h_px, w_px, l_step, x_st, "X"
+    else:
+        outer, n, step_main, step_scan, axis = w_px, h_px, x_st, l_step, "Y"
+    real = (n - 1) * step_scan
+    pos_fwd = np.arange(1, n + 1) * step_scan
+    pos_rev = np.arange(n - 1, -1, -1) * step_scan
+    for o in range(outer):
+        fwd = o % 2 == 0
+        d = 1 if fwd else -1
+        corr = -lat * d
+        if horizontal:
+            main, row, off = o * step_main + offY, p_matrix[h_px - 1 - o], offX
+        else:
+            main, row, off = o * step_main + offX, p_matrix[::-1, o], offY
+        start = (0.0 if fwd else real) + off
+        end = (real if fwd else 0.0) + off
+        pre_start, pre_end = start - pre * d, end + pre * d
+        out.append("G1 X%.4f Y%.4f" % ((pre_start, main) if horizontal else (main, pre_start)))
+        cur = start + corr
+        if abs(cur - pre_start) > 0.0001:
+            out.append(line(cur))
+        vals = row if fwd else row[::-1]
+        targets = (pos_fwd if fwd else pos_rev) + off + corr
+        seg = np.flatnonzero(np.r_[True, np.abs(np.diff(vals)) > 0.001])
+        for i, s in enumerate(seg):
+            t = float(targets[seg[i + 1] - 1] if i + 1 < len(seg) else targets[-1])
+            if abs(t - cur) > 0.0001:
+                out.append(line(t, float(vals[s])))
+                cur = t
+        if abs(end + corr - cur) > 0.0001:
+            out.append(line(end + corr, float(vals[-1])))
+        cur = end + corr
+        for _ in range(int(abs(pre_end - cur) / (step_scan * 4))):
+            cur += step_scan * 4 * d
+            out.append(line(cur))
+        if abs(pre_end - cur) > 0.0001:
+            out.append(line(pre_end))
+    return "\n".join(out) + "\n"
+
+
+@pytest.mark.parametrize("engine_cls", [GCodeEngine, NumbaGCodeEngine], ids=["numpy", "numba"])
+@pytest.mark.parametrize("raster_mode", ["horizontal", "vertical"])
+@pytest.mark.parametrize("use_s_mode", [False, True])
+@pytest.mark.parametrize("latency", [0.0, 0.35])
+def test_token_emitter_matches_line_by_line_output(engine_cls, raster_mode,
+                                                   use_s_mode, latency):
+    rng = np.random.default_rng(4)
+    idx = rng.choice([0, 0, 1, 2, 3, 4], size=(37, 53)).astype(np.uint8)
+    idx[5] = 0
+    idx[9] = 3
+    h, w = idx.shape
+    engine = engine_cls()
+    gc = engine._gc_settings({
+        "e_num": 2, "use_s_mode": use_s_mode, "ctrl_max": 1000,
+        "laser_latency": latency, "feedrate": 2400.0, "premove": 1.7,
+        "raster_mode": raster_mode})
+    args = (h, w, 0.1, 0.07, 1.25, -3.5)
+    ref = _reference_gcode(LEVELS[idx], *args, gc)
+
+    assert engine.generate_gcode_list(idx, *args, dict(gc, levels=LEVELS)) == ref
+    assert engine.generate_gcode_list(LEVELS[idx], *args, gc) == ref
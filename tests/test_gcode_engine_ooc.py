@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from engine import gcode_engine
+from engine.gcode_engine import GCodeEngine
+
+
+def _no_shared_memory(*args, **kwargs):
+    raise AssertionError("copie de la matrice en mémoire partagée")
+
+
+def _no_serial(*args, **kwargs):
+    raise AssertionError("repli sur la génération séquentielle")
+
+
+def _no_parallel(*args, **kwargs):
+    raise AssertionError("génération parallèle")
+
+
+def _ooc_matrix(tmp_path, shape=(600, 60)):
+    rng = np.random.default_rng(0)
+    m = GCodeEngine._ooc_memmap(shape, np.uint8, str(tmp_path))
+    m[...] = rng.choice([0, 0, 3, 5, 7], size=shape)
+    return m
+
+
+def _gcode(matrix, workers):
+    h, w = matrix.shape
+    p = {"e_num": 0, "use_s_mode": False, "ctrl_max": 1000, "laser_latency": 0,
+         "feedrate": 3000.0, "premove": 2.0, "raster_mode": "horizontal",
+         "gen_workers": workers}
+    meta = {"version": "", "mode": "", "firing_cmd": "M3",
+            "framing_code": "", "gray_steps": 8}
+    text, _ = GCodeEngine().build_final_gcode(
+        matrix, (h, w, 0.1, 0.1), (0, 0), p, {"header": "", "footer": ""}, meta,
+        levels=np.linspace(0, 80, 8))
+    return text
+
+
+def test_share_ooc_matrix_by_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(gcode_engine.shared_memory, "SharedMemory", _no_shared_memory)
+    m = _ooc_matrix(tmp_path)
+    (kind, (filename, offset, dtype, shape)), shm = GCodeEngine._share_matrix(m)
+    assert kind == "file" and shm is None
+    reopened = np.memmap(filename, dtype=dtype, mode="r", offset=offset, shape=shape)
+    assert np.array_equal(reopened, m)
+
+
+def test_ooc_file_removed_with_matrix(tmp_path):
+    m = _ooc_matrix(tmp_path, (4, 4))
+    view = m.T[1:]
+    del m
+    assert len(list(tmp_path.iterdir())) == 1
+    del view
+    assert not list(tmp_path.iterdir())
+
+
+def test_parallel_generation_of_ooc_matrix_without_copy(tmp_path, monkeypatch):
+    m = _ooc_matrix(tmp_path)
+    serial = _gcode(m, 1)
+    monkeypatch.setattr(gcode_engine, "_PARALLEL_GEN_MIN_PX", 0)
+    monkeypatch.setattr(gcode_engine.shared_memory, "SharedMemory", _no_shared_memory)
+    monkeypatch.setattr(GCodeEngine, "_iter_range_chunks", _no_serial)
+    assert _gcode(m, 2) == serial
+
+
+def test_partial_ooc_view_stays_serial(tmp_path, monkeypatch):
+    m = _ooc_matrix(tmp_path)
+    view = m[:, 10:]
+    assert GCodeEngine._file_source(view) is None
+    serial = _gcode(np.array(view), 1)
+    monkeypatch.setattr(gcode_engine, "_PARALLEL_GEN_MIN_PX", 0)
+    monkeypatch.setattr(gcode_engine.shared_memory, "SharedMemory", _no_shared_memory)
+    monkeypatch.setattr(GCodeEngine, "_iter_parallel_chunks", _no_parallel)
+    assert _gcode(view, 2) == serial
@@ -0,0 +1,123 @@
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from engine import gcode_engine
+from engine.gcode_engine import GCodeEngine
+from engine.gcode_engine_numba import GCodeEngine as NumbaGCodeEngine
+
+
+class _LazyPool:
+    """Pool factice : les tâches ne s'exécutent qu'à la lecture du résultat."""
+
+    def __init__(self, *args, **kwargs):
+        self.submitted = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = None
+        _LazyPool.last = self
+
+    def submit(self, fn, job):
+        pool = self
+        fut = Future()
+        fut.result = lambda timeout=None: (pool._done(), fn(job))[1]
+        self.submitted += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return fut
+
+    def _done(self):
+        self.in_flight -= 1
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.cancelled = cancel_futures
+
+
+def _chunks(matrix, workers):
+    h, w = matrix.shape
+    p = {"e_num": 0, "use_s_mode": False, "ctrl_max": 1000, "laser_latency": 0,
+         "feedrate": 3000.0, "premove": 2.0, "raster_mode": "horizontal",
+         "gen_workers": workers}
+    meta = {"version": "", "mode": "", "firing_cmd": "M3",
+            "framing_code": "", "gray_steps": 8}
+    return GCodeEngine().iter_final_gcode(
+        matrix, (h, w, 0.1, 0.1), (0, 0), p, {"header": "", "footer": ""}, meta,
+        levels=np.linspace(0, 80, 8))
+
+
+def test_parallel_generation_bounds_jobs_in_flight(monkeypatch):
+    monkeypatch.setattr(gcode_engine, "_PARALLEL_GEN_MIN_PX", 0)
+    monkeypatch.setattr(gcode_engine, "ProcessPoolExecutor", _LazyPool)
+    rng = np.random.default_rng(0)
+    matrix = rng.choice([0, 3, 7], size=(40 * 256, 8)).astype(np.uint8)
+    chunks = _chunks(matrix, 2)
+    for _ in range(4):      # prologue, en-tête raster, deux tranches
+        next(chunks)
+    chunks.close()
+    pool = _LazyPool.last
+    assert pool.max_in_flight <= 3
+    assert pool.submitted == 5     # 3 au départ + 1 par tranche lue, sur 10
+    assert pool.cancelled is True
+
+
+def _same_segments(a, b):
+    """Tables de segments identiques (NaN : valeur modale non émise)."""
+    if len(a) != len(b):
+        return False
+    for (kind_a, part_a), (kind_b, part_b) in zip(a, b):
+        if kind_a != kind_b:
+            return False
+        if kind_a == "text":
+            if part_a != part_b:
+                return False
+        elif part_a.keys() != part_b.keys() or not all(
+                np.array_equal(part_a[k], part_b[k], equal_nan=part_a[k].dtype.kind == "f")
+                for k in part_a):
+            return False
+    return True
+
+
+def _build(engine_cls, matrix, levels, raster_mode, workers, **params):
+    h, w = matrix.shape
+    p = {"e_num": 0, "use_s_mode": params.get("compact_gcode", False),
+         "ctrl_max": 1000, "laser_latency": 0.3, "feedrate": 3000.0,
+         "premove": 2.0, "raster_mode": raster_mode, "gen_workers": workers}
+    p.update(params)
+    meta = {"version": "", "mode": "", "firing_cmd": "M3",
+            "framing_code": "", "gray_steps": 8}
+    return engine_cls().build_final_gcode(
+        matrix, (h, w, 0.1, 0.1), (1.5, 2.5), p, {"header": "", "footer": ""}, meta,
+        levels=levels, with_segments=True)
+
+
+@pytest.mark.parametrize("engine_cls", [GCodeEngine, NumbaGCodeEngine], ids=["numpy", "numba"])
+@pytest.mark.parametrize("raster_mode, use_levels, trim, compact", [
+    ("horizontal", True, False, False),
+    ("horizontal", False, True, False),
+    ("vertical", True, True, False),
+    ("vertical", True, False, True),
+])
+def test_parallel_output_matches_serial(monkeypatch, engine_cls, raster_mode,
+                                        use_levels, trim, compact):
+    monkeypatch.setattr(gcode_engine, "_PARALLEL_GEN_MIN_PX", 0)
+    rng = np.random.default_rng(3)
+    idx = rng.choice([0, 0, 1, 3, 5, 7], size=(1100, 24)).astype(np.uint8)
+    idx[:300] = 0               # marge vide : blocs entièrement rognés
+    levels = np.linspace(0, 80, 8)
+    if raster_mode == "vertical":
+        idx = idx.T.copy()
+    matrix = idx if use_levels else GCodeEngine.power_matrix(idx, levels)
+    lv = levels if use_levels else None
+    params = {"trim_rows": trim, "compact_gcode": compact}
+
+    serial, lat, serial_segments = _build(engine_cls, matrix, lv, raster_mode, 1, **params)
+    # Séquentiel interdit : le test échoue si le pool n'est pas utilisé
+    monkeypatch.setattr(engine_cls, "_iter_range_chunks", _no_serial)
+    parallel, lat2, parallel_segments = _build(engine_cls, matrix, lv, raster_mode, 2, **params)
+    assert parallel == serial and lat2 == lat
+    assert _same_segments(parallel_segments, serial_segments)
+
+
+def _no_serial(*args, **kwargs):
+    raise AssertionError("repli sur la génération séquentielle")
@@ -0,0 +1,29 @@
+import pytest
+
+from engine.gcode_parser import GCodeParser
+
+
+HEADER_G91_1 = "G90 G91.1\nG1 X10 S5\nG1 X20\nG1 X20 S6\n"
+
+
+@pytest.mark.parametrize("method", ["parse", "_parse_lines"])
+def test_g91_1_header_keeps_absolute_mode(method):
+    # G91.1 (centres d'arcs IJK) n'est pas G91 : coordonnées absolues
+    pts, _, _ = getattr(GCodeParser({}), method)(HEADER_G91_1)
+    assert pts["x"].tolist() == [10.0, 20.0, 20.0]
+
+
+@pytest.mark.parametrize("method", ["parse", "_parse_lines"])
+def test_g91_word_after_g91_1_sets_relative_mode(method):
+    text = "G91.1 G91\nG1 X10 S5\nG1 X10\nG90.1 G90\nG1 X3\n"
+    pts, _, _ = getattr(GCodeParser({}), method)(text)
+    assert pts["x"].tolist() == [10.0, 20.0, 3.0]
+
+
+def test_parse_columns_are_exact_size():
+    # Tampons agrandis par doublement : le résultat n'en garde pas la réserve
+    text = "".join("G1 X%d Y%d S%d\n" % (i, i % 7, i % 3) for i in range(1, 3000))
+    pts, _, _ = GCodeParser({}).parse(text)
+    for name in pts.COLUMNS:
+        col = pts[name]
+        assert col.base is None and col.size == len(pts) == 2999
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from engine.gcode_engine import GCodeEngine
+from engine.gcode_parser import GCodeParser, PointArray
+
+
+def _same_points(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return all(np.array_equal(a[name], b[name]) for name in PointArray.COLUMNS)
+
+
+def _build(matrix, raster_mode, **params):
+    h, w = matrix.shape
+    p = {"e_num": 0, "use_s_mode": False, "ctrl_max": 1000, "laser_latency": 0,
+         "feedrate": 3000.0, "premove": 2.0, "raster_mode": raster_mode}
+    p.update(params)
+    meta = {"version": "", "mode": "", "firing_cmd": "M3",
+            "framing_code": "", "gray_steps": 8}
+    return GCodeEngine().build_final_gcode(
+        matrix, (h, w, 0.1, 0.1), (0, 0), p, {"header": "", "footer": ""}, meta,
+        levels=np.linspace(0, 80, 8), with_segments=True)
+
+
+@pytest.mark.parametrize("raster_mode", ["horizontal", "vertical"])
+def test_parse_segments_trimmed_blank_margin(raster_mode):
+    # Marge vide de plus d'un bloc de lignes de scan : blocs sans ligne émise
+    if raster_mode == "vertical":
+        m = np.zeros((20, 600), np.uint8)
+        m[:, 10:100] = 3
+    else:
+        m = np.zeros((600, 20), np.uint8)
+        m[10:100, :] = 3
+    text, _, segments = _build(m, raster_mode, trim_rows=True)
+    parser = GCodeParser({})
+    pts, _, lim = parser.parse_segments(segments)
+    ref, _, ref_lim = parser.parse(text)
+    assert _same_points(pts, ref)
+    assert lim == ref_lim
@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pytest
+
+from engine.gcode_engine import GCodeEngine
+from engine.gcode_engine_numba import GCodeEngine as NumbaGCodeEngine
+
+LEVELS = np.linspace(0, 80, 8)
+
+
+@pytest.mark.parametrize("engine_cls", [GCodeEngine, NumbaGCodeEngine], ids=["numpy", "numba"])
+@pytest.mark.parametrize("raster_mode", ["horizontal", "vertical"])
+@pytest.mark.parametrize("options", [
+    {},
+    {"use_s_mode": True, "laser_latency": 0.35},
+    {"use_levels": False, "laser_latency": 1.0},
+    {"trim_rows": True, "gap_hop": 1.0},
+    {"use_s_mode": True, "compact_gcode": True, "incremental_gcode": True},
+    {"compact_gcode": True, "trim_rows": True},
+], ids=["m67", "s-latency", "float-powers", "trim-hop", "compact-g91", "compact-trim"])
+def test_statistics_match_final_gcode(engine_cls, raster_mode, options):
+    options = dict(options)
+    use_levels = options.pop("use_levels", True)
+    rng = np.random.default_rng(5)
+    idx = rng.choice([0, 0, 0, 1, 4, 7], size=(31, 47)).astype(np.uint8)
+    idx[:4] = 0
+    idx[10, 5:40] = 0           # long blanc interne (saut G0)
+    h, w = idx.shape
+    matrix = idx if use_levels else GCodeEngine.power_matrix(idx, LEVELS)
+    levels = LEVELS if use_levels else None
+
+    p = {"e_num": 1, "use_s_mode": False, "ctrl_max": 1000, "laser_latency": 0,
+         "feedrate": 2400.0, "premove": 1.5, "raster_mode": raster_mode}
+    p.update(options)
+    meta = {"version": "1.0", "mode": "M67", "firing_cmd": "M3",
+            "framing_code": "G0 X0 Y0\nG0 X4.6 Y3\n", "gray_steps": 8}
+    blocks = {"header": "( début )\nG21", "footer": "M5\n( fin )"}
+    args = (matrix, (h, w, 0.1, 0.1), (1.25, -2.0), p, blocks, meta)
+
+    engine = engine_cls()
+    text, _ = engine.build_final_gcode(*args, levels=levels)
+    _, n_lines, n_bytes = engine.get_gcode_statistics(*args, levels=levels)
+    # Fichier écrit en mode texte : fins de ligne du système
+    newlines = text.count("\n")
+    assert n_lines == newlines
+    assert n_bytes == len(text.encode("utf-8")) + newlines * (len(os.linesep) - 1)
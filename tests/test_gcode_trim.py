@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from engine.gcode_engine import GCodeEngine
+from engine.gcode_parser import GCodeParser
+
+
+def _text(matrix, raster_mode, **params):
+    h, w = matrix.shape
+    p = {"e_num": 0, "use_s_mode": False, "ctrl_max": 1000, "laser_latency": 0,
+         "feedrate": 3000.0, "premove": 1.0, "raster_mode": raster_mode}
+    p.update(params)
+    meta = {"version": "", "mode": "", "firing_cmd": "M3",
+            "framing_code": "", "gray_steps": 8}
+    text, _ = GCodeEngine().build_final_gcode(
+        matrix, (h, w, 0.1, 0.1), (0, 0), p, {"header": "", "footer": ""}, meta,
+        levels=np.linspace(0, 80, 8))
+    return text
+
+
+def _burned(text):
+    """Segments gravés (puissance > 0) : (x0, y0, x1, y1, puissance)."""
+    pts, _, _ = GCodeParser({}).parse(text)
+    x, y, pw = pts["x"], pts["y"], pts["power"]
+    on = np.nonzero(pw[1:] > 0)[0]
+    return sorted(zip(x[on].tolist(), y[on].tolist(),
+                      x[on + 1].tolist(), y[on + 1].tolist(), pw[on + 1].tolist()))
+
+
+def _matrices(raster_mode):
+    rng = np.random.default_rng(1)
+    full = np.full((2, 3), 7, np.uint8)
+    edge = rng.choice([0, 0, 3, 7], size=(9, 12)).astype(np.uint8)
+    edge[:, 6] = 3          # aucune ligne vide : même sens de passe par ligne
+    edge[2:5, -1] = 5       # dernier pixel de scan gravé
+    if raster_mode == "vertical":
+        full, edge = full.T.copy(), edge.T.copy()
+    return full, edge
+
+
+@pytest.mark.parametrize("raster_mode", ["horizontal", "vertical"])
+@pytest.mark.parametrize("latency", [0, 2])
+def test_trimmed_rows_burn_the_same_segments(raster_mode, latency):
+    for m in _matrices(raster_mode):
+        full = _text(m, raster_mode, laser_latency=latency)
+        trimmed = _text(m, raster_mode, laser_latency=latency, trim_rows=True)
+        assert _burned(trimmed) == _burned(full)
+
+
+def test_trimmed_overscan_stays_inside_full_pass():
+    m = np.full((2, 3), 7, np.uint8)
+    _, _, lim = GCodeParser({}).parse(_text(m, "horizontal"))
+    _, _, trim_lim = GCodeParser({}).parse(_text(m, "horizontal", trim_rows=True))
+    assert trim_lim == lim